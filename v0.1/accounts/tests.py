@@ -1,3 +1,38 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from store.models import Order
+from store.pagination import ORDERS_PER_PAGE
+
+User = get_user_model()
+
+
+class OrderHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'secret')
+        other = User.objects.create_user('other', 'other@example.com', 'secret')
+        for user, count in ((cls.user, ORDERS_PER_PAGE + 5), (other, 3)):
+            for _ in range(count):
+                Order.objects.create(user=user, email=user.email, total_amount=Decimal('10.00'))
+
+    def test_ajax_pages_follow_the_cursor_newest_first(self):
+        self.client.force_login(self.user)
+        seen, cursor = [], ''
+        while cursor is not None:
+            response = self.client.get(
+                '/accounts/orders/', {'cursor': cursor}, headers={'X-Requested-With': 'XMLHttpRequest'}
+            )
+            data = response.json()
+            seen += [order['id'] for order in data['results']]
+            cursor = data['next_cursor']
+        expected = Order.objects.filter(user=self.user).order_by('-created_at', '-id')
+        self.assertEqual(seen, list(expected.values_list('id', flat=True)))
+
+    def test_page_renders_for_the_signed_in_user(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/accounts/orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['orders']), ORDERS_PER_PAGE)
@@ -2,7 +2,9 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Profile
+from django.http import JsonResponse
 from store.models import Order
+from store.pagination import ORDERS_PER_PAGE, KeysetPaginator, is_ajax, order_to_dict
 from django.contrib.auth import login
 from .forms import CustomUserCreationForm
 
@@ -38,7 +40,11 @@ def profile_edit(request):
 
 @login_required
 def order_history(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    orders = KeysetPaginator(
+        Order.objects.filter(user=request.user), ('-created_at',), per_page=ORDERS_PER_PAGE
+    ).page(request.GET.get('cursor'))
+    if is_ajax(request):
+        return JsonResponse(orders.to_dict(order_to_dict))
     return render(request, 'accounts/order_history.html', {'orders': orders})
 
 @login_required
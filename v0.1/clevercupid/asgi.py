@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'clevercupid.settings')
 
 application = get_asgi_application()
+
+# Build in-memory indexes once per worker instead of on the first request
+from django.conf import settings  # noqa: E402
+
+if settings.STORE_SUGGEST_WARM:
+    from store.suggest import warm_suggestion_index  # noqa: E402
+    warm_suggestion_index()
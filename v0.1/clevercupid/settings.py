@@ -97,9 +97,94 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {
+            # A file rather than memory, so the threads of the concurrency tests share it
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Switch to a shared backend (FileBasedCache or DatabaseCache) when running
+# several worker processes so cache invalidation reaches all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'clevercupid',
     }
 }
 
+# Cache alias holding the category navigation tree and its version key
+STORE_CATEGORY_CACHE = os.getenv('STORE_CATEGORY_CACHE', 'default')
+
+# Product search backend: 'auto', 'sqlite' (FTS5), 'postgres', 'python' or a dotted path
+STORE_SEARCH_BACKEND = os.getenv('STORE_SEARCH_BACKEND', 'auto')
+
+# In-process ('python') search backend: cache alias of the version that tells
+# other workers to re-index saved products, and how many of the best matches
+# a search returns (the search page shows when there were more)
+STORE_SEARCH_CACHE = os.getenv('STORE_SEARCH_CACHE', 'default')
+STORE_SEARCH_MAX_RESULTS = int(os.getenv('STORE_SEARCH_MAX_RESULTS', '1000'))
+
+# Search-as-you-type suggestions: cache alias for the index version, entry cap
+# and whether each worker builds the index at startup
+STORE_SUGGEST_CACHE = os.getenv('STORE_SUGGEST_CACHE', 'default')
+STORE_SUGGEST_MAX_ENTRIES = int(os.getenv('STORE_SUGGEST_MAX_ENTRIES', '50000'))
+STORE_SUGGEST_WARM = os.getenv('STORE_SUGGEST_WARM', 'True') == 'True'
+
+# Cache alias holding each user's cart summary (item count, subtotal, version)
+STORE_CART_CACHE = os.getenv('STORE_CART_CACHE', 'default')
+
+# Order numbers: 'auto', 'block' (counter blocks in the database), 'sequence'
+# (PostgreSQL) or a dotted path, and how many numbers a process reserves at once
+STORE_ORDER_NUMBER_GENERATOR = os.getenv('STORE_ORDER_NUMBER_GENERATOR', 'auto')
+STORE_ORDER_NUMBER_BLOCK_SIZE = int(os.getenv('STORE_ORDER_NUMBER_BLOCK_SIZE', '100'))
+
+# Seconds the checkout page holds the cart's stock; run the
+# release_expired_reservations command periodically to free expired holds
+STORE_RESERVATION_TTL = int(os.getenv('STORE_RESERVATION_TTL', '900'))
+
+# Card payments: seconds to wait for a payment slot and for each Stripe
+# request, charges in flight per process and network retries (safe because
+# every charge has an idempotency key)
+STORE_PAYMENT_TIMEOUT = int(os.getenv('STORE_PAYMENT_TIMEOUT', '10'))
+STORE_PAYMENT_WORKERS = int(os.getenv('STORE_PAYMENT_WORKERS', '8'))
+STORE_PAYMENT_RETRIES = int(os.getenv('STORE_PAYMENT_RETRIES', '2'))
+
+# Payment gateway: 'stripe', 'simulator' (in-process, no network) or a dotted
+# path, and the simulator's seconds per charge and share of failed charges
+STORE_PAYMENT_GATEWAY = os.getenv('STORE_PAYMENT_GATEWAY', 'stripe')
+STORE_PAYMENT_SIMULATOR_LATENCY = float(os.getenv('STORE_PAYMENT_SIMULATOR_LATENCY', '0.05'))
+STORE_PAYMENT_SIMULATOR_ERROR_RATE = float(os.getenv('STORE_PAYMENT_SIMULATOR_ERROR_RATE', '0'))
+
+# Responsive product images: variant widths in pixels and the processes that
+# resize uploads (0 resizes in the web process)
+STORE_IMAGE_WIDTHS = [int(width) for width in os.getenv('STORE_IMAGE_WIDTHS', '320,640,960,1280').split(',')]
+STORE_IMAGE_WORKERS = int(os.getenv('STORE_IMAGE_WORKERS', '2'))
+
+# Cache alias and lifetime in seconds of rendered product cards; superseded
+# cards are never read again and expire after the timeout
+STORE_CARD_CACHE = os.getenv('STORE_CARD_CACHE', 'default')
+STORE_CARD_CACHE_TIMEOUT = int(os.getenv('STORE_CARD_CACHE_TIMEOUT', '86400'))
+
+# Quotes for printing a product's STL model at a custom height (store.print_quotes).
+# Measured geometry is cached in this alias under the file's content hash; the
+# rest describes the printer: filament density (g/cm³), infill share, wall
+# thickness (mm), flow rate (mm³/s), and the prices that make up a quote
+STORE_PRINT_QUOTE_CACHE = os.getenv('STORE_PRINT_QUOTE_CACHE', 'default')
+STORE_PRINT_DENSITY = float(os.getenv('STORE_PRINT_DENSITY', '1.24'))
+STORE_PRINT_INFILL = float(os.getenv('STORE_PRINT_INFILL', '0.2'))
+STORE_PRINT_WALL = float(os.getenv('STORE_PRINT_WALL', '1.2'))
+STORE_PRINT_FLOW_RATE = float(os.getenv('STORE_PRINT_FLOW_RATE', '8'))
+STORE_PRINT_MATERIAL_PRICE = os.getenv('STORE_PRINT_MATERIAL_PRICE', '25.00')  # per kg
+STORE_PRINT_HOURLY_RATE = os.getenv('STORE_PRINT_HOURLY_RATE', '1.50')
+STORE_PRINT_BASE_FEE = os.getenv('STORE_PRINT_BASE_FEE', '5.00')
+STORE_PRINT_MIN_HEIGHT = float(os.getenv('STORE_PRINT_MIN_HEIGHT', '20'))  # mm
+STORE_PRINT_MAX_HEIGHT = float(os.getenv('STORE_PRINT_MAX_HEIGHT', '300'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -176,3 +261,5 @@ ACCOUNT_LOGOUT_ON_PASSWORD_CHANGE = True
 # Stripe Settings
 STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY', '')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
+# Leave empty for api.stripe.com; e.g. http://127.0.0.1:12111 for the fake_stripe command
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE', '')
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'clevercupid.settings')
 
 application = get_wsgi_application()
+
+# Build in-memory indexes once per worker instead of on the first request
+from django.conf import settings  # noqa: E402
+
+if settings.STORE_SUGGEST_WARM:
+    from store.suggest import warm_suggestion_index  # noqa: E402
+    warm_suggestion_index()
@@ -1,8 +1,9 @@
 import numpy as np
-from stl import mesh
 import os
 import traceback
 
+from store.mesh_builder import combine, cylinder, save_binary, to_stl, translate
+
 def create_cube_stl(output_path, size=1.0):
     """Create a sample cube STL file."""
     try:
@@ -35,14 +36,8 @@ def create_cube_stl(output_path, size=1.0):
             [0, 5, 4]
         ])
 
-        # Create the mesh
-        cube = mesh.Mesh(np.zeros(faces.shape[0], dtype=mesh.Mesh.dtype))
-        for i, f in enumerate(faces):
-            for j in range(3):
-                cube.vectors[i][j] = vertices[f[j]]
-
-        # Save the mesh to file
-        cube.save(output_path)
+        # Create the mesh and save it to file
+        save_binary(to_stl(vertices, faces, name='cube'), output_path)
         print(f"Cube STL created at {output_path} ({os.path.getsize(output_path)} bytes)")
         return True
     except Exception as e:
@@ -73,14 +68,8 @@ def create_pyramid_stl(output_path, size=1.0, height=1.5):
             [0, 3, 2]   # Base 2
         ])
 
-        # Create the mesh
-        pyramid = mesh.Mesh(np.zeros(faces.shape[0], dtype=mesh.Mesh.dtype))
-        for i, f in enumerate(faces):
-            for j in range(3):
-                pyramid.vectors[i][j] = vertices[f[j]]
-
-        # Save the mesh to file
-        pyramid.save(output_path)
+        # Create the mesh and save it to file
+        save_binary(to_stl(vertices, faces, name='pyramid'), output_path)
         print(f"Pyramid STL created at {output_path} ({os.path.getsize(output_path)} bytes)")
         return True
     except Exception as e:
@@ -114,63 +103,13 @@ def create_3d_print_model(output_path):
             [3, 2, 1], [3, 1, 0]   # Bottom
         ])
         
-        # Add a simple cylinder on top
-        cylinder_vertices = []
-        cylinder_faces = []
-        
-        # Top and bottom centers of cylinder
-        center_bottom = np.array([0, 0, 0.2])  # 8
-        center_top = np.array([0, 0, 1.2])     # 9
-        
-        cylinder_vertices.append(center_bottom)
-        cylinder_vertices.append(center_top)
-        
-        # Create circle points for top and bottom
-        segments = 12
-        radius = 0.7
-        
-        for i in range(segments):
-            angle = 2 * np.pi * i / segments
-            x = radius * np.cos(angle)
-            y = radius * np.sin(angle)
-            
-            # Bottom circle point
-            cylinder_vertices.append(np.array([x, y, 0.2]))  # 10 + i
-            # Top circle point
-            cylinder_vertices.append(np.array([x, y, 1.2]))  # 10 + segments + i
-        
-        # Create cylinder faces
-        for i in range(segments):
-            # Current and next point indices
-            current_bottom = 10 + i
-            next_bottom = 10 + ((i + 1) % segments)
-            current_top = 10 + segments + i
-            next_top = 10 + segments + ((i + 1) % segments)
-            
-            # Bottom face triangle
-            cylinder_faces.append([8, current_bottom, next_bottom])
-            
-            # Top face triangle
-            cylinder_faces.append([9, next_top, current_top])
-            
-            # Side quad as two triangles
-            cylinder_faces.append([current_bottom, current_top, next_bottom])
-            cylinder_faces.append([next_bottom, current_top, next_top])
-        
-        # Combine all vertices and faces
-        all_vertices = np.vstack([base_vertices, np.array(cylinder_vertices)])
-        
-        # Adjust cylinder face indices to account for base vertices
-        all_faces = np.vstack([base_faces, np.array(cylinder_faces)])
-        
-        # Create the mesh
-        model = mesh.Mesh(np.zeros(all_faces.shape[0], dtype=mesh.Mesh.dtype))
-        for i, f in enumerate(all_faces):
-            for j in range(3):
-                model.vectors[i][j] = all_vertices[f[j]]
+        # Add a simple cylinder (12 segments) standing on the platform
+        platform = (base_vertices, base_faces)
+        column = translate(cylinder(radius=0.7, height=1.0, segments=12), (0, 0, 0.2))
+        all_vertices, all_faces = combine(platform, column)
         
-        # Save the mesh to file
-        model.save(output_path)
+        # Create the mesh and save it to file
+        save_binary(to_stl(all_vertices, all_faces, name='sample_print'), output_path)
         print(f"Sample 3D print model created at {output_path} ({os.path.getsize(output_path)} bytes)")
         return True
     except Exception as e:
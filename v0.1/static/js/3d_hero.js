@@ -13,6 +13,73 @@ function debug(...args) {
     }
 }
 
+// Compact mesh format written by store/mesh_format.py: a 36-byte header
+// (magic 'CCM1', vertex and triangle counts, float32 origin and step per
+// axis), uint16 quantized vertices, then triangle indices as zigzag LEB128
+// deltas. All little-endian.
+const COMPACT_MESH_HEADER_BYTES = 36;
+
+function decodeCompactMesh(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== 'CCM1') {
+        throw new Error('Not a compact mesh');
+    }
+    const vertexCount = view.getUint32(4, true);
+    const triangleCount = view.getUint32(8, true);
+    const origin = [0, 1, 2].map(axis => view.getFloat32(12 + axis * 4, true));
+    const step = [0, 1, 2].map(axis => view.getFloat32(24 + axis * 4, true));
+    
+    const positions = new Float32Array(vertexCount * 3);
+    let offset = COMPACT_MESH_HEADER_BYTES;
+    for (let i = 0; i < positions.length; i++, offset += 2) {
+        const axis = i % 3;
+        positions[i] = origin[axis] + view.getUint16(offset, true) * step[axis];
+    }
+    
+    const bytes = new Uint8Array(buffer, offset);
+    const indices = vertexCount > 65535 ? new Uint32Array(triangleCount * 3) : new Uint16Array(triangleCount * 3);
+    let position = 0;
+    let previous = 0;
+    for (let i = 0; i < indices.length; i++) {
+        let value = 0;
+        let shift = 0;
+        let byte;
+        do {
+            byte = bytes[position++];
+            value += (byte & 0x7f) * 2 ** shift;  // not <<, which overflows past 31 bits
+            shift += 7;
+        } while (byte & 0x80);
+        previous += value % 2 ? -(value + 1) / 2 : value / 2;
+        indices[i] = previous;
+    }
+    
+    const geometry = new THREE.BufferGeometry();
+    geometry.setAttribute('position', new THREE.BufferAttribute(positions, 3));
+    geometry.setIndex(new THREE.BufferAttribute(indices, 1));
+    geometry.computeVertexNormals();
+    return geometry;
+}
+
+// Loads .mesh files with the same load(url, onLoad, onProgress, onError) API as STLLoader
+class CompactMeshLoader {
+    load(url, onLoad, onProgress, onError) {
+        fetch(url)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status} for ${url}`);
+                }
+                return response.arrayBuffer();
+            })
+            .then(buffer => onLoad(decodeCompactMesh(buffer)))
+            .catch(error => onError && onError(error));
+    }
+}
+
+function loaderFor(url) {
+    return url.endsWith('.mesh') ? new CompactMeshLoader() : new STLLoader();
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     // Scene setup
     const container = document.getElementById('hero-canvas-container');
@@ -153,6 +220,48 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     ];
     
+    // Compiled models (see the ingest_models management command): compact
+    // meshes (or binary STL) centred on their bounding box and scaled to a
+    // largest dimension of 1, some with coarser levels of detail that load first
+    const MODEL_MANIFEST_URL = '/static/models/compiled/manifest.json';
+    const MODEL_MESH_URL = '/models/';
+    const modelManifest = fetch(MODEL_MANIFEST_URL)
+        .then(response => response.ok ? response.json() : null)
+        .catch(() => null);
+    
+    // Manifest entry of a source model, with `tiers`: the URLs of its levels of
+    // detail from coarsest to full; null when it has none
+    function compiledModel(url) {
+        const source = decodeURIComponent(url.split('/').pop());
+        return modelManifest.then(manifest => {
+            const entry = manifest && manifest.models && manifest.models[source];
+            if (!entry) return null;
+            const base = new URL(MODEL_MANIFEST_URL, window.location.href);
+            const tiers = (entry.lods || []).concat([entry]).map(version => version.mesh
+                ? MODEL_MESH_URL + encodeURIComponent(version.mesh.file)
+                : new URL(version.file, base).href);
+            return Object.assign({}, entry, { tiers: tiers });
+        });
+    }
+    
+    // Swap the finer levels of detail into a model's mesh as they arrive
+    function refineModel(model, urls) {
+        if (!urls.length) return;
+        loaderFor(urls[0]).load(urls[0], function (geometry) {
+            // The hero may have moved on to another model meanwhile
+            if (currentModel !== model) {
+                geometry.dispose();
+                return;
+            }
+            model.geometry.dispose();
+            model.geometry = geometry;
+            debug('Swapped in finer level of detail:', urls[0]);
+            refineModel(model, urls.slice(1));
+        }, undefined, function (error) {
+            debug('Keeping the current level of detail; could not load', urls[0], error);
+        });
+    }
+    
     // Function to check if STL model URLs are valid
     function validateModelUrls() {
         debug('Validating model list with', modelList.length, 'entries');
@@ -301,14 +410,13 @@ document.addEventListener('DOMContentLoaded', function() {
             return Promise.reject(new Error('Previously failed to load'));
         }
         
-        const loader = new STLLoader();
-        debug('STLLoader created');
-        
-        return new Promise((resolve, reject) => {
+        return compiledModel(url).then(compiled => new Promise((resolve, reject) => {
+            // Source URL bookkeeping (failures, fallbacks) stays on `url`
+            const loadUrl = compiled ? compiled.tiers[0] : url;
             try {
-                debug('Starting load request for', url);
-                loader.load(
-                    url,
+                debug('Starting load request for', loadUrl);
+                loaderFor(loadUrl).load(
+                    loadUrl,
                     function (geometry) {
                         debug('STL loaded successfully:', url);
                         
@@ -357,25 +465,30 @@ document.addEventListener('DOMContentLoaded', function() {
                             currentModel = new THREE.Mesh(geometry, material);
                             debug('Mesh created with geometry');
                             
-                            // Using the editor-style approach for centering
-                            geometry.computeBoundingSphere();
-                            const center = geometry.boundingSphere.center;
-                            
-                            // Only apply standard centering for non-Harry Potter models
-                            // Harry Potter models will be explicitly positioned in customizeHarryPotterModel
-                            if (!url.includes('harry_potter')) {
-                                currentModel.position.set(-center.x, -center.y, -center.z);
-                                debug('Mesh centered at', -center.x, -center.y, -center.z);
+                            const size = new THREE.Vector3();
+                            if (compiled) {
+                                // Compiled models are already centred; the manifest has their size
+                                size.fromArray(compiled.size).multiplyScalar(compiled.scale);
+                                debug('Using compiled model', compiled.file);
                             } else {
-                                debug('Skipping standard centering for Harry Potter model');
+                                // Using the editor-style approach for centering
+                                geometry.computeBoundingSphere();
+                                const center = geometry.boundingSphere.center;
+                                
+                                // Only apply standard centering for non-Harry Potter models
+                                // Harry Potter models will be explicitly positioned in customizeHarryPotterModel
+                                if (!url.includes('harry_potter')) {
+                                    currentModel.position.set(-center.x, -center.y, -center.z);
+                                    debug('Mesh centered at', -center.x, -center.y, -center.z);
+                                } else {
+                                    debug('Skipping standard centering for Harry Potter model');
+                                }
+                                
+                                // Handle scale using a more robust approach
+                                geometry.computeBoundingBox();
+                                geometry.boundingBox.getSize(size);
                             }
                             
-                            // Handle scale using a more robust approach
-                            geometry.computeBoundingBox();
-                            const box = geometry.boundingBox;
-                            const size = new THREE.Vector3();
-                            box.getSize(size);
-                            
                             // Make the Harry Potter model much larger than other models
                             let scaleFactor = 5 / Math.max(size.x, size.y, size.z); 
                             
@@ -416,6 +529,10 @@ document.addEventListener('DOMContentLoaded', function() {
                             });
                             
                             resolve();
+                            
+                            if (compiled) {
+                                refineModel(currentModel, compiled.tiers.slice(1));
+                            }
                         } catch (err) {
                             console.error('Error processing STL geometry:', err);
                             failedModels.push(url);
@@ -471,7 +588,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     reject(error);
                 }
             }
-        });
+        }));
     }
     
     // Function to change the current model
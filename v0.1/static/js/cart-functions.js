@@ -64,15 +64,9 @@ function setupQuantityButtons() {
         const isLoggedIn = document.body.getAttribute('data-user-authenticated') === 'true';
         
         if (isLoggedIn) {
-            // Use server-side cart update for logged-in users
-            updateQuantity(itemId, action, display)
-                .finally(() => {
-                    // Remove from updating set whether successful or not
-                    setTimeout(() => {
-                        updatingItems.delete(itemId);
-                        console.log(`Item ${itemId} update completed, ready for more updates`);
-                    }, 500); // Add small delay to prevent too rapid clicks
-                });
+            // Change the display now; the server update is batched with other clicks
+            queueQuantityUpdate(itemId, action, display);
+            updatingItems.delete(itemId);
         } else {
             // Use localStorage cart update for guest users
             let currentValue = parseInt(display.textContent.trim());
@@ -99,104 +93,98 @@ function setupQuantityButtons() {
     });
 }
 
+// Quantity changes waiting to be sent, by cart item id
+const pendingQuantities = new Map();
+let quantityFlushTimer = null;
+const QUANTITY_FLUSH_DELAY = 400;
+
 /**
- * Update quantity for logged-in users via server API
+ * Update quantity for logged-in users; changes made in quick succession
+ * are sent to the server together as one batch request
  */
-async function updateQuantity(itemId, action, display) {
-    try {
-        console.log(`Updating item ${itemId}: ${action} from ${display.textContent}`);
-        
-        let currentValue = parseInt(display.textContent.trim());
-        let maxValue = parseInt(display.dataset.max);
-        let newValue = currentValue;
+function queueQuantityUpdate(itemId, action, display) {
+    let currentValue = parseInt(display.textContent.trim());
+    let maxValue = parseInt(display.dataset.max);
+    let newValue = currentValue;
 
-        if (action === 'increase') {
-            newValue = Math.min(currentValue + 1, maxValue);
-        } else if (action === 'decrease') {
-            newValue = Math.max(currentValue - 1, 1);
-        }
+    if (action === 'increase') {
+        newValue = Math.min(currentValue + 1, maxValue);
+    } else if (action === 'decrease') {
+        newValue = Math.max(currentValue - 1, 1);
+    }
 
-        // If the value hasn't changed, don't do anything
-        if (newValue === currentValue) {
-            console.log('Value unchanged, not updating');
-            return;
-        }
-        
-        // Save original value
-        const originalValue = currentValue;
-        
-        // Update the display immediately for visual feedback
-        display.textContent = newValue;
-        
-        // Get price elements to update
-        const row = display.closest('tr');
-        const priceCell = row.querySelector('.unit-price');
-        const totalCell = row.querySelector('.item-total');
-        
-        // Get unit price and calculate new total
-        const unitPrice = parseFloat(priceCell.textContent.replace('$', ''));
-        const newTotal = (unitPrice * newValue).toFixed(2);
-        
-        // Update the total cell immediately for better user feedback
-        totalCell.textContent = '$' + newTotal;
-        
-        // Calculate and update the cart summary immediately
-        updateCartSummaryImmediately(unitPrice * (newValue - currentValue));
-        
-        // Highlight row to show activity
-        row.classList.add('table-light');
-        
-        // Send the update to the server to get accurate price calculations
-        const response = await fetch(`/store/cart/update/${itemId}/`, {
+    // If the value hasn't changed, don't do anything
+    if (newValue === currentValue) return;
+
+    const row = display.closest('tr');
+    const unitPrice = parseFloat(row.querySelector('.unit-price').textContent.replace('$', ''));
+
+    // Remember the last confirmed value so a failed batch can be reverted
+    if (!pendingQuantities.has(itemId)) {
+        pendingQuantities.set(itemId, { display: display, unitPrice: unitPrice, original: currentValue });
+    }
+    pendingQuantities.get(itemId).quantity = newValue;
+
+    // Update the display immediately for visual feedback
+    display.textContent = newValue;
+    row.querySelector('.item-total').textContent = '$' + (unitPrice * newValue).toFixed(2);
+    updateCartSummaryImmediately(unitPrice * (newValue - currentValue));
+    row.classList.add('table-light');
+
+    clearTimeout(quantityFlushTimer);
+    quantityFlushTimer = setTimeout(flushQuantityUpdates, QUANTITY_FLUSH_DELAY);
+}
+
+/**
+ * Send every pending quantity change in one request and apply the server totals
+ */
+async function flushQuantityUpdates() {
+    const pending = new Map(pendingQuantities);
+    pendingQuantities.clear();
+    if (pending.size === 0) return;
+
+    const operations = [];
+    pending.forEach((change, itemId) => {
+        operations.push({ op: 'update', item_id: parseInt(itemId), quantity: change.quantity });
+    });
+
+    let data = null;
+    try {
+        const response = await fetch(document.body.getAttribute('data-cart-batch-url'), {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
-                'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value
+                'X-CSRFToken': document.body.getAttribute('data-csrf-token')
             },
-            body: JSON.stringify({
-                quantity: newValue
-            })
+            body: JSON.stringify({ operations: operations })
         });
-        
-        // Remove highlight
-        row.classList.remove('table-light');
-        
-        // Check if the response is ok
-        if (!response.ok) {
-            console.error(`Server responded with ${response.status}: ${response.statusText}`);
-            throw new Error(`Server error: ${response.status}`);
-        }
-        
-        const data = await response.json();
-        console.log('Server response:', data);
-        
-        if (data.success) {
-            // Update with server-calculated total in case there are discounts or other adjustments
-            totalCell.textContent = '$' + parseFloat(data.item_total).toFixed(2);
-            
-            // Update cart summary with accurate server data
-            updateCartSummary(data);
-        } else {
-            // Revert to original value and show error
-            display.textContent = originalValue;
-            totalCell.textContent = '$' + (unitPrice * originalValue).toFixed(2);
-            
-            // Revert the cart summary changes
-            updateCartSummaryImmediately(unitPrice * (originalValue - newValue));
-            
-            console.error('Error from server:', data.error);
-            alert(data.error || 'Error updating cart');
-        }
+        data = await response.json();
     } catch (error) {
-        console.error('Error updating quantity:', error);
-        // If we've made it this far, revert the display value
-        display.textContent = originalValue || "1";
-        
-        // Remove any highlighting
-        const row = display.closest('tr');
-        if (row) {
-            row.classList.remove('table-light');
+        console.error('Error updating quantities:', error);
+    }
+
+    pending.forEach(change => change.display.closest('tr').classList.remove('table-light'));
+
+    if (data && data.success) {
+        // Server quantities and totals win (stock may have capped a line)
+        data.items.forEach(item => {
+            const change = pending.get(String(item.id));
+            if (!change) return;
+            change.display.textContent = item.quantity;
+            change.display.closest('tr').querySelector('.item-total').textContent = '$' + parseFloat(item.item_total).toFixed(2);
+        });
+        updateCartSummary(data);
+        if (data.warnings && data.warnings.length) {
+            alert(data.warnings.join('\n'));
         }
+    } else {
+        // Revert every line of the failed batch
+        pending.forEach(change => {
+            updateCartSummaryImmediately(change.unitPrice * (change.original - change.quantity));
+            change.display.textContent = change.original;
+            change.display.closest('tr').querySelector('.item-total').textContent = '$' + (change.unitPrice * change.original).toFixed(2);
+        });
+        alert((data && data.error) || 'Error updating cart');
     }
 }
 
@@ -1,10 +1,17 @@
 /**
  * Guest Cart functionality for non-logged in users
- * Stores cart data in localStorage to persist between page reloads
+ * Stores cart data in localStorage to persist between page reloads,
+ * and merges it into the account cart after the guest logs in
  */
 
 // Initialize guest cart when page loads
 document.addEventListener('DOMContentLoaded', function() {
+    // Logged-in users: move anything left in the guest cart into the account cart
+    if (document.body.getAttribute('data-user-authenticated') === 'true') {
+        mergeGuestCart();
+        return;
+    }
+
     initGuestCart();
     updateCartCount();
 
@@ -31,6 +38,56 @@ function initGuestCart() {
     }
 }
 
+/**
+ * Merge the localStorage guest cart into the account cart with one batch request
+ */
+function mergeGuestCart() {
+    const batchUrl = document.body.getAttribute('data-cart-batch-url');
+    const guestCart = JSON.parse(localStorage.getItem('guestCart'));
+    if (!batchUrl || !guestCart || !guestCart.items || !guestCart.items.length) return;
+
+    const operations = guestCart.items.map(item => ({
+        op: 'add',
+        product_id: item.product_id,
+        size_id: item.size_id || null,
+        print_height: item.print_height || null,
+        quantity: item.quantity
+    }));
+
+    fetch(batchUrl, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': document.body.getAttribute('data-csrf-token')
+        },
+        // Lines that no longer apply (a deleted product, a missing size) are
+        // skipped with a warning instead of rejecting the whole cart
+        body: JSON.stringify({ operations: operations, partial: true })
+    })
+    .then(response => response.json())
+    .then(data => {
+        // Keep the guest cart unless it was merged; the next page load retries
+        if (!data.success) {
+            console.error('Could not merge the guest cart:', data.error);
+            return;
+        }
+        localStorage.removeItem('guestCart');
+        if (data.warnings && data.warnings.length) {
+            alert(data.warnings.join('\n'));
+        }
+
+        const cartCountBadge = document.querySelector('.cart-count');
+        if (cartCountBadge) cartCountBadge.textContent = data.cart_count;
+
+        // Show the merged lines if we are looking at the cart
+        if (document.querySelector('.cart-table')) {
+            window.location.reload();
+        }
+    })
+    // Network errors keep the guest cart; the next page load retries
+    .catch(error => console.error('Could not merge the guest cart:', error));
+}
+
 /**
  * Update the cart count in the navigation bar
  */
@@ -79,6 +136,7 @@ function setupAddToCartForm() {
         // Get selected size if any
         let size = null;
         let sizeId = null;
+        let printHeight = null;
         let finalPrice = productPrice;
         
         const sizeInput = document.querySelector('input[name="size_id"]:checked');
@@ -89,10 +147,19 @@ function setupAddToCartForm() {
             if (!isNaN(sizePrice)) {
                 finalPrice = sizePrice;
             }
+            // A custom print is kept at its height and shown at its quoted price
+            const customPrint = document.getElementById('custom-print');
+            if (customPrint && sizeInput.getAttribute('data-size-code') === 'custom') {
+                printHeight = document.getElementById('print-height').value;
+                const quotedPrice = parseFloat(customPrint.dataset.price);
+                if (!isNaN(quotedPrice)) {
+                    finalPrice = quotedPrice;
+                }
+            }
         }
         
         // Add to guest cart
-        addToGuestCart(productId, productName, finalPrice, quantity, size, sizeId, productCategory, productImage, maxQuantity);
+        addToGuestCart(productId, productName, finalPrice, quantity, size, sizeId, productCategory, productImage, maxQuantity, printHeight);
         
         // Show success message
         const successToast = document.createElement('div');
@@ -124,7 +191,7 @@ function setupAddToCartForm() {
 /**
  * Add a product to the guest cart
  */
-function addToGuestCart(productId, name, price, quantity, size, sizeId, category, image, maxQuantity) {
+function addToGuestCart(productId, name, price, quantity, size, sizeId, category, image, maxQuantity, printHeight = null) {
     // Get current cart
     const guestCart = JSON.parse(localStorage.getItem('guestCart')) || {
         items: [],
@@ -134,7 +201,8 @@ function addToGuestCart(productId, name, price, quantity, size, sizeId, category
     // Check if product already in cart
     let found = false;
     for (const item of guestCart.items) {
-        if (item.product_id == productId && (item.size_id == sizeId || (!item.size_id && !sizeId))) {
+        if (item.product_id == productId && (item.size_id == sizeId || (!item.size_id && !sizeId))
+                && (item.print_height || null) == printHeight) {
             // Update quantity
             item.quantity += quantity;
             found = true;
@@ -153,6 +221,7 @@ function addToGuestCart(productId, name, price, quantity, size, sizeId, category
             image: image,
             size: size,
             size_id: sizeId,
+            print_height: printHeight,
             max_quantity: maxQuantity
         });
     }
@@ -216,7 +285,7 @@ function renderGuestCart() {
                     <div>
                         <h6 class="mb-0">${item.name}</h6>
                         <small class="text-muted">${item.category || ''}</small>
-                        ${item.size ? `<small class="d-block text-muted">Size: ${item.size}</small>` : ''}
+                        ${item.size ? `<small class="d-block text-muted">Size: ${item.size}${item.print_height ? `, ${item.print_height} mm tall` : ''}</small>` : ''}
                     </div>
                 </div>
             </td>
@@ -107,6 +107,73 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Search-as-you-type suggestions
+    if (searchForm && searchForm.dataset.suggestUrl) {
+        const searchInput = searchForm.querySelector('input[type="search"]');
+        const suggestionList = searchForm.querySelector('.search-suggestions');
+        let suggestTimer = null;
+        let lastQuery = '';
+
+        function hideSuggestions() {
+            suggestionList.classList.remove('show');
+            suggestionList.innerHTML = '';
+        }
+
+        function showSuggestions(suggestions) {
+            suggestionList.innerHTML = '';
+            suggestions.forEach(function(suggestion) {
+                const item = document.createElement('li');
+                const link = document.createElement('a');
+                link.className = 'dropdown-item';
+                link.href = suggestion.url;
+                link.textContent = suggestion.label;
+                if (suggestion.type === 'category') {
+                    const badge = document.createElement('small');
+                    badge.className = 'text-muted ms-2';
+                    badge.textContent = 'Category';
+                    link.appendChild(badge);
+                }
+                item.appendChild(link);
+                suggestionList.appendChild(item);
+            });
+            suggestionList.classList.toggle('show', suggestions.length > 0);
+        }
+
+        searchInput.addEventListener('input', function() {
+            const query = this.value.trim();
+            clearTimeout(suggestTimer);
+            if (!query) {
+                lastQuery = '';
+                hideSuggestions();
+                return;
+            }
+            suggestTimer = setTimeout(function() {
+                lastQuery = query;
+                fetch(searchForm.dataset.suggestUrl + '?q=' + encodeURIComponent(query))
+                    .then(response => response.json())
+                    .then(function(data) {
+                        // Ignore responses for queries the user has already typed past
+                        if (data.query === lastQuery) {
+                            showSuggestions(data.suggestions);
+                        }
+                    })
+                    .catch(hideSuggestions);
+            }, 100);
+        });
+
+        searchInput.addEventListener('keydown', function(e) {
+            if (e.key === 'Escape') {
+                hideSuggestions();
+            }
+        });
+
+        document.addEventListener('click', function(e) {
+            if (!searchForm.contains(e.target)) {
+                hideSuggestions();
+            }
+        });
+    }
+
     // Profile image preview
     const avatarInput = document.querySelector('#avatar');
     if (avatarInput) {
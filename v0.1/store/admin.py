@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.utils.safestring import mark_safe
 from adminsortable2.admin import SortableInlineAdminMixin, SortableAdminMixin, SortableAdminBase
-from .models import Category, Product, ProductImage, ProductSize, Cart, CartItem, Order, OrderItem, ShippingAddress
+from .models import Category, Product, ProductImage, ProductSize, Cart, CartItem, Order, OrderItem, ShippingAddress, InventoryMovement
+from .product_columns import refresh_image_columns
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -19,7 +20,8 @@ class ProductImageInline(SortableInlineAdminMixin, admin.TabularInline):
     
     def get_image_preview(self, obj):
         if obj.image and hasattr(obj.image, 'url'):
-            return mark_safe(f'<img src="{obj.image.url}" width="100" height="100" style="object-fit: contain;" />')
+            # 200px variant for sharp 100px previews on high-density screens
+            return mark_safe(f'<img src="{obj.url_for_width(200)}" width="100" height="100" style="object-fit: contain;" />')
         return "No Image"
     get_image_preview.short_description = 'Preview'
 
@@ -30,7 +32,7 @@ class ProductSizeInline(admin.TabularInline):
 
 @admin.register(ProductSize)
 class ProductSizeAdmin(admin.ModelAdmin):
-    list_display = ['product', 'get_size_display', 'price_adjustment', 'stock', 'is_in_stock']
+    list_display = ['product', 'get_size_display', 'price_adjustment', 'stock', 'reserved', 'is_in_stock']
     list_filter = ['product', 'size']
     search_fields = ['product__name']
     list_editable = ['price_adjustment', 'stock']
@@ -44,16 +46,33 @@ class ProductImageAdmin(SortableAdminMixin, admin.ModelAdmin):
     def get_product_name(self, obj):
         return obj.product.name
     get_product_name.short_description = 'Product'
+
+    # adminsortable2 writes the new order with bulk_update() and update(),
+    # which send no post_save, so refresh the products' primary image here
+    def _refresh_products(self, image_ids):
+        refresh_image_columns(ProductImage.objects.filter(pk__in=image_ids).values_list('product_id', flat=True))
+
+    def _update_order(self, updated_items, extra_model_filters):
+        updated = super()._update_order(updated_items, extra_model_filters)
+        self._refresh_products([item[0] for item in updated_items])
+        return updated
+
+    def _move_item(self, startorder, endorder, extra_model_filters):
+        moved = super()._move_item(startorder, endorder, extra_model_filters)
+        if moved:
+            self._refresh_products(list(moved))
+        return moved
     
     def get_image_preview(self, obj):
         if obj.image and hasattr(obj.image, 'url'):
-            return mark_safe(f'<img src="{obj.image.url}" width="100" height="100" style="object-fit: contain;" />')
+            # 200px variant for sharp 100px previews on high-density screens
+            return mark_safe(f'<img src="{obj.url_for_width(200)}" width="100" height="100" style="object-fit: contain;" />')
         return "No Image"
     get_image_preview.short_description = 'Preview'
 
 @admin.register(Product)
 class ProductAdmin(SortableAdminBase, admin.ModelAdmin):
-    list_display = ['name', 'display_category', 'display_primary_image', 'price', 'stock', 'has_sizes', 'featured', 'created_at']
+    list_display = ['name', 'display_category', 'display_primary_image', 'price', 'stock', 'reserved', 'has_sizes', 'featured', 'created_at']
     list_filter = ['category__parent', 'category', 'featured', 'created_at']
     list_editable = ['price', 'stock', 'featured']
     search_fields = ['name', 'short_description', 'description']
@@ -67,8 +86,15 @@ class ProductAdmin(SortableAdminBase, admin.ModelAdmin):
             'fields': ('short_description', 'description'),
             'description': 'Enter both a short summary for product listings and a detailed description for the product page.'
         }),
+        ('3D print', {
+            'fields': ('print_model',),
+            'description': 'Upload the STL model to quote the custom size from its geometry.'
+        }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_listing()
+    
     def display_category(self, obj):
         if obj.category.is_subcategory:
             return f"{obj.category.parent.name} › {obj.category.name}"
@@ -76,15 +102,12 @@ class ProductAdmin(SortableAdminBase, admin.ModelAdmin):
     display_category.short_description = 'Category'
     
     def display_primary_image(self, obj):
-        if obj.image_url:
-            return mark_safe(f'<img src="{obj.image_url}" width="50" height="50" style="object-fit: contain;" />')
+        image = obj.primary_image
+        if image and image.image:
+            return mark_safe(f'<img src="{image.url_for_width(100)}" width="50" height="50" style="object-fit: contain;" />')
         return "No Image"
     display_primary_image.short_description = 'Primary Image'
     
-    def has_sizes(self, obj):
-        return obj.sizes.exists()
-    has_sizes.boolean = True
-    has_sizes.short_description = 'Has Sizes'
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
@@ -94,7 +117,7 @@ class CartAdmin(admin.ModelAdmin):
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
-    list_display = ['cart', 'product', 'size', 'quantity', 'created_at']
+    list_display = ['cart', 'product', 'size', 'print_height', 'quantity', 'created_at']
     list_filter = ['created_at']
     search_fields = ['cart__user__username', 'product__name']
 
@@ -107,7 +130,7 @@ class OrderAdmin(admin.ModelAdmin):
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ['order', 'product', 'size', 'quantity', 'price', 'created_at']
+    list_display = ['order', 'product', 'size', 'print_height', 'quantity', 'price', 'created_at']
     list_filter = ['created_at']
     search_fields = ['order__order_number', 'product__name']
 
@@ -116,3 +139,21 @@ class ShippingAddressAdmin(admin.ModelAdmin):
     list_display = ['first_name', 'last_name', 'email', 'city', 'state', 'created_at']
     list_filter = ['state', 'created_at']
     search_fields = ['first_name', 'last_name', 'email', 'address', 'city']
+
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    """Read-only stock history; movements are written by store.inventory"""
+    list_display = ['created_at', 'product', 'size', 'kind', 'quantity', 'order', 'note']
+    list_filter = ['kind', 'created_at']
+    search_fields = ['product__name', 'order__order_number', 'note']
+    list_select_related = ['product', 'size', 'order']
+    raw_id_fields = ['product', 'size', 'order']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
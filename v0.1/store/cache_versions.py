@@ -0,0 +1,24 @@
+"""
+Version counters kept in a Django cache, used to tell every worker process
+that an in-process structure (category tree, suggestion index, ...) is stale.
+"""
+
+
+def get_version(cache, key):
+    """Return the current version for ``key``, starting at 1"""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(cache, key):
+    """Increment the version for ``key`` so cached copies are rebuilt"""
+    get_version(cache, key)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key was evicted between the two calls
+        cache.set(key, 1, timeout=None)
+        return 1
@@ -0,0 +1,169 @@
+"""
+Batched cart changes.
+
+``apply_cart_operations`` applies a list of ``add``/``update``/``remove``
+operations to a user's cart in one transaction. It loads the cart lines and
+every referenced product and size in a fixed number of queries, then writes
+the changes with a single bulk_create, bulk_update and delete. Merging a
+guest cart kept in localStorage at login is the same call with one ``add``
+per guest line.
+
+Quantities are capped at the stock that is not held by other checkouts, as
+in ``add_to_cart``. Each adjustment is reported as a warning. A malformed
+operation rejects the whole batch, unless the batch is ``partial``: then the
+operations that cannot be applied (e.g. a guest line whose product was deleted
+or which lacks a size) are skipped with a warning and the rest are applied.
+
+An ``add`` of a custom-size print carries its ``print_height``; lines of the
+same size at different heights stay separate.
+"""
+from django.db import transaction
+
+from .cart_summary import invalidate_cart_summary
+from .models import Cart, CartItem, Product, ProductSize
+from .print_quotes import QuoteError, custom_print_height
+
+MAX_OPERATIONS = 100
+OPERATIONS = ('add', 'update', 'remove')
+
+
+class CartBatchError(ValueError):
+    """Raised for a malformed batch; nothing has been written"""
+
+
+def _positive_int(value, name, allow_zero=False):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise CartBatchError(f'{name} must be an integer.')
+    if value < 0 or (value == 0 and not allow_zero):
+        raise CartBatchError(f'{name} must be positive.')
+    return value
+
+
+def _parse_operation(operation):
+    if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+        raise CartBatchError(f'Every operation needs an op of {", ".join(OPERATIONS)}.')
+    op = operation['op']
+    if op == 'add':
+        size_id = operation.get('size_id')
+        return op, {
+            'product_id': _positive_int(operation.get('product_id'), 'product_id'),
+            'size_id': _positive_int(size_id, 'size_id') if size_id not in (None, '') else None,
+            'quantity': _positive_int(operation.get('quantity', 1), 'quantity'),
+            # Checked against the product once it is loaded
+            'print_height': operation.get('print_height'),
+        }
+    if op == 'update':
+        return op, {
+            'item_id': _positive_int(operation.get('item_id'), 'item_id'),
+            'quantity': _positive_int(operation.get('quantity'), 'quantity', allow_zero=True),
+        }
+    return op, {'item_id': _positive_int(operation.get('item_id'), 'item_id')}
+
+
+def _skip(partial, warnings, position, message):
+    """Raise for a full batch; for a partial one, record why operation ``position`` was skipped"""
+    if not partial:
+        raise CartBatchError(message)
+    warnings.append(f'Line {position + 1} skipped: {message}')
+
+
+def _parse(operations, partial, warnings):
+    """``[(position, op, data)]`` of the operations that parsed"""
+    if not isinstance(operations, list) or not operations:
+        raise CartBatchError('operations must be a non-empty list.')
+    if len(operations) > MAX_OPERATIONS:
+        raise CartBatchError(f'At most {MAX_OPERATIONS} operations are allowed per batch.')
+    parsed = []
+    for position, operation in enumerate(operations):
+        try:
+            parsed.append((position, *_parse_operation(operation)))
+        except CartBatchError as error:
+            _skip(partial, warnings, position, str(error))
+    return parsed
+
+
+def _available(item):
+    return item.size.available_stock if item.size_id else item.product.available_stock
+
+
+def apply_cart_operations(user, operations, partial=False):
+    """
+    Apply ``operations`` (dicts with ``op`` plus ``product_id``/``size_id``/
+    ``quantity`` and, for a custom print, ``print_height`` for add, ``item_id``/``quantity`` for update, ``item_id`` for
+    remove) to the user's cart. With ``partial``, operations that cannot be
+    applied are skipped instead of rejecting the batch. Returns a list of
+    warning messages.
+    """
+    warnings = []
+    parsed = _parse(operations, partial, warnings)
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user=user)
+        lines = {} if created else {
+            item.pk: item for item in CartItem.objects.filter(cart=cart).select_related('product', 'size')
+        }
+        by_sku = {(item.product_id, item.size_id, item.print_height): item for item in lines.values()}
+
+        adds = [data for _, op, data in parsed if op == 'add']
+        products = Product.objects.in_bulk({data['product_id'] for data in adds})
+        sizes = ProductSize.objects.in_bulk({data['size_id'] for data in adds if data['size_id']})
+        sized_products = set(
+            ProductSize.objects.filter(product_id__in=products).values_list('product_id', flat=True).distinct()
+        )
+
+        new, changed, removed = {}, set(), set()
+        for position, op, data in parsed:
+            if op == 'add':
+                product = products.get(data['product_id'])
+                size = sizes.get(data['size_id']) if data['size_id'] else None
+                if product is None or (data['size_id'] and (size is None or size.product_id != product.pk)):
+                    _skip(partial, warnings, position, 'Unknown product or size.')
+                    continue
+                if size is None and product.pk in sized_products:
+                    _skip(partial, warnings, position, f'Please select a size for {product.name}.')
+                    continue
+                try:
+                    height = custom_print_height(product, size, data['print_height'])
+                except QuoteError as error:
+                    _skip(partial, warnings, position, f'{product.name}: {error}')
+                    continue
+                key = (product.pk, size.pk if size else None, height)
+                item = by_sku.get(key)
+                if item is None or item.pk in removed:
+                    item = CartItem(cart=cart, product=product, size=size, print_height=height, quantity=0)
+                    by_sku[key] = new[key] = item
+                elif item.pk is not None:
+                    changed.add(item.pk)
+                item.quantity += data['quantity']
+            else:
+                item = lines.get(data['item_id'])
+                if item is None:
+                    _skip(partial, warnings, position, 'Unknown cart item.')
+                    continue
+                if op == 'remove' or data['quantity'] == 0:
+                    removed.add(item.pk)
+                    changed.discard(item.pk)
+                    continue
+                item.quantity = data['quantity']
+                removed.discard(item.pk)
+                changed.add(item.pk)
+
+        # Cap every touched line at the stock other customers are not holding
+        for item in [lines[pk] for pk in changed] + list(new.values()):
+            available = _available(item)
+            if item.quantity > available:
+                label = f'{item.product.name} ({item.size.get_size_display()})' if item.size_id else item.product.name
+                warnings.append(f'Only {available} units of {label} available. Quantity adjusted.')
+                item.quantity = available
+                if available == 0 and item.pk is not None:
+                    removed.add(item.pk)
+                    changed.discard(item.pk)
+
+        CartItem.objects.bulk_create([item for item in new.values() if item.quantity > 0])
+        CartItem.objects.bulk_update([lines[pk] for pk in changed], ['quantity'])
+        if removed:
+            CartItem.objects.filter(cart=cart, pk__in=removed).delete()
+        # bulk_create and bulk_update send no signals
+        invalidate_cart_summary(user.pk)
+    return warnings
@@ -0,0 +1,80 @@
+"""
+Cached cart summary (item count, subtotal and version) per user.
+
+The header badge is rendered on every page, so the context processor reads
+the count from ``STORE_CART_CACHE`` instead of the database. Whenever a view
+prices the cart (store.pricing) the summary is stored together with the cart
+version read *before* pricing. The CartItem, Product and ProductSize signals
+bump that version and drop the summary on commit. A summary whose version no
+longer matches was computed from older data and is ignored, so a slow request
+can never store a stale count over a newer change.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .cache_versions import bump_version, get_version
+
+
+@dataclass(frozen=True)
+class CartSummary:
+    count: int
+    subtotal: Decimal
+    version: int
+
+
+EMPTY_SUMMARY = CartSummary(0, Decimal('0.00'), 0)
+
+
+def _cache():
+    return caches[getattr(settings, 'STORE_CART_CACHE', 'default')]
+
+
+def _keys(user_id):
+    return f'store:cart:{user_id}', f'store:cart:{user_id}:version'
+
+
+def current_version(user_id):
+    return get_version(_cache(), _keys(user_id)[1])
+
+
+def store_cart_summary(user_id, pricing, version):
+    """Cache the summary of a freshly computed CartPricing"""
+    summary_key, _ = _keys(user_id)
+    _cache().set(summary_key, (pricing.count, str(pricing.subtotal), version), timeout=None)
+
+
+def get_cart_summary(request):
+    """
+    The request user's cart summary: from the pricing already computed for
+    this request, else from the cache (no queries), and only when neither is
+    available from the database.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return EMPTY_SUMMARY
+    pricing = getattr(request, '_cart_pricing', None)
+    if pricing is None:
+        summary_key, version_key = _keys(user.pk)
+        cached = _cache().get_many([summary_key, version_key])
+        summary, version = cached.get(summary_key), cached.get(version_key)
+        if summary is not None and summary[2] == version:
+            return CartSummary(summary[0], Decimal(summary[1]), summary[2])
+
+        from .pricing import get_cart_pricing
+        pricing = get_cart_pricing(request)
+    return CartSummary(pricing.count, pricing.subtotal, request._cart_pricing_version)
+
+
+def invalidate_cart_summary(user_id):
+    """Mark the user's cached summary stale once the current transaction commits"""
+    def apply():
+        cache = _cache()
+        summary_key, version_key = _keys(user_id)
+        bump_version(cache, version_key)
+        cache.delete(summary_key)
+
+    transaction.on_commit(apply)
@@ -0,0 +1,136 @@
+"""
+Process-wide cache of the category hierarchy used for site navigation.
+
+The tree is loaded with a single query and kept as immutable nodes. A version
+number kept in a Django cache (``STORE_CATEGORY_CACHE``) tells each worker
+process when its copy is stale; the Category save/delete signals bump it.
+With a shared backend (file based or database cache) invalidation reaches
+every worker, with the default locmem cache it is per process.
+"""
+import threading
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.fields.files import ImageFieldFile
+from django.urls import reverse
+
+from .cache_versions import bump_version, get_version
+
+VERSION_KEY = 'store:category_tree:version'
+TREE_KEY = 'store:category_tree:{version}'
+TREE_TIMEOUT = 60 * 60 * 24
+
+_local = {'version': None, 'tree': None}
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True, slots=True)
+class CategoryNode:
+    """Read-only snapshot of a Category usable in place of the model in templates"""
+    id: int
+    name: str
+    slug: str
+    description: str
+    image: ImageFieldFile  # Unbound, but with the model's storage, so .url works in templates
+    parent_id: int | None
+    path: str = ''
+    children: tuple = ()
+
+    def __str__(self):
+        return self.name
+
+    def get_absolute_url(self):
+        return reverse('store:category_detail', args=[self.slug])
+
+    @property
+    def is_subcategory(self):
+        return self.parent_id is not None
+
+    def get_subcategories(self):
+        return self.children
+
+
+@dataclass(frozen=True, slots=True)
+class CategoryTree:
+    roots: tuple
+    nodes: dict
+
+    @property
+    def all(self):
+        return tuple(sorted(self.nodes.values(), key=lambda node: node.name))
+
+    @property
+    def children_map(self):
+        """Map of root node -> child nodes, the shape the navigation templates expect"""
+        return {root: root.children for root in self.roots}
+
+    def get(self, category_id):
+        return self.nodes.get(category_id)
+
+
+def _cache():
+    return caches[getattr(settings, 'STORE_CATEGORY_CACHE', 'default')]
+
+
+def build_category_tree():
+    """Load every category in one query and assemble the immutable tree"""
+    from .models import Category
+
+    image_field = Category._meta.get_field('image')
+    rows = list(
+        Category.objects.order_by('name').values_list(
+            'id', 'name', 'slug', 'description', 'image', 'parent_id', 'path'
+        )
+    )
+    children_ids = {}
+    for row in rows:
+        children_ids.setdefault(row[5], []).append(row[0])
+    by_id = {row[0]: row for row in rows}
+    nodes = {}
+
+    def build(category_id, seen=()):
+        if category_id in nodes:
+            return nodes[category_id]
+        # Guard against accidental parent cycles in the data
+        child_ids = [c for c in children_ids.get(category_id, []) if c not in seen]
+        children = tuple(build(c, seen + (category_id,)) for c in child_ids)
+        row = by_id[category_id]
+        nodes[category_id] = CategoryNode(
+            id=row[0], name=row[1], slug=row[2], description=row[3],
+            image=image_field.attr_class(None, image_field, row[4] or ''), parent_id=row[5], path=row[6], children=children,
+        )
+        return nodes[category_id]
+
+    roots = tuple(build(category_id) for category_id in children_ids.get(None, []))
+    for category_id in by_id:
+        build(category_id)
+    return CategoryTree(roots=roots, nodes=nodes)
+
+
+def get_category_tree():
+    """Return the current category tree, rebuilding it only when the version changed"""
+    cache = _cache()
+    version = get_version(cache, VERSION_KEY)
+    tree = _local['tree']
+    if tree is not None and _local['version'] == version:
+        return tree
+
+    with _lock:
+        if _local['tree'] is not None and _local['version'] == version:
+            return _local['tree']
+        tree = cache.get(TREE_KEY.format(version=version))
+        if tree is None:
+            tree = build_category_tree()
+            cache.set(TREE_KEY.format(version=version), tree, timeout=TREE_TIMEOUT)
+        _local['version'] = version
+        _local['tree'] = tree
+    return tree
+
+
+def invalidate_category_tree():
+    """Bump the shared version so every process rebuilds its tree on next use"""
+    bump_version(_cache(), VERSION_KEY)
+    with _lock:
+        _local['version'] = None
+        _local['tree'] = None
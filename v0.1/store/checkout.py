@@ -0,0 +1,135 @@
+"""
+Order placement.
+
+Stock is taken with conditional ``UPDATE ... SET stock = stock - n WHERE
+stock >= n`` statements inside one transaction, so concurrent checkouts of
+the same SKU can never oversell: the database serializes the decrements and
+a line that no longer fits makes the whole order roll back. Units the
+customer holds from ``checkout`` (see store.reservations) are claimed in the
+same transaction; other customers' holds are never sold. Every change is
+recorded in the inventory ledger (store.inventory).
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .inventory import RELEASE, RETURN, SALE, movement, record, sku_queryset
+from .models import Order, OrderItem, ShippingAddress
+from .order_numbers import generate_order_number
+from .pricing import unit_price
+from .reservations import claim_holds, release_unclaimed
+
+
+class OutOfStock(Exception):
+    """Raised when a cart line can no longer be fulfilled"""
+
+    def __init__(self, item):
+        self.item = item
+        if item.size_id:
+            message = (f"Sorry, there is not enough stock of {item.product.name} "
+                       f"in size {item.size.get_size_display()} for this order.")
+        else:
+            message = f"Sorry, there is not enough stock of {item.product.name} for this order."
+        super().__init__(message)
+
+
+def _stock_queryset(item):
+    return sku_queryset(item.product_id, item.size_id)
+
+
+def take_stock(item, held=0):
+    """
+    Atomically decrement the stock for one cart line, or raise OutOfStock.
+    ``held`` units were reserved for this customer and are released from
+    ``reserved`` in the same update.
+    """
+    updated = _stock_queryset(item).filter(stock__gte=F('reserved') - held + item.quantity).update(
+        stock=F('stock') - item.quantity,
+        reserved=Greatest(F('reserved') - held, 0),
+    )
+    if not updated:
+        raise OutOfStock(item)
+
+
+def return_stock(item):
+    _stock_queryset(item).update(stock=F('stock') + item.quantity)
+
+
+def _lock_order(item):
+    # Touch rows in a consistent order so concurrent orders cannot deadlock
+    return (item.size_id or 0, item.product_id)
+
+
+def place_order(user, cart_items, shipping_data, payment_method, totals, payment_status='pending'):
+    """
+    Take stock for every line and create the order, its shipping address and
+    items in one transaction. ``cart_items`` must have product and size loaded;
+    ``totals`` holds ``total``, ``shipping_cost`` and ``tax_amount``.
+    """
+    cart_items = sorted(cart_items, key=_lock_order)
+    # Reserved before the transaction so the number comes from this process's block
+    order_number = generate_order_number()
+    with transaction.atomic():
+        held = claim_holds(user)
+        claimed = {}
+        for item in cart_items:
+            key = (item.product_id, item.size_id)
+            # Custom prints at different heights are separate lines of one SKU
+            units = held.pop(key, 0)
+            claimed[key] = claimed.get(key, 0) + units
+            take_stock(item, units)
+        release_unclaimed(held)
+
+        shipping_address = ShippingAddress.objects.create(
+            first_name=shipping_data['first_name'],
+            last_name=shipping_data['last_name'],
+            email=shipping_data['email'],
+            address=shipping_data['address'],
+            city=shipping_data['city'],
+            state=shipping_data['state'],
+            zip_code=shipping_data['zip_code'],
+            phone=shipping_data['phone']
+        )
+        order = Order.objects.create(
+            order_number=order_number,
+            user=user,
+            email=shipping_data['email'],
+            shipping_address=shipping_address,
+            total_amount=totals['total'],
+            shipping_cost=totals['shipping_cost'],
+            tax_amount=totals['tax_amount'],
+            status='pending',
+            payment_method=payment_method,
+            payment_status=payment_status
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item.product,
+                price=unit_price(item),
+                quantity=item.quantity,
+                size=item.size.get_size_display() if item.size_id else None,
+                print_height=item.print_height,
+            )
+            for item in cart_items
+        ])
+        record(
+            [movement(SALE, item.product_id, item.size_id, -item.quantity, order=order) for item in cart_items]
+            + [movement(RELEASE, *key, -units, order=order, note='Sold') for key, units in claimed.items()]
+        )
+    return order
+
+
+def cancel_order(order, cart_items):
+    """Undo place_order (e.g. when the payment is declined): return the stock and delete the order"""
+    with transaction.atomic():
+        for item in sorted(cart_items, key=_lock_order):
+            return_stock(item)
+        record([
+            movement(RETURN, item.product_id, item.size_id, item.quantity, note=f'Order {order.order_number} cancelled')
+            for item in cart_items
+        ])
+        shipping_address = order.shipping_address
+        order.delete()
+        if shipping_address is not None:
+            shipping_address.delete()
@@ -0,0 +1,148 @@
+"""
+Faceted filtering for the product catalog.
+
+Shoppers can combine price bands, sizes, in-stock and a category drill-down.
+All facet counts are computed in a single aggregate query. Each count applies
+every selected filter except the one of its own facet, so the other options
+of a multi-select facet keep showing how many products they would add.
+"""
+from dataclasses import dataclass
+
+from django.db.models import Count, Exists, F, OuterRef, Q
+
+from .models import ProductSize, path_q
+
+# (value, label, lower bound inclusive, upper bound exclusive)
+PRICE_BANDS = [
+    ('under-25', 'Under $25', None, 25),
+    ('25-50', '$25 to $50', 25, 50),
+    ('50-100', '$50 to $100', 50, 100),
+    ('100-plus', '$100 & above', 100, None),
+]
+
+SIZE_LABELS = dict(ProductSize.SIZE_CHOICES)
+
+
+@dataclass(frozen=True)
+class FacetOption:
+    value: str
+    label: str
+    count: int
+    selected: bool
+
+
+@dataclass(frozen=True)
+class Facet:
+    param: str
+    label: str
+    options: tuple
+    multiple: bool = True
+
+
+def price_band_q(value):
+    for band, _, lower, upper in PRICE_BANDS:
+        if band == value:
+            condition = Q()
+            if lower is not None:
+                condition &= Q(price__gte=lower)
+            if upper is not None:
+                condition &= Q(price__lt=upper)
+            return condition
+    return None
+
+
+def size_q(sizes):
+    return Q(Exists(ProductSize.objects.filter(product=OuterRef('pk'), size__in=sizes)))
+
+
+def in_stock_q():
+    # Units held by open checkouts are not available
+    return Q(stock__gt=F('reserved')) | Q(size_stock__gt=0)
+
+
+def category_q(category):
+    return path_q(category.path, 'category__path')
+
+
+class ProductFacets:
+    """
+    Parse the facet selection from a query dict and compute the counts for
+    ``queryset`` (the products already narrowed by category and search).
+    ``child_categories`` are the category tree nodes offered for drill-down.
+    """
+
+    def __init__(self, queryset, params, child_categories=()):
+        self.queryset = queryset
+        self.child_categories = tuple(child_categories)
+        self.prices = [value for value in params.getlist('price') if price_band_q(value) is not None]
+        self.sizes = [value for value in params.getlist('size') if value in SIZE_LABELS]
+        self.in_stock = params.get('in_stock') == '1'
+        self._counts = None
+
+    @property
+    def active(self):
+        return bool(self.prices or self.sizes or self.in_stock)
+
+    def _filters(self, exclude=None):
+        """Q for every selected facet except ``exclude``"""
+        condition = Q()
+        if self.prices and exclude != 'price':
+            bands = Q()
+            for value in self.prices:
+                bands |= price_band_q(value)
+            condition &= bands
+        if self.sizes and exclude != 'size':
+            condition &= size_q(self.sizes)
+        if self.in_stock and exclude != 'in_stock':
+            condition &= in_stock_q()
+        return condition
+
+    def filter(self, queryset):
+        """Apply the selected facets to a product queryset"""
+        return queryset.filter(self._filters()) if self.active else queryset
+
+    def counts(self):
+        """Every facet count plus the total for the current selection, in one query"""
+        if self._counts is None:
+            aggregates = {'total': Count('pk', filter=self._filters())}
+            other = self._filters(exclude='price')
+            for value, _, _, _ in PRICE_BANDS:
+                aggregates[f'price:{value}'] = Count('pk', filter=price_band_q(value) & other)
+            other = self._filters(exclude='size')
+            for value in SIZE_LABELS:
+                aggregates[f'size:{value}'] = Count('pk', filter=size_q([value]) & other)
+            aggregates['in_stock:1'] = Count('pk', filter=in_stock_q() & self._filters(exclude='in_stock'))
+            other = self._filters()
+            for node in self.child_categories:
+                aggregates[f'category:{node.slug}'] = Count('pk', filter=category_q(node) & other)
+            self._counts = self.queryset.order_by().aggregate(**aggregates)
+        return self._counts
+
+    @property
+    def total(self):
+        return self.counts()['total']
+
+    def facets(self):
+        """Facets with their options and counts, for the templates"""
+        counts = self.counts()
+        facets = []
+        if self.child_categories:
+            facets.append(Facet('category', 'Category', tuple(
+                FacetOption(node.slug, node.name, counts[f'category:{node.slug}'], False)
+                for node in self.child_categories
+                if counts[f'category:{node.slug}']
+            ), multiple=False))
+        facets.append(Facet('price', 'Price', tuple(
+            FacetOption(value, label, counts[f'price:{value}'], value in self.prices)
+            for value, label, _, _ in PRICE_BANDS
+            if counts[f'price:{value}'] or value in self.prices
+        )))
+        facets.append(Facet('size', 'Size', tuple(
+            FacetOption(value, label, counts[f'size:{value}'], value in self.sizes)
+            for value, label in SIZE_LABELS.items()
+            if counts[f'size:{value}'] or value in self.sizes
+        )))
+        facets.append(Facet('in_stock', 'Availability', (
+            FacetOption('1', 'In stock', counts['in_stock:1'], self.in_stock),
+        ), multiple=False))
+        return [facet for facet in facets if facet.options]
@@ -0,0 +1,88 @@
+"""
+A local stand-in for the Stripe charges API, for offline benchmarks.
+
+FakeStripeServer answers ``POST /v1/charges`` after a fixed latency, like a
+remote payment provider. It honours the ``Idempotency-Key`` header (a repeated
+key returns the first response) and declines the ``tok_chargeDeclined`` test
+token. Point ``STRIPE_API_BASE`` at it, or use it from ``benchmark_payments``.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from .payments import DECLINED_TOKEN
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        body = parse_qs(self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode())
+        params = {key: values[0] for key, values in body.items()}
+        if self.path.rstrip('/') != '/v1/charges':
+            return self._send(404, {'error': {'type': 'invalid_request_error', 'message': 'Unknown path'}})
+
+        key = self.headers.get('Idempotency-Key')
+        with server.lock:
+            replay = server.responses.get(key) if key else None
+        if replay is not None:
+            return self._send(*replay, replayed=True)
+
+        time.sleep(server.latency)
+        if params.get('source') == DECLINED_TOKEN:
+            response = (402, {'error': {
+                'type': 'card_error', 'code': 'card_declined', 'message': 'Your card was declined.'
+            }})
+        else:
+            response = (200, {
+                'id': f'ch_fake_{uuid.uuid4().hex[:24]}',
+                'object': 'charge',
+                'amount': int(params.get('amount', 0)),
+                'currency': params.get('currency', 'usd'),
+                'description': params.get('description'),
+                'paid': True,
+                'status': 'succeeded',
+            })
+        with server.lock:
+            if key:
+                server.responses[key] = response
+            server.charges += response[0] == 200
+        self._send(*response)
+
+    def _send(self, status, payload, replayed=False):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Request-Id', f'req_fake_{uuid.uuid4().hex[:14]}')
+        if replayed:
+            self.send_header('Idempotent-Replayed', 'true')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.2):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.responses = {}
+        self.charges = 0
+
+    @property
+    def api_base(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serve from a daemon thread; returns the thread"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,241 @@
+"""
+Responsive image derivatives.
+
+Every ProductImage gets fixed-width WebP and JPEG variants (``STORE_IMAGE_WIDTHS``,
+never wider than the upload) stored next to the original, e.g.
+``products/mug.3f2a9c81d0e4.640w.webp``. The name carries a hash of the
+original's content, so a variant URL never changes meaning and can be cached
+forever, and replacing the upload produces new names. The row keeps the hash
+and the variant names; ProductImage.srcset and the ``responsive_image``
+template tag turn them into ``srcset`` attributes.
+
+Resizing runs in a process pool (``STORE_IMAGE_WORKERS`` processes; 0 resizes
+in the calling thread). Uploads are queued on commit by a signal; a thread
+per worker process waits for each render and stores the result, so slow
+storage never holds up the pool. The ``generate_image_variants`` command
+backfills existing images, reading each original only when a worker is free
+for it.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WIDTHS = (320, 640, 960, 1280)
+DEFAULT_WORKERS = 2
+HASH_LENGTH = 12
+# Images read and queued per worker process during a backfill
+IN_FLIGHT_PER_WORKER = 2
+
+# format -> (Pillow format, file extension, save options)
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_pool = None
+_store_threads = None
+_pool_lock = threading.Lock()
+
+
+def variant_widths():
+    return tuple(getattr(settings, 'STORE_IMAGE_WIDTHS', DEFAULT_WIDTHS))
+
+
+def _workers():
+    return getattr(settings, 'STORE_IMAGE_WORKERS', DEFAULT_WORKERS)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def variant_name(original, digest, width, fmt):
+    """Storage name of one variant, next to ``original``"""
+    stem, _ = os.path.splitext(original)
+    return f'{stem}.{digest}.{width}w.{FORMATS[fmt][1]}'
+
+
+def _target_widths(width, widths):
+    # Every configured width narrower than the original, plus the original
+    # width itself (capped at the widest variant) so small uploads get one too
+    return sorted({w for w in widths if w < width} | {min(width, max(widths))})
+
+
+def _flatten(image):
+    """RGB copy of ``image`` with any transparency composited onto white"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        flat = Image.new('RGB', rgba.size, 'white')
+        flat.paste(rgba, mask=rgba.getchannel('A'))
+        return flat
+    return image.convert('RGB')
+
+
+def render_variants(data, widths):
+    """
+    Resize the encoded image ``data`` to each target width in every format;
+    returns ``{fmt: {width: bytes}}``. Runs in the worker processes, so it
+    only uses Pillow.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    rendered = {fmt: {} for fmt in FORMATS}
+    for width in _target_widths(image.width, widths):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt, (pil_format, _, options) in FORMATS.items():
+            if fmt == 'jpeg':
+                frame = _flatten(resized)
+            else:
+                frame = resized.convert('RGBA' if has_alpha else 'RGB')
+            buffer = io.BytesIO()
+            frame.save(buffer, pil_format, **options)
+            rendered[fmt][width] = buffer.getvalue()
+    return rendered
+
+
+def _read(image):
+    with image.image.open('rb') as handle:
+        return handle.read()
+
+
+def variant_names(variants):
+    return [name for by_width in variants.values() for name in by_width.values()]
+
+
+def _store(image_id, original, digest, rendered):
+    """Save rendered variants and point the row at them, deleting the set they replace"""
+    from .models import ProductImage
+    from .product_columns import refresh_image_columns
+
+    storage = ProductImage._meta.get_field('image').storage
+    variants = {}
+    for fmt, by_width in rendered.items():
+        for width, data in by_width.items():
+            name = variant_name(original, digest, width, fmt)
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(data))
+            variants.setdefault(fmt, {})[str(width)] = name
+
+    row = ProductImage.objects.filter(pk=image_id).values('product_id', 'variants').first()
+    previous = row['variants'] if row else {}
+    # update() rather than save(): no signals, and a newer upload is never overwritten
+    with transaction.atomic():
+        updated = ProductImage.objects.filter(pk=image_id, image=original).update(variants=variants, variant_hash=digest)
+        if updated:
+            refresh_image_columns([row['product_id']])
+    if updated:
+        stale = set(variant_names(previous)) - set(variant_names(variants))
+    else:
+        stale = set(variant_names(variants))
+    for name in stale:
+        storage.delete(name)
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=_workers())
+    return _pool
+
+
+def _get_store_threads():
+    global _store_threads
+    if _store_threads is None:
+        with _pool_lock:
+            if _store_threads is None:
+                _store_threads = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='image-variants')
+    return _store_threads
+
+
+def _pending(images, force):
+    """``(image, data, digest)`` for the images whose variants are missing or stale"""
+    for image in images:
+        if not image.image:
+            continue
+        try:
+            data = _read(image)
+        except OSError:
+            logger.warning('Cannot read %s; skipping its variants', image.image.name)
+            continue
+        digest = content_hash(data)
+        if force or digest != image.variant_hash:
+            yield image, data, digest
+
+
+def generate_variants(images, workers=None, force=False):
+    """
+    Create the variants of ``images`` (ProductImages) that are missing or
+    stale, resizing up to ``workers`` images in parallel. Returns the number
+    of images processed.
+    """
+    workers = _workers() if workers is None else workers
+    widths = variant_widths()
+    done = 0
+    if workers == 0:
+        for image, data, digest in _pending(images, force):
+            _store(image.pk, image.image.name, digest, render_variants(data, widths))
+            done += 1
+        return done
+
+    pending = _pending(images, force)
+    in_flight = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # Read the next originals only as renders finish, so a backfill holds a few in memory
+            while len(in_flight) < workers * IN_FLIGHT_PER_WORKER:
+                item = next(pending, None)
+                if item is None:
+                    break
+                image, data, digest = item
+                in_flight[pool.submit(render_variants, data, widths)] = (image, digest)
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                image, digest = in_flight.pop(future)
+                try:
+                    _store(image.pk, image.image.name, digest, future.result())
+                except Exception:
+                    logger.exception('Could not create the variants of %s', image.image.name)
+                    continue
+                done += 1
+    return done
+
+
+def schedule_variants(image):
+    """Create the variants of a newly saved ProductImage in the background pool"""
+    pending = list(_pending([image], force=False))
+    if not pending:
+        return
+    _, data, digest = pending[0]
+    image_id, original = image.pk, image.image.name
+    if _workers() == 0:
+        _store(image_id, original, digest, render_variants(data, variant_widths()))
+        return
+
+    def render_and_store():
+        # Runs on a store thread, which has its own database connection
+        try:
+            rendered = _get_pool().submit(render_variants, data, variant_widths()).result()
+            _store(image_id, original, digest, rendered)
+        except Exception:
+            logger.exception('Could not create the variants of %s', original)
+        finally:
+            connection.close()
+
+    _get_store_threads().submit(render_and_store)
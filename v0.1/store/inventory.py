@@ -0,0 +1,181 @@
+"""
+Inventory ledger.
+
+Every change to the stock or the reserved units of a SKU (a product, or one
+size of a product) is recorded as an InventoryMovement. Movement rows are
+only ever inserted, in bulk when one request moves several SKUs, and they are
+written in the same transaction as the F() update of the cached balance
+(``stock`` and ``reserved`` on Product and ProductSize). Stock reads therefore
+stay a column lookup, and the history explains every unit.
+
+The balance row is still updated on every sale: its guarded ``UPDATE ...
+WHERE stock >= n`` is what prevents overselling, and an insert-only ledger
+cannot tell whether the last unit is still there. Concurrent sales of one SKU
+therefore still queue on that row; the ledger adds an insert, not a second
+contended row. Sales of a size leave the parent Product row alone unless the
+size goes in or out of stock (see store.product_columns).
+
+``take_snapshots`` (the ``compact_inventory`` command) periodically folds the
+movements into one InventorySnapshot per changed SKU. ``ledger_balances``
+recomputes the balances from the latest snapshots plus the movements after
+them, to audit the cached columns. Movements covered by a snapshot can be
+pruned.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Max, Q, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import InventoryMovement, InventorySnapshot, Product, ProductSize
+from .product_columns import refresh_size_availability
+
+SALE = 'sale'
+RETURN = 'return'
+RESTOCK = 'restock'
+ADJUSTMENT = 'adjustment'
+RESERVATION = 'reservation'
+RELEASE = 'release'
+
+# Kinds whose quantity changes ``reserved`` rather than ``stock``
+RESERVED_KINDS = (RESERVATION, RELEASE)
+
+# Movements younger than this are left for the next snapshot, so a slow
+# transaction that committed a lower id late is never skipped
+SNAPSHOT_SETTLE = timedelta(minutes=1)
+
+
+def sku_queryset(product_id, size_id):
+    """The row whose stock backs a product (or one of its sizes)"""
+    if size_id:
+        return ProductSize.objects.filter(pk=size_id)
+    return Product.objects.filter(pk=product_id)
+
+
+def sku_key(sku):
+    """``(product_id, size_id)`` for a Product or ProductSize instance"""
+    if isinstance(sku, ProductSize):
+        return (sku.product_id, sku.pk)
+    return (sku.pk, None)
+
+
+def movement(kind, product_id, size_id, quantity, order=None, note=''):
+    """An unsaved movement; ``quantity`` is signed (negative for units leaving)"""
+    return InventoryMovement(
+        kind=kind, product_id=product_id, size_id=size_id, quantity=quantity, order=order, note=note
+    )
+
+
+def record(movements):
+    """
+    Insert movements in one statement, skipping empty ones. Every stock change
+    passes through here, so it also updates the parent products of sizes that
+    went in or out of stock.
+    """
+    movements = [item for item in movements if item.quantity]
+    if movements:
+        InventoryMovement.objects.bulk_create(movements)
+        refresh_size_availability({item.product_id for item in movements if item.size_id})
+
+
+def change_stock(sku, quantity, kind=ADJUSTMENT, note=''):
+    """Add ``quantity`` (may be negative) to the stock of a Product or ProductSize and record it"""
+    product_id, size_id = sku_key(sku)
+    with transaction.atomic():
+        sku_queryset(product_id, size_id).update(stock=F('stock') + quantity)
+        record([movement(kind, product_id, size_id, quantity, note=note)])
+
+
+def restock(sku, quantity, note=''):
+    change_stock(sku, quantity, RESTOCK, note)
+
+
+def _latest_snapshots(skus=None):
+    snapshots = InventorySnapshot.objects.all()
+    if skus is not None:
+        snapshots = snapshots.filter(product_id__in={product_id for product_id, _ in skus})
+    latest = snapshots.annotate(
+        snapshot_rank=Window(
+            RowNumber(),
+            partition_by=[F('product_id'), F('size_id')],
+            order_by=F('last_movement_id').desc(),
+        )
+    ).filter(snapshot_rank=1)
+    return {(snapshot.product_id, snapshot.size_id): snapshot for snapshot in latest}
+
+
+def _totals(movements):
+    """Net stock and reserved change per SKU, in one grouped query"""
+    rows = movements.values('product_id', 'size_id').annotate(
+        stock_change=Sum('quantity', filter=~Q(kind__in=RESERVED_KINDS)),
+        reserved_change=Sum('quantity', filter=Q(kind__in=RESERVED_KINDS)),
+    ).order_by()
+    return {
+        (row['product_id'], row['size_id']): (row['stock_change'] or 0, row['reserved_change'] or 0)
+        for row in rows
+    }
+
+
+def _watermark():
+    """Highest movement id included by every snapshot so far"""
+    return InventorySnapshot.objects.aggregate(watermark=Max('last_movement_id'))['watermark'] or 0
+
+
+def take_snapshots(prune_before=None):
+    """
+    Fold the settled movements since the last run into new snapshots for the
+    SKUs they touched; returns the number of snapshots written. With
+    ``prune_before`` (a datetime), movements and superseded snapshots older
+    than that which are covered by the new snapshots are deleted.
+    """
+    with transaction.atomic():
+        previous = _watermark()
+        settled = InventoryMovement.objects.filter(id__gt=previous, created_at__lte=timezone.now() - SNAPSHOT_SETTLE)
+        last_id = settled.aggregate(last_id=Max('id'))['last_id']
+        if last_id is None:
+            return 0
+        totals = _totals(InventoryMovement.objects.filter(id__gt=previous, id__lte=last_id))
+        latest = _latest_snapshots(totals)
+        snapshots = []
+        for key, (stock_change, reserved_change) in totals.items():
+            base = latest.get(key)
+            snapshots.append(InventorySnapshot(
+                product_id=key[0],
+                size_id=key[1],
+                stock=(base.stock if base else 0) + stock_change,
+                reserved=(base.reserved if base else 0) + reserved_change,
+                last_movement_id=last_id,
+            ))
+        InventorySnapshot.objects.bulk_create(snapshots)
+
+        if prune_before is not None:
+            InventoryMovement.objects.filter(id__lte=last_id, created_at__lt=prune_before).delete()
+            current = [snapshot.pk for snapshot in _latest_snapshots().values()]
+            InventorySnapshot.objects.filter(created_at__lt=prune_before).exclude(pk__in=current).delete()
+    return len(snapshots)
+
+
+def ledger_balances():
+    """``{(product_id, size_id): (stock, reserved)}`` rebuilt from the snapshots and later movements"""
+    balances = {key: (snapshot.stock, snapshot.reserved) for key, snapshot in _latest_snapshots().items()}
+    for key, (stock_change, reserved_change) in _totals(InventoryMovement.objects.filter(id__gt=_watermark())).items():
+        stock, reserved = balances.get(key, (0, 0))
+        balances[key] = (stock + stock_change, reserved + reserved_change)
+    return balances
+
+
+def find_drift():
+    """SKUs whose cached ``stock``/``reserved`` disagree with the ledger: ``{key: (cached, ledger)}``"""
+    cached = {}
+    for pk, stock, reserved in Product.objects.values_list('pk', 'stock', 'reserved'):
+        cached[(pk, None)] = (stock, reserved)
+    for pk, product_id, stock, reserved in ProductSize.objects.values_list('pk', 'product_id', 'stock', 'reserved'):
+        cached[(product_id, pk)] = (stock, reserved)
+    ledger = ledger_balances()
+    drift = {}
+    for key in cached.keys() | ledger.keys():
+        values = cached.get(key, (0, 0)), ledger.get(key, (0, 0))
+        if values[0] != values[1]:
+            drift[key] = values
+    return drift
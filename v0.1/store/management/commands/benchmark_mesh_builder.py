@@ -0,0 +1,77 @@
+import math
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from stl import mesh
+
+from store import mesh_builder
+
+
+def star(points, outer=1.0, inner=0.5):
+    """Outline of a star with ``points`` tips, for the extrusion benchmark"""
+    angles = np.linspace(0, 2 * np.pi, 2 * points, endpoint=False)
+    radii = np.where(np.arange(2 * points) % 2, inner, outer)
+    return np.stack([radii * np.cos(angles), radii * np.sin(angles)], axis=-1)
+
+
+def primitives(target):
+    """``{name: builder}`` of meshes with roughly ``target`` triangles each"""
+    side = max(4, int(math.sqrt(target)))
+    return {
+        'cylinder': lambda: mesh_builder.cylinder(1.0, 2.0, segments=max(3, target // 4)),
+        'sphere': lambda: mesh_builder.sphere(1.0, segments=side, rings=max(3, side // 2 + 1)),
+        'torus': lambda: mesh_builder.torus(2.0, 0.5, segments=side, tube_segments=max(3, side // 2)),
+        'extrusion': lambda: mesh_builder.extrude(star(max(3, target // 8)), 0.5),
+    }
+
+
+def fill_with_loops(vertices, faces):
+    """Corner by corner, as create_sample_stl.py used to build its meshes"""
+    model = mesh.Mesh(np.zeros(faces.shape[0], dtype=mesh.Mesh.dtype))
+    for i, f in enumerate(faces):
+        for j in range(3):
+            model.vectors[i][j] = vertices[f[j]]
+    return model
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+class Command(BaseCommand):
+    help = 'Times building large meshes with store.mesh_builder against filling them corner by corner'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--triangles', type=int, default=1_000_000, help='Approximate triangles per mesh')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the fastest counts')
+        parser.add_argument('--loop-sample', type=int, default=20_000,
+                            help='Triangles filled by the Python loop baseline (extrapolated to the full mesh)')
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        self.stdout.write(f"{'mesh':<10}{'triangles':>11}{'build':>10}{'corners':>10}{'stl':>10}{'rate':>16}")
+        for name, build in primitives(options['triangles']).items():
+            build_time, (vertices, faces) = best_of(repeat, build)
+            corner_time, _ = best_of(repeat, lambda: mesh_builder.triangles(vertices, faces))
+            stl_time, _ = best_of(repeat, lambda: mesh_builder.to_stl(vertices, faces))
+            count = len(faces)
+            self.stdout.write(
+                f'{name:<10}{count:>11,}{build_time * 1000:>8.0f}ms{corner_time * 1000:>8.0f}ms'
+                f'{stl_time * 1000:>8.0f}ms{count / (build_time + corner_time) / 1e6:>10.1f}M tri/s'
+            )
+
+        vertices, faces = mesh_builder.torus(2.0, 0.5, segments=200, tube_segments=100)
+        sample = faces[:options['loop_sample']]
+        loop_time, _ = best_of(1, lambda: fill_with_loops(vertices, sample))
+        vector_time, _ = best_of(repeat, lambda: mesh_builder.triangles(vertices, sample))
+        per_million = loop_time / len(sample) * 1e6
+        self.stdout.write(
+            f'Python loop baseline: {len(sample):,} triangles in {loop_time * 1000:.0f}ms '
+            f'(~{per_million:.1f}s per million), {loop_time / max(vector_time, 1e-9):.0f}x slower than vertices[faces]'
+        )
@@ -0,0 +1,75 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from stl import mesh
+
+from store.mesh_format import decode_mesh
+from store.meshes import compiled_dir, models_dir, read_manifest
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def kilobytes(size):
+    return f'{size / 1024:.1f} KB' if size is not None else '-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the size and parse time of every hero model as source STL, compiled binary STL '
+        'and compact .mesh (raw, gzip and brotli)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Parses per file; the fastest counts')
+
+    def handle(self, *args, **options):
+        models = read_manifest()['models']
+        if not models:
+            raise CommandError('No compiled models; run the ingest_models command first.')
+        repeat = max(1, options['repeat'])
+        output_dir = compiled_dir()
+        totals = {'source': 0, 'stl': 0, 'mesh': 0, 'gzip': 0, 'br': 0}
+
+        for source, entry in models.items():
+            if 'mesh' not in entry:
+                self.stdout.write(f'{source}: no compact mesh; run ingest_models again.')
+                continue
+            source_path = os.path.join(models_dir(), source)
+            stl_path = os.path.join(output_dir, entry['file'])
+            mesh_path = os.path.join(output_dir, entry['mesh']['file'])
+            with open(mesh_path, 'rb') as handle:
+                data = handle.read()
+            source_time = best_of(repeat, lambda: mesh.Mesh.from_file(source_path))
+            stl_time = best_of(repeat, lambda: mesh.Mesh.from_file(stl_path))
+            mesh_time = best_of(repeat, lambda: decode_mesh(data))
+
+            compact = entry['mesh']
+            sizes = {
+                'source': entry['source_bytes'], 'stl': entry['bytes'], 'mesh': compact['bytes'],
+                'gzip': compact.get('gzip_bytes'), 'br': compact.get('br_bytes'),
+            }
+            smallest = min(size for size in sizes.values() if size)
+            for key, size in sizes.items():
+                totals[key] += size or 0
+            self.stdout.write(
+                f"{source:<24} {entry['triangles']:>7} triangles  "
+                f"source {kilobytes(sizes['source'])} ({source_time * 1000:.1f}ms)  "
+                f"stl {kilobytes(sizes['stl'])} ({stl_time * 1000:.1f}ms)  "
+                f"mesh {kilobytes(sizes['mesh'])} ({mesh_time * 1000:.1f}ms), "
+                f"gzip {kilobytes(sizes['gzip'])}, br {kilobytes(sizes['br'])}  "
+                f"{sizes['stl'] / smallest:.1f}x smaller than the STL; "
+                f"{entry['triangles'] * 3} -> {entry['vertices']} vertices to upload"
+            )
+
+        self.stdout.write(
+            'Total: ' + ', '.join(f'{key} {kilobytes(size)}' for key, size in totals.items())
+            + ". Parse times are Python's (numpy-stl vs store.mesh_format), not a browser's."
+        )
@@ -0,0 +1,89 @@
+import multiprocessing
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+
+from store.models import Order
+from store.order_numbers import generate_order_number, get_order_number_generator
+
+User = get_user_model()
+
+
+def _worker(count, user_id, create_orders, queue):
+    # Runs in a forked process: never share the parent's database connection
+    connections.close_all()
+    numbers, errors = [], 0
+    started = time.perf_counter()
+    try:
+        for _ in range(count):
+            try:
+                if create_orders:
+                    order = Order.objects.create(
+                        user_id=user_id, email='bench@example.com', total_amount=Decimal('0.00')
+                    )
+                    numbers.append(order.order_number)
+                else:
+                    numbers.append(generate_order_number())
+            except DatabaseError:
+                # e.g. SQLite "database is locked"; a duplicate number would also land here
+                errors += 1
+    finally:
+        connections.close_all()
+    queue.put((numbers, errors, time.perf_counter() - started))
+
+
+class Command(BaseCommand):
+    help = 'Generates order numbers from parallel worker processes and checks that none collide'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='Number of worker processes')
+        parser.add_argument('--count', type=int, default=2000, help='Order numbers per worker')
+        parser.add_argument('--create-orders', action='store_true',
+                            help='Insert an Order row for every number instead of only generating numbers')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in (':memory:', ''):
+            raise CommandError('The benchmark needs a database that all processes can share.')
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('The benchmark needs the "fork" start method.')
+
+        user = None
+        if options['create_orders']:
+            stamp = str(int(time.time() * 1000))
+            user = User.objects.create_user(username=f'bench-{stamp}', email=f'bench-{stamp}@example.com')
+
+        generator = type(get_order_number_generator()).__name__
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        connections.close_all()
+        started = time.perf_counter()
+        workers = [
+            context.Process(target=_worker, args=(options['count'], user and user.pk, options['create_orders'], queue))
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        results = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        numbers = [number for worker_numbers, _, _ in results for number in worker_numbers]
+        errors = sum(worker_errors for _, worker_errors, _ in results)
+        duplicates = len(numbers) - len(set(numbers))
+        self.stdout.write(
+            f"{generator}: {len(numbers)} order numbers from {options['processes']} processes in {elapsed:.2f}s "
+            f"({len(numbers) / elapsed:,.0f}/s), {duplicates} duplicates, {errors} errors"
+        )
+        if numbers:
+            self.stdout.write(f'First {min(numbers)}, last {max(numbers)}')
+
+        if user is not None:
+            user.delete()
+
+        if duplicates:
+            raise CommandError('Order numbers collided.')
+        self.stdout.write(self.style.SUCCESS('No collisions.'))
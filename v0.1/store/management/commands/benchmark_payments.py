@@ -0,0 +1,142 @@
+import asyncio
+import json
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+
+from store.fake_stripe import FakeStripeServer
+from store.models import Cart, CartItem, Category, Order, Product
+
+User = get_user_model()
+
+SHIPPING = {
+    'first_name': 'Bench', 'last_name': 'Mark', 'email': 'bench@example.com',
+    'address': '1 Test St', 'city': 'Test', 'state': 'TS', 'zip_code': '00000', 'phone': '0000000000',
+}
+PAYLOAD = json.dumps({'token': 'tok_visa', 'shipping': SHIPPING, 'payment_method': 'card'})
+
+
+class Command(BaseCommand):
+    help = (
+        'Pays for many carts through process_payment against a fake Stripe server, once with '
+        'blocking workers (like WSGI) and once on a single event loop (like one ASGI worker)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=100, help='Checkouts per mode')
+        parser.add_argument('--latency', type=float, default=0.2, help='Seconds the fake Stripe takes per charge')
+        parser.add_argument('--workers', type=int, default=4, help='Request workers in the blocking mode')
+        parser.add_argument('--payment-workers', type=int, default=32,
+                            help='STORE_PAYMENT_WORKERS, i.e. charges in flight per process')
+        parser.add_argument('--api-base', help='Use this Stripe-compatible server instead of starting one')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated test data')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in (':memory:', ''):
+            raise CommandError('The benchmark needs a database that all threads can share.')
+
+        server = None
+        api_base = options['api_base']
+        if not api_base:
+            server = FakeStripeServer(latency=options['latency'])
+            server.start()
+            api_base = server.api_base
+
+        stamp = str(int(time.time() * 1000))
+        category = Category.objects.create(name=f'Bench {stamp}', slug=f'bench-{stamp}')
+        product = Product.objects.create(
+            category=category, name=f'Bench SKU {stamp}', slug=f'bench-sku-{stamp}',
+            price=Decimal('10.00'), stock=options['checkouts'] * 2
+        )
+        users = []
+        try:
+            with override_settings(
+                STORE_PAYMENT_GATEWAY='stripe', STRIPE_API_BASE=api_base, STRIPE_SECRET_KEY='sk_test_benchmark',
+                STORE_PAYMENT_WORKERS=options['payment_workers'], ALLOWED_HOSTS=['testserver'],
+            ):
+                for mode, run in (('blocking', self.run_blocking), ('event loop', self.run_event_loop)):
+                    batch = self.create_buyers(stamp, mode, product, options['checkouts'])
+                    users += batch
+                    clients = self.login(batch, AsyncClient if mode == 'event loop' else Client)
+                    started = time.perf_counter()
+                    statuses = run(clients, options)
+                    elapsed = time.perf_counter() - started
+                    paid = Order.objects.filter(user__in=batch, payment_status='paid').count()
+                    self.stdout.write(
+                        f'{mode:>10}: {len(batch)} checkouts in {elapsed:.2f}s '
+                        f'({len(batch) / elapsed:.1f}/s), {paid} paid, '
+                        f'{sum(1 for ok in statuses if not ok)} failed'
+                    )
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            if not options['keep']:
+                orders = Order.objects.filter(user__in=users)
+                for order in orders:
+                    order.shipping_address.delete()
+                orders.delete()
+                User.objects.filter(pk__in=[user.pk for user in users]).delete()
+                category.delete()
+            connection.close()
+
+    def create_buyers(self, stamp, mode, product, count):
+        prefix = f"bench-{stamp}-{mode.replace(' ', '-')}"
+        users = [
+            User.objects.create_user(username=f'{prefix}-{n}', email=f'{prefix}-{n}@example.com')
+            for n in range(count)
+        ]
+        for user in users:
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+        return users
+
+    def login(self, users, client_class):
+        clients = []
+        for user in users:
+            client = client_class()
+            client.force_login(user)
+            clients.append(client)
+        return clients
+
+    def run_blocking(self, clients, options):
+        """Each worker thread handles one request at a time, as a sync WSGI worker does"""
+        pending = list(clients)
+        statuses = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        client = pending.pop()
+                    response = client.post('/checkout/process/', PAYLOAD, content_type='application/json')
+                    with lock:
+                        statuses.append(response.json().get('success', False))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def run_event_loop(self, clients, options):
+        """All requests at once on one event loop, as one ASGI worker serves them"""
+        async def pay(client):
+            response = await client.post('/checkout/process/', PAYLOAD, content_type='application/json')
+            return response.json().get('success', False)
+
+        async def run():
+            return await asyncio.gather(*(pay(client) for client in clients))
+
+        return asyncio.run(run())
@@ -0,0 +1,81 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.search import PythonSearchBackend, get_search_backend
+
+
+def synthetic_products(count, vocabulary, seed):
+    """Product rows with Zipf-distributed words, so common words match many products"""
+    rng = random.Random(seed)
+    words = [f'w{index}' for index in range(vocabulary)]
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(vocabulary)))
+
+    def text(low, high):
+        return ' '.join(rng.choices(words, cum_weights=cumulative, k=rng.randint(low, high)))
+
+    for product_id in range(1, count + 1):
+        yield {
+            'id': product_id,
+            'name': text(3, 6),
+            'short_description': text(8, 15),
+            'description': text(30, 60),
+        }
+
+
+def timings(backend, queries, repeat, limit):
+    """Milliseconds of every ``backend.search`` call"""
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            started = time.perf_counter()
+            backend.search(query, limit=limit)
+            samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+class Command(BaseCommand):
+    help = (
+        'Times ranked searches: by default on the in-process backend over a synthetic catalogue, '
+        'with --configured on the configured backend and the real products'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Size of the synthetic catalogue')
+        parser.add_argument('--vocabulary', type=int, default=20000, help='Distinct words in the synthetic catalogue')
+        parser.add_argument('--queries', type=int, default=200, help='Random queries per query length')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs over the query set')
+        parser.add_argument('--limit', type=int, default=24, help='Results per search, one page')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--configured', nargs='*', metavar='QUERY',
+                            help='Time these queries on the configured backend instead')
+
+    def handle(self, *args, **options):
+        if options['configured'] is not None:
+            backend = get_search_backend()
+            queries = options['configured'] or ['print', 'gift', 'custom print']
+            self.report(type(backend).__name__, timings(backend, queries, options['repeat'], options['limit']))
+            return
+
+        backend = PythonSearchBackend()
+        started = time.perf_counter()
+        backend.build(synthetic_products(options['products'], options['vocabulary'], options['seed']))
+        self.stdout.write(f"Indexed {options['products']} synthetic products in {time.perf_counter() - started:.1f}s")
+
+        rng = random.Random(options['seed'])
+        # Queries draw from the commoner half of the vocabulary, so most of them match
+        common = [f'w{index}' for index in range(options['vocabulary'] // 2)]
+        for length in (1, 2, 3):
+            queries = [' '.join(rng.sample(common, length)) for _ in range(options['queries'])]
+            self.report(f'{length}-word queries', timings(backend, queries, options['repeat'], options['limit']))
+
+    def report(self, label, samples):
+        samples = sorted(samples)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        self.stdout.write(
+            f'{label}: median {statistics.median(samples):.2f} ms, p95 {p95:.2f} ms, max {samples[-1]:.2f} ms '
+            f'over {len(samples)} searches'
+        )
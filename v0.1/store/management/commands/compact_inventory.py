@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store.inventory import find_drift, take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Folds inventory movements into per-SKU snapshots; schedule it hourly or nightly'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune-days', type=int, default=None,
+                            help='Delete movements and superseded snapshots older than this many days')
+        parser.add_argument('--verify', action='store_true',
+                            help='Compare the cached stock and reserved columns with the ledger')
+
+    def handle(self, *args, **options):
+        prune_before = None
+        if options['prune_days'] is not None:
+            prune_before = timezone.now() - timedelta(days=options['prune_days'])
+        written = take_snapshots(prune_before=prune_before)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} inventory snapshots.'))
+
+        if options['verify']:
+            drift = find_drift()
+            for (product_id, size_id), (cached, ledger) in sorted(drift.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+                self.stdout.write(
+                    f'Product {product_id} size {size_id or "-"}: stock/reserved {cached[0]}/{cached[1]}, '
+                    f'ledger {ledger[0]}/{ledger[1]}'
+                )
+            if drift:
+                raise CommandError(f'{len(drift)} SKUs disagree with the inventory ledger.')
+            self.stdout.write(self.style.SUCCESS('Stock and reserved units match the ledger.'))
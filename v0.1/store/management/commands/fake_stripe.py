@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store.fake_stripe import FakeStripeServer
+
+
+class Command(BaseCommand):
+    help = 'Runs a local fake of the Stripe charges API; set STRIPE_API_BASE to the printed URL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument('--latency', type=float, default=0.2, help='Seconds before each charge is answered')
+
+    def handle(self, *args, **options):
+        server = FakeStripeServer(options['host'], options['port'], options['latency'])
+        self.stdout.write(self.style.SUCCESS(f'Fake Stripe listening on {server.api_base}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f'Answered {server.charges} charges.')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from store.images import generate_variants, variant_widths
+from store.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Creates the resized WebP/JPEG variants of product images that have none or stale ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Resizing processes (default: STORE_IMAGE_WORKERS)')
+        parser.add_argument('--force', action='store_true', help='Recreate variants that are up to date')
+        parser.add_argument('--product', type=int, action='append', help='Only images of this product id (repeatable)')
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.order_by('id')
+        if options['product']:
+            images = images.filter(product_id__in=options['product'])
+        done = generate_variants(images.iterator(), workers=options['workers'], force=options['force'])
+        widths = ', '.join(str(width) for width in variant_widths())
+        self.stdout.write(self.style.SUCCESS(f'Created variants ({widths}px) for {done} images.'))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.meshes import (
+    DEFAULT_LOD_MIN_TRIANGLES, DEFAULT_LOD_RATIOS, DEFAULT_WELD_TOLERANCE, compiled_dir, ingest_models,
+)
+
+
+def percent_saved(before, after):
+    return f'-{(1 - after / before) * 100:.0f}%' if before else ''
+
+
+class Command(BaseCommand):
+    help = (
+        'Compiles the STL models in static/models into centred, scaled binary STL files '
+        'with coarser levels of detail and a manifest of their dimensions for the 3D hero'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', help='Directory of source models (default: static/models)')
+        parser.add_argument('--output', help='Directory of compiled models (default: static/models/compiled)')
+        parser.add_argument('--size', type=float, default=1.0, help='Largest dimension of a compiled model')
+        parser.add_argument('--tolerance', type=float, default=DEFAULT_WELD_TOLERANCE,
+                            help='Weld distance as a share of the largest dimension')
+        parser.add_argument('--lod-ratios', default=','.join(str(ratio) for ratio in DEFAULT_LOD_RATIOS),
+                            help='Comma-separated share of the triangles each level of detail keeps; empty for none')
+        parser.add_argument('--lod-min-triangles', type=int, default=DEFAULT_LOD_MIN_TRIANGLES,
+                            help='Smaller models get no levels of detail')
+        parser.add_argument('--force', action='store_true', help='Recompile models whose source is unchanged')
+
+    def handle(self, *args, **options):
+        try:
+            lod_ratios = [float(ratio) for ratio in options['lod_ratios'].split(',') if ratio.strip()]
+        except ValueError:
+            raise CommandError('--lod-ratios must be comma-separated numbers, e.g. 0.1,0.3.')
+        if any(not 0 < ratio < 1 for ratio in lod_ratios):
+            raise CommandError('Every level of detail must keep between 0 and 1 of the triangles.')
+
+        manifest, compiled = ingest_models(
+            source_dir=options['source'], output_dir=options['output'], size=options['size'],
+            tolerance=options['tolerance'], lod_ratios=lod_ratios,
+            lod_min_triangles=options['lod_min_triangles'], force=options['force'],
+        )
+        for source, entry in manifest['models'].items():
+            state = 'compiled' if source in compiled else 'unchanged'
+            self.stdout.write(
+                f"{source:<28} {state:<10} {entry['triangles']:>7} triangles, {entry['vertices']:>7} vertices, "
+                f"{entry['source_bytes'] / 1024:>8.1f} KB -> {entry['bytes'] / 1024:>7.1f} KB STL, "
+                f"{entry['mesh']['bytes'] / 1024:>6.1f} KB mesh  {entry['file']}"
+            )
+            for level, lod in enumerate(entry['lods']):
+                self.stdout.write(
+                    f"{'':<28} {f'lod{level}':<10} {lod['triangles']:>7} triangles "
+                    f"({percent_saved(entry['triangles'], lod['triangles'])}), "
+                    f"{lod['bytes'] / 1024:>7.1f} KB STL ({percent_saved(entry['source_bytes'], lod['bytes'])} "
+                    f"of the source), {lod['mesh']['bytes'] / 1024:.1f} KB mesh  {lod['file']}"
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(compiled)} of {len(manifest['models'])} models compiled into {options['output'] or compiled_dir()}."
+        ))
@@ -0,0 +1,198 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, override_settings
+
+from store.models import Cart, CartItem, Category, Order, OrderItem, Product, StockReservation
+from store.payments import DECLINED_TOKEN
+
+User = get_user_model()
+
+SHIPPING = {
+    'first_name': 'Load', 'last_name': 'Test', 'email': 'load@example.com',
+    'address': '1 Test St', 'city': 'Test', 'state': 'TS', 'zip_code': '00000', 'phone': '0000000000',
+}
+
+VERB = re.compile(r'^\s*(\w+)(?:\s+"?(\w+)"?)?')
+TABLE = re.compile(r'\b(?:FROM|INTO)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+def statement_key(sql):
+    """``(verb, table)`` of a SQL statement, e.g. ``('UPDATE', 'store_product')``"""
+    match = VERB.match(sql)
+    if match is None:
+        return (sql[:20], '')
+    verb = match.group(1).upper()
+    if verb == 'UPDATE':
+        return (verb, match.group(2) or '')
+    table = TABLE.search(sql)
+    return (verb, table.group(1) if table else '')
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0.0
+
+
+class QueryTimer:
+    """execute_wrapper that sums the time spent per statement kind and table"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = defaultdict(lambda: [0, 0.0, 0.0])  # count, total, slowest
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                stat = self.stats[statement_key(sql)]
+                stat[0] += 1
+                stat[1] += elapsed
+                stat[2] = max(stat[2], elapsed)
+
+
+class Command(BaseCommand):
+    help = (
+        'Drives many concurrent checkouts through process_payment with the simulated payment gateway '
+        'and reports throughput, latency and where the database time goes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=2000, help='Number of customers checking out')
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent request workers')
+        parser.add_argument('--products', type=int, default=5,
+                            help='Products the carts are spread over; fewer means more row contention')
+        parser.add_argument('--stock', type=int, help='Initial stock per product (default: enough for every cart)')
+        parser.add_argument('--latency', type=float, default=0.05, help='Simulated seconds per charge')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of charges the gateway fails')
+        parser.add_argument('--decline-rate', type=float, default=0.0, help='Share of checkouts paying with a declined card')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--top', type=int, default=10, help='Statement kinds listed in the report')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated test data')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in (':memory:', ''):
+            raise CommandError('The load test needs a database that all threads can share.')
+
+        rng = random.Random(options['seed'])
+        stamp = str(int(time.time() * 1000))
+        category = Category.objects.create(name=f'Load {stamp}', slug=f'load-{stamp}')
+        stock = options['stock'] if options['stock'] is not None else options['checkouts']
+        products = [
+            Product.objects.create(
+                category=category, name=f'Load SKU {stamp}-{n}', slug=f'load-sku-{stamp}-{n}',
+                price=Decimal('10.00'), stock=stock
+            )
+            for n in range(options['products'])
+        ]
+        users = self.create_buyers(stamp, products, options['checkouts'], rng)
+        jobs = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            token = DECLINED_TOKEN if rng.random() < options['decline_rate'] else 'tok_visa'
+            jobs.append((client, json.dumps({'token': token, 'shipping': SHIPPING, 'payment_method': 'card'})))
+
+        outcomes = Counter()
+        latencies = []
+        results_lock = threading.Lock()
+        timer = QueryTimer()
+
+        def worker():
+            try:
+                with connection.execute_wrapper(timer):
+                    while True:
+                        with results_lock:
+                            if not jobs:
+                                return
+                            client, payload = jobs.pop()
+                        started = time.perf_counter()
+                        response = client.post('/checkout/process/', payload, content_type='application/json')
+                        elapsed = time.perf_counter() - started
+                        data = response.json() if response.status_code == 200 else {}
+                        outcome = 'paid' if data.get('success') else data.get('error', f'HTTP {response.status_code}')
+                        with results_lock:
+                            outcomes[outcome] += 1
+                            latencies.append(elapsed)
+            finally:
+                connection.close()
+
+        with override_settings(
+            STORE_PAYMENT_GATEWAY='simulator', STORE_PAYMENT_SIMULATOR_LATENCY=options['latency'],
+            STORE_PAYMENT_SIMULATOR_ERROR_RATE=options['error_rate'], ALLOWED_HOSTS=['testserver'],
+        ):
+            started = time.perf_counter()
+            threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        try:
+            self.report(options, elapsed, outcomes, sorted(latencies), timer)
+            self.verify(products, stock, users)
+        finally:
+            if not options['keep']:
+                orders = Order.objects.filter(user__in=users)
+                for order in orders:
+                    order.shipping_address.delete()
+                orders.delete()
+                User.objects.filter(pk__in=[user.pk for user in users]).delete()
+                category.delete()
+
+    def create_buyers(self, stamp, products, count, rng):
+        # One by one so the signals create each user's profile
+        users = [
+            User.objects.create_user(username=f'load-{stamp}-{n}', email=f'load-{stamp}-{n}@example.com')
+            for n in range(count)
+        ]
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=rng.choice(products), quantity=1) for cart in carts])
+        return users
+
+    def report(self, options, elapsed, outcomes, latencies, timer):
+        total = sum(outcomes.values())
+        self.stdout.write(
+            f'{total} checkouts in {elapsed:.2f}s ({total / elapsed:.1f}/s) with {options["threads"]} threads; '
+            f'latency p50 {percentile(latencies, 0.5) * 1000:.0f}ms, '
+            f'p95 {percentile(latencies, 0.95) * 1000:.0f}ms, p99 {percentile(latencies, 0.99) * 1000:.0f}ms, '
+            f'max {percentile(latencies, 1.0) * 1000:.0f}ms'
+        )
+        for outcome, count in outcomes.most_common():
+            self.stdout.write(f'  {count:>6}  {outcome}')
+
+        self.stdout.write(f'Database time by statement (top {options["top"]}):')
+        ranked = sorted(timer.stats.items(), key=lambda entry: entry[1][1], reverse=True)
+        for (verb, table), (count, spent, slowest) in ranked[:options['top']]:
+            self.stdout.write(
+                f'  {verb:<9}{table:<28}{count:>7}x  total {spent * 1000:>8.0f}ms  '
+                f'avg {spent / count * 1000:>6.2f}ms  slowest {slowest * 1000:>6.0f}ms'
+            )
+
+    def verify(self, products, stock, users):
+        sold = dict(
+            OrderItem.objects.filter(order__user__in=users).values('product_id')
+            .annotate(units=Sum('quantity')).values_list('product_id', 'units')
+        )
+        for product in products:
+            product.refresh_from_db()
+            if product.stock != stock - sold.get(product.pk, 0) or product.reserved:
+                raise CommandError(
+                    f'{product.name}: stock {product.stock}, reserved {product.reserved}, '
+                    f'but {sold.get(product.pk, 0)} units were ordered from {stock}.'
+                )
+        if StockReservation.objects.filter(user__in=users).exists():
+            raise CommandError('Reservations were left behind.')
+        self.stdout.write(self.style.SUCCESS('Stock matches the orders for every product.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store.product_cards import card_cache_stats, invalidate_product_cards
+
+
+class Command(BaseCommand):
+    help = 'Shows the hit rate of the rendered product card cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Start counting again after reporting')
+        parser.add_argument('--invalidate', action='store_true',
+                            help='Drop every cached card, e.g. after changing the card templates')
+
+    def handle(self, *args, **options):
+        hits, misses = card_cache_stats(reset=options['reset'])
+        total = hits + misses
+        if total:
+            self.stdout.write(f'{total} cards served: {hits} hits, {misses} misses ({hits / total:.1%} hit rate)')
+        else:
+            self.stdout.write('No cards served since the last reset.')
+        if options['invalidate']:
+            invalidate_product_cards()
+            self.stdout.write(self.style.SUCCESS('Cached cards dropped.'))
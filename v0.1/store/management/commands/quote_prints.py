@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import Product
+from store.print_quotes import SIZE_HEIGHTS, QuoteError, quote_product, refresh_geometry
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the print model of products and quotes them at the heights of the fixed sizes, '
+        'timing the measurement and the cached quotes; the geometry is kept for later quotes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Products to quote (default: all with a print model)')
+        parser.add_argument('--height', type=float, action='append', dest='heights',
+                            help='Height in mm to quote; repeatable (default: the small, medium and large sizes)')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(print_model='').order_by('slug')
+        if options['slugs']:
+            products = products.filter(slug__in=options['slugs'])
+        if not products:
+            raise CommandError('No products with a print model.')
+        heights = options['heights'] or sorted(SIZE_HEIGHTS.values())
+
+        for product in products:
+            started = time.perf_counter()
+            try:
+                geometry = refresh_geometry(product)
+            except QuoteError as error:
+                self.stdout.write(f'{product.slug}: {error}')
+                continue
+            measured = time.perf_counter() - started
+            self.stdout.write(f'{product.slug}: {geometry["triangles"]} triangles, measured in {measured * 1000:.1f} ms')
+            for height in heights:
+                started = time.perf_counter()
+                try:
+                    quote = quote_product(product, height)
+                except QuoteError as error:
+                    self.stdout.write(f'  {height:g} mm: {error}')
+                    continue
+                quoted = time.perf_counter() - started
+                self.stdout.write(
+                    f'  {height:g} mm: {quote.weight:.1f} g, {quote.hours:.2f} h, ${quote.price} '
+                    f'(quoted in {quoted * 1000:.2f} ms)'
+                )
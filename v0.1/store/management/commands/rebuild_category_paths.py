@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Category
+from store.category_tree import invalidate_category_tree
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the materialized category paths used for descendant lookups'
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            changed = Category.objects.rebuild_paths()
+        invalidate_category_tree()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt category paths ({changed} updated)'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from store.product_columns import find_column_drift, repair_column_drift
+
+
+class Command(BaseCommand):
+    help = (
+        "Repairs Product's denormalized image and size columns that disagree with the images and sizes; "
+        "schedule it to bring the size stock counts up to date after sales"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drift')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products compared per query')
+        parser.add_argument('--show', type=int, default=20, help='Drifted products listed in detail')
+
+    def handle(self, *args, **options):
+        drift = find_column_drift(batch_size=options['batch_size'])
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Every product matches its images and sizes.'))
+            return
+        for product_id, fields in list(drift.items())[:options['show']]:
+            details = ', '.join(f'{field} {stored!r} -> {expected!r}' for field, (stored, expected) in fields.items())
+            self.stdout.write(f'Product {product_id}: {details}')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(drift)} products have drifted.'))
+            return
+        repair_column_drift(drift)
+        self.stdout.write(self.style.SUCCESS(f'Repaired {len(drift)} products.'))
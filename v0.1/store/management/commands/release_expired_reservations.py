@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from store.reservations import DEFAULT_BATCH_SIZE, recount_reserved, release_expired
+
+
+class Command(BaseCommand):
+    help = 'Returns the stock of expired checkout reservations; schedule it every minute or so'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Reservations released per transaction')
+        parser.add_argument('--recount', action='store_true',
+                            help='Also rebuild the reserved counters from the remaining reservations')
+
+    def handle(self, *args, **options):
+        released = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations.'))
+        if options['recount']:
+            fixed = recount_reserved()
+            self.stdout.write(self.style.SUCCESS(f'Corrected {fixed} reserved counters.'))
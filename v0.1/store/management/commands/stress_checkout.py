@@ -0,0 +1,113 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from store.checkout import OutOfStock, place_order
+from store.models import Cart, CartItem, Category, Order, Product
+from store.reservations import reserve_cart
+
+User = get_user_model()
+
+SHIPPING = {
+    'first_name': 'Stress', 'last_name': 'Test', 'email': 'stress@example.com',
+    'address': '1 Test St', 'city': 'Test', 'state': 'TS', 'zip_code': '00000', 'phone': '0000000000',
+}
+
+
+class Command(BaseCommand):
+    help = 'Runs many concurrent checkouts of one SKU and verifies that stock is never oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=25, help='Initial stock of the test product')
+        parser.add_argument('--buyers', type=int, default=100, help='Number of customers checking out')
+        parser.add_argument('--threads', type=int, default=16, help='Number of concurrent workers')
+        parser.add_argument('--quantity', type=int, default=1, help='Units bought per checkout')
+        parser.add_argument('--reserve', action='store_true',
+                            help='Hold the stock on the checkout page before paying, like the web flow')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated test data')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in (':memory:', ''):
+            raise CommandError('The stress test needs a database that all threads can share.')
+
+        stamp = str(int(time.time() * 1000))
+        category = Category.objects.create(name=f'Stress {stamp}', slug=f'stress-{stamp}')
+        product = Product.objects.create(
+            category=category, name=f'Stress SKU {stamp}', slug=f'stress-sku-{stamp}',
+            price=Decimal('10.00'), stock=options['stock']
+        )
+        users = [
+            User.objects.create_user(username=f'stress-{stamp}-{n}', email=f'stress-{stamp}-{n}@example.com')
+            for n in range(options['buyers'])
+        ]
+        for user in users:
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=product, quantity=options['quantity'])
+
+        results = {'sold': 0, 'out_of_stock': 0, 'errors': 0}
+        results_lock = threading.Lock()
+        pending = list(users)
+
+        def worker():
+            try:
+                while True:
+                    with results_lock:
+                        if not pending:
+                            return
+                        user = pending.pop()
+                    items = list(CartItem.objects.filter(cart__user=user).select_related('product', 'size'))
+                    total = sum(item.total_price for item in items)
+                    try:
+                        if options['reserve']:
+                            reserve_cart(user, items)
+                        place_order(user, items, SHIPPING, 'cash', {
+                            'total': total, 'shipping_cost': Decimal('0.00'), 'tax_amount': Decimal('0.00')
+                        })
+                        outcome = 'sold'
+                    except OutOfStock:
+                        outcome = 'out_of_stock'
+                    except DatabaseError:
+                        # e.g. SQLite "database is locked"; the transaction was rolled back
+                        outcome = 'errors'
+                    with results_lock:
+                        results[outcome] += 1
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        if product.reserved:
+            raise CommandError(f'{product.reserved} units are still reserved after every checkout finished.')
+        orders = Order.objects.filter(user__in=users)
+        units_sold = sum(order.items.get().quantity for order in orders)
+        self.stdout.write(
+            f"{options['buyers']} checkouts in {elapsed:.2f}s: {results['sold']} sold, "
+            f"{results['out_of_stock']} rejected as out of stock, {results['errors']} errors; "
+            f"stock {options['stock']} -> {product.stock}"
+        )
+
+        consistent = (
+            units_sold == results['sold'] * options['quantity']
+            and product.stock == options['stock'] - units_sold
+        )
+        if not options['keep']:
+            for order in orders:
+                order.shipping_address.delete()
+            orders.delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            category.delete()
+
+        if not consistent:
+            raise CommandError('Stock and orders disagree: the checkout oversold or lost units.')
+        self.stdout.write(self.style.SUCCESS('No oversell: every sold unit matches an order line.'))
@@ -0,0 +1,147 @@
+"""
+Triangle meshes built with NumPy.
+
+Every builder returns an indexed mesh ``(vertices, faces)``: a ``(n, 3)``
+float array of points and a ``(m, 3)`` integer array of vertex indices per
+triangle, wound counter-clockwise seen from outside so normals point out.
+Whole grids of faces are generated at once with index arithmetic, and
+``triangles`` expands a mesh to per-triangle corners with fancy indexing
+(``vertices[faces]``) instead of filling them one by one.
+
+Only NumPy and numpy-stl are used, so scripts outside Django (such as
+create_sample_stl.py) can import this module.
+"""
+import numpy as np
+from stl import mesh
+
+
+def triangles(vertices, faces):
+    """``(m, 3, 3)`` corners of every triangle"""
+    return np.asarray(vertices)[np.asarray(faces)]
+
+
+def translate(part, offset):
+    vertices, faces = part
+    return vertices + np.asarray(offset, dtype=np.float64), faces
+
+
+def combine(*parts):
+    """One mesh of all ``parts``, renumbering each part's faces after the previous parts' vertices"""
+    offsets = np.cumsum([0] + [len(vertices) for vertices, _ in parts[:-1]])
+    vertices = np.concatenate([vertices for vertices, _ in parts])
+    faces = np.concatenate([faces + offset for (_, faces), offset in zip(parts, offsets)])
+    return vertices, faces
+
+
+def grid_faces(rows, columns, wrap_rows=False, wrap_columns=True):
+    """
+    Two triangles per cell of a ``rows`` x ``columns`` grid of vertices
+    numbered row by row. Wrapped directions join their last line to their
+    first (e.g. around a cylinder). With columns running counter-clockwise
+    around the up axis and rows running upwards, the triangles face out.
+    """
+    row = np.arange(rows if wrap_rows else rows - 1)[:, None]
+    column = np.arange(columns if wrap_columns else columns - 1)[None, :]
+    next_row, next_column = (row + 1) % rows, (column + 1) % columns
+    a = row * columns + column
+    b = row * columns + next_column
+    c = next_row * columns + next_column
+    d = next_row * columns + column
+    a, b, c, d = np.broadcast_arrays(a, b, c, d)
+    return np.stack([np.stack([a, b, c], axis=-1), np.stack([a, c, d], axis=-1)], axis=2).reshape(-1, 3)
+
+
+def _fan(center, ring, reverse=False):
+    """Triangles joining vertex ``center`` to consecutive vertices of the closed ``ring``"""
+    following = np.roll(ring, -1)
+    if reverse:
+        ring, following = following, ring
+    return np.stack([np.full(len(ring), center), ring, following], axis=-1)
+
+
+def circle(radius, segments):
+    """``(segments, 2)`` points of a regular polygon, counter-clockwise from the +x axis"""
+    angles = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    return radius * np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+
+
+def extrude(outline, height, caps=True):
+    """
+    Prism of the closed 2D ``outline`` from z=0 to z=``height``. Caps are fans
+    from the outline's centre, so the outline must be star-shaped around it
+    (any convex outline is).
+    """
+    outline = np.asarray(outline, dtype=np.float64)
+    x, y = outline[:, 0], outline[:, 1]
+    if np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y) < 0:
+        outline = outline[::-1]  # make it counter-clockwise
+    count = len(outline)
+    ring = np.concatenate([outline, np.zeros((count, 1))], axis=1)
+    vertices = [ring, ring + [0, 0, height]]
+    faces = [grid_faces(2, count)]
+    if caps:
+        center = outline.mean(axis=0)
+        vertices.append([[center[0], center[1], 0], [center[0], center[1], height]])
+        bottom, top = 2 * count, 2 * count + 1
+        faces += [_fan(bottom, np.arange(count), reverse=True), _fan(top, np.arange(count, 2 * count))]
+    return np.concatenate(vertices), np.concatenate(faces)
+
+
+def cylinder(radius, height, segments=32, caps=True):
+    """Cylinder standing on the origin along +z"""
+    return extrude(circle(radius, segments), height, caps=caps)
+
+
+def sphere(radius, segments=32, rings=16):
+    """UV sphere centred on the origin, with ``rings`` bands from pole to pole"""
+    latitudes = np.linspace(-np.pi / 2, np.pi / 2, rings + 1)[1:-1]
+    longitudes = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    lat, lon = np.meshgrid(latitudes, longitudes, indexing='ij')
+    body = radius * np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+    vertices = np.concatenate([body.reshape(-1, 3), [[0, 0, -radius], [0, 0, radius]]])
+    south, north = len(vertices) - 2, len(vertices) - 1
+    last_ring = (rings - 2) * segments
+    faces = np.concatenate([
+        grid_faces(rings - 1, segments),
+        _fan(south, np.arange(segments), reverse=True),
+        _fan(north, np.arange(last_ring, last_ring + segments)),
+    ])
+    return vertices, faces
+
+
+def torus(major_radius, minor_radius, segments=48, tube_segments=24):
+    """Torus around the z axis, centred on the origin"""
+    around = np.linspace(0, 2 * np.pi, segments, endpoint=False)[:, None]
+    tube = np.linspace(0, 2 * np.pi, tube_segments, endpoint=False)[None, :]
+    distance = major_radius + minor_radius * np.cos(tube)
+    vertices = np.stack(np.broadcast_arrays(
+        distance * np.cos(around), distance * np.sin(around), minor_radius * np.sin(tube)
+    ), axis=-1).reshape(-1, 3)
+    # Rows run around the z axis and columns around the tube, which faces the
+    # grid's triangles inwards, so swap two corners of each
+    faces = grid_faces(segments, tube_segments, wrap_rows=True)[:, [0, 2, 1]]
+    return vertices, faces
+
+
+def to_stl(vertices, faces, name=''):
+    """numpy-stl Mesh of an indexed mesh, with unit face normals"""
+    corners = triangles(vertices, faces)
+    crosses = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(crosses, axis=1, keepdims=True)
+    data = np.zeros(len(faces), dtype=mesh.Mesh.dtype)
+    data['vectors'] = corners
+    data['normals'] = np.divide(crosses, lengths, out=np.zeros_like(crosses), where=lengths > 0)
+    return mesh.Mesh(data, calculate_normals=False, name=name)
+
+
+def save_binary(model, path):
+    """
+    Write ``model`` as binary STL. numpy-stl's own writer stamps the current
+    time into the header, so identical meshes would produce different files.
+    """
+    name = model.name.decode('ascii', 'replace') if isinstance(model.name, bytes) else model.name
+    header = f'binary STL {name}'.encode('ascii', 'replace')[:80].ljust(80, b' ')
+    with open(path, 'wb') as handle:
+        handle.write(header)
+        handle.write(np.uint32(len(model.data)).tobytes())
+        handle.write(model.data.astype(mesh.Mesh.dtype).tobytes())
@@ -0,0 +1,133 @@
+"""
+Compact mesh format for the 3D hero (``.mesh``).
+
+Binary STL repeats every corner as three float32s plus a normal per
+triangle. A ``.mesh`` file stores each vertex once, quantized to 16 bits per
+axis over the model's bounding box, and the triangles as indices into them:
+
+    4s   magic, b'CCM1'
+    u32  vertex count
+    u32  triangle count
+    3f   origin (bounding box minimum)
+    3f   step per quantization unit on each axis
+    u16  x, y, z of every vertex
+    ...  triangle corner indices: the difference to the previous index,
+         zigzag-encoded (small negative and positive numbers stay small) and
+         written as LEB128 varints
+
+All numbers are little-endian. Vertices are renumbered in order of first
+use, so consecutive indices are close and most deltas fit in one byte.
+Normals are left out; the decoder computes them. ``write_mesh`` also stores
+gzip and, when the ``brotli`` package is installed, brotli copies of the
+file for ``views.model_mesh`` to serve precompressed. ``decodeCompactMesh``
+in static/js/3d_hero.js decodes the same format.
+"""
+import gzip
+import struct
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MAGIC = b'CCM1'
+HEADER = struct.Struct('<4sII3f3f')
+QUANTIZATION_LEVELS = 65535
+MAX_VARINT_BYTES = 5  # indices are uint32
+
+# Content-Encoding -> suffix of the precompressed copy, in order of preference
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+
+def _first_use_order(vertices, faces):
+    """Renumber vertices in the order the faces first use them, dropping unused ones"""
+    flat = faces.reshape(-1)
+    used, first = np.unique(flat, return_index=True)
+    order = used[np.argsort(first)]
+    renumber = np.empty(len(vertices), dtype=np.int64)
+    renumber[order] = np.arange(len(order))
+    return vertices[order], renumber[faces]
+
+
+def _varints(values):
+    """LEB128 encoding of unsigned ``values``"""
+    values = values.astype(np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for size in range(1, MAX_VARINT_BYTES):
+        lengths += values >= (1 << (7 * size))
+    starts = np.cumsum(lengths) - lengths
+    encoded = np.zeros(int(lengths.sum()), dtype=np.uint8)
+    for position in range(int(lengths.max(initial=0))):
+        selected = lengths > position
+        low_bits = (values[selected] >> np.uint64(7 * position)) & np.uint64(0x7F)
+        more = (lengths[selected] > position + 1).astype(np.uint64) << np.uint64(7)
+        encoded[starts[selected] + position] = low_bits | more
+    return encoded.tobytes()
+
+
+def _read_varints(data, count):
+    """First ``count`` LEB128 values in ``data`` (a uint8 array)"""
+    ends = np.flatnonzero(data < 0x80)[:count]
+    if len(ends) < count:
+        raise ValueError('Truncated mesh indices')
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    values = np.zeros(count, dtype=np.uint64)
+    for position in range(MAX_VARINT_BYTES):
+        selected = starts + position <= ends
+        if not selected.any():
+            break
+        low_bits = data[starts[selected] + position].astype(np.uint64) & np.uint64(0x7F)
+        values[selected] |= low_bits << np.uint64(7 * position)
+    return values
+
+
+def encode_mesh(vertices, faces):
+    """``.mesh`` bytes of an indexed mesh"""
+    vertices, faces = _first_use_order(np.asarray(vertices, dtype=np.float64), np.asarray(faces, dtype=np.int64))
+    origin = (vertices.min(axis=0) if len(vertices) else np.zeros(3)).astype(np.float32)
+    extent = (vertices.max(axis=0) if len(vertices) else np.zeros(3)) - origin
+    step = (extent / QUANTIZATION_LEVELS).astype(np.float32)
+    safe_step = np.where(step > 0, step, 1).astype(np.float64)
+    quantized = np.clip(np.round((vertices - origin) / safe_step), 0, QUANTIZATION_LEVELS).astype('<u2')
+
+    deltas = np.diff(faces.reshape(-1), prepend=0)
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+    header = HEADER.pack(MAGIC, len(vertices), len(faces), *origin, *step)
+    return header + quantized.tobytes() + _varints(zigzag)
+
+
+def decode_mesh(data):
+    """``(vertices, faces)`` of ``.mesh`` bytes, with float32 vertices"""
+    magic, vertex_count, triangle_count, *numbers = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a compact mesh')
+    origin, step = np.array(numbers[:3], dtype=np.float32), np.array(numbers[3:], dtype=np.float32)
+    quantized = np.frombuffer(data, dtype='<u2', count=vertex_count * 3, offset=HEADER.size).reshape(-1, 3)
+    vertices = origin + quantized * step
+
+    indices = np.frombuffer(data, dtype=np.uint8, offset=HEADER.size + quantized.nbytes)
+    zigzag = _read_varints(indices, triangle_count * 3).astype(np.int64)
+    deltas = (zigzag >> 1) ^ -(zigzag & 1)
+    return vertices, np.cumsum(deltas).reshape(-1, 3)
+
+
+def compress(data):
+    """``{content encoding: bytes}`` of the precompressed copies of ``data``"""
+    copies = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        copies['br'] = brotli.compress(data, quality=11)
+    return copies
+
+
+def write_mesh(path, data):
+    """Write ``data`` to ``path`` and its precompressed copies next to it; returns their sizes"""
+    with open(path, 'wb') as handle:
+        handle.write(data)
+    sizes = {'bytes': len(data)}
+    for encoding, compressed in compress(data).items():
+        with open(path + ENCODINGS[encoding], 'wb') as handle:
+            handle.write(compressed)
+        sizes[f'{encoding}_bytes'] = len(compressed)
+    return sizes
@@ -0,0 +1,90 @@
+"""
+Level-of-detail versions of indexed meshes, by vertex clustering.
+
+``cluster`` snaps the vertices onto a grid of cubic cells and merges each
+cell's vertices into one. The merged vertex sits where it best fits the
+planes of the triangles around it (the quadric error minimum), so flat
+areas stay flat and sharp edges stay sharp; where that point is ill-defined
+or strays from the cell it falls back to the cell's mean. Triangles that
+collapse, or that duplicate another, are dropped.
+
+``decimate`` searches the grid resolution that brings a mesh closest to a
+triangle budget without exceeding it.
+"""
+import numpy as np
+
+MIN_RESOLUTION = 2
+MAX_RESOLUTION = 4096
+
+
+def _face_planes(vertices, faces):
+    """Area-weighted unit normals and offsets ``d`` (``n . x + d = 0``) of the triangles"""
+    corners = vertices[faces]
+    crosses = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(crosses, axis=1, keepdims=True)
+    normals = np.divide(crosses, lengths, out=np.zeros_like(crosses), where=lengths > 0)
+    offsets = -np.einsum('ij,ij->i', normals, corners[:, 0])
+    return normals, offsets, lengths[:, 0] / 2
+
+
+def cluster(vertices, faces, resolution):
+    """Mesh simplified on a grid of ``resolution`` cells along its largest dimension"""
+    vertices = np.asarray(vertices, dtype=np.float64)
+    low = vertices.min(axis=0)
+    cell = (np.ptp(vertices, axis=0).max() or 1.0) / resolution
+    cells = np.floor((vertices - low) / cell).astype(np.int64)
+    _, owner = np.unique(cells, axis=0, return_inverse=True)
+    owner = owner.reshape(-1)
+    count = owner.max() + 1 if len(owner) else 0
+
+    # Mean position of every cell, the fallback representative
+    sizes = np.bincount(owner, minlength=count)[:, None]
+    means = np.stack([np.bincount(owner, weights=vertices[:, axis], minlength=count) for axis in range(3)], axis=1)
+    means /= sizes
+
+    # Sum of the area-weighted plane quadrics touching each cell:
+    # error(x) = x'Ax + 2b'x + c, minimised where Ax = -b
+    normals, offsets, areas = _face_planes(vertices, faces)
+    outer = np.einsum('i,ij,ik->ijk', areas, normals, normals)
+    linear = (areas * offsets)[:, None] * normals
+    quadrics = np.zeros((count, 3, 3))
+    vectors = np.zeros((count, 3))
+    for corner in range(3):
+        np.add.at(quadrics, owner[faces[:, corner]], outer)
+        np.add.at(vectors, owner[faces[:, corner]], linear)
+    # A little pull towards the mean keeps flat and nearly flat cells solvable
+    scale = np.trace(quadrics, axis1=1, axis2=2)[:, None, None] + 1e-12
+    regular = 1e-3 * scale * np.eye(3)
+    positions = np.linalg.solve(quadrics + regular, (regular @ means[:, :, None])[:, :, 0] - vectors)
+    strayed = np.linalg.norm(positions - means, axis=1) > cell
+    positions[strayed] = means[strayed]
+
+    merged = owner[faces]
+    keep = (merged[:, 0] != merged[:, 1]) & (merged[:, 1] != merged[:, 2]) & (merged[:, 0] != merged[:, 2])
+    merged = merged[keep]
+    # Two triangles over the same three vertices: keep the first
+    _, first = np.unique(np.sort(merged, axis=1), axis=0, return_index=True)
+    merged = merged[np.sort(first)]
+
+    used, compact = np.unique(merged, return_inverse=True)
+    return positions[used], compact.reshape(-1, 3)
+
+
+def decimate(vertices, faces, target):
+    """
+    ``(vertices, faces, resolution)`` of the finest clustering with at most
+    ``target`` triangles, found by bisecting the grid resolution.
+    """
+    low, high = MIN_RESOLUTION, MAX_RESOLUTION
+    best = None
+    while low <= high:
+        resolution = (low + high) // 2
+        simplified = cluster(vertices, faces, resolution)
+        if len(simplified[1]) <= target:
+            best = simplified + (resolution,)
+            low = resolution + 1
+        else:
+            high = resolution - 1
+    if best is None:
+        best = cluster(vertices, faces, MIN_RESOLUTION) + (MIN_RESOLUTION,)
+    return best
@@ -0,0 +1,265 @@
+"""
+Ingestion of the STL models shown by the 3D hero.
+
+Source models (ASCII or binary STL, any units and placement) live in
+``static/models``. ``ingest_models`` compiles each of them into
+``static/models/compiled``: vertices are welded, degenerate triangles dropped,
+the model is centred on its bounding box and scaled so its largest dimension
+is ``size``, and the result is written as binary STL with a content-hashed
+name. ``manifest.json`` next to the compiled files maps every source to its
+compiled file and records the metrics measured on the source geometry
+(bounding box, centroid, triangle count, volume and surface area, in source
+units), so browsers neither parse ASCII nor centre and measure models.
+
+Models with at least ``lod_min_triangles`` triangles also get coarser
+level-of-detail files (store.mesh_lod), listed coarsest first under ``lods``
+with the share of the triangles they keep, so the hero can show a light
+version at once and swap in detail as it arrives.
+
+Every version is also written in the compact, precompressed ``.mesh`` format
+(store.mesh_format) that the hero loads; its file is listed under ``mesh``.
+
+A model whose source is unchanged since the last run is not compiled again.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+from django.conf import settings
+from stl import mesh
+
+from .mesh_builder import save_binary, to_stl, triangles
+from .mesh_format import ENCODINGS, encode_mesh, write_mesh
+from .mesh_lod import decimate
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+HASH_LENGTH = 12
+# Vertices closer than this share of the model's largest dimension are welded
+DEFAULT_WELD_TOLERANCE = 1e-6
+SOURCE_SUFFIXES = ('.stl',)
+# Share of the full model's triangles kept by each level of detail, coarsest first
+DEFAULT_LOD_RATIOS = (0.1, 0.3)
+DEFAULT_LOD_MIN_TRIANGLES = 2000
+
+
+def models_dir():
+    return os.path.join(settings.BASE_DIR, 'static', 'models')
+
+
+def compiled_dir():
+    return os.path.join(models_dir(), 'compiled')
+
+
+def load_triangles(path, handle=None):
+    """
+    ``(n, 3, 3)`` float64 array of the triangles in an ASCII or binary STL
+    file; ``handle`` reads it from an open binary file instead of ``path``
+    """
+    return mesh.Mesh.from_file(path, fh=handle).vectors.astype(np.float64)
+
+
+def weld(vectors, tolerance=DEFAULT_WELD_TOLERANCE):
+    """
+    Indexed form ``(vertices, faces)`` of the ``(n, 3, 3)`` triangle corners
+    ``vectors``, where corners that lie within ``tolerance`` (relative to the
+    largest dimension) of each other share a vertex. Triangles that collapse
+    to a line or point are dropped.
+    """
+    corners = vectors.reshape(-1, 3)
+    if not len(corners):
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    extent = np.ptp(corners, axis=0).max() or 1.0
+    grid = np.round(corners / (extent * tolerance)).astype(np.int64)
+    _, first, inverse = np.unique(grid, axis=0, return_index=True, return_inverse=True)
+    faces = inverse.reshape(-1, 3)
+    # Keep vertices in the order they first appear, as the source listed them
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    faces = rank[faces]
+    vertices = corners[first[order]]
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    return vertices, faces[keep]
+
+
+def measure(vertices, faces):
+    """Bounding box, centroid, triangle count, volume and surface area of an indexed mesh"""
+    corners = triangles(vertices, faces)
+    v0, v1, v2 = corners[:, 0], corners[:, 1], corners[:, 2]
+    crosses = np.cross(v1 - v0, v2 - v0)
+    areas = np.linalg.norm(crosses, axis=1) / 2
+    # Signed volumes of the tetrahedra spanned by the origin and each triangle
+    volumes = np.einsum('ij,ij->i', v0, np.cross(v1, v2)) / 6
+    volume = volumes.sum()
+    if abs(volume) > 1e-12:
+        centroid = (volumes[:, None] * (v0 + v1 + v2)).sum(axis=0) / (4 * volume)
+    elif areas.sum() > 0:
+        # Open surface: use its area-weighted centre instead
+        centroid = (areas[:, None] * (v0 + v1 + v2)).sum(axis=0) / (3 * areas.sum())
+    else:
+        centroid = vertices.mean(axis=0) if len(vertices) else np.zeros(3)
+    low = vertices.min(axis=0) if len(vertices) else np.zeros(3)
+    high = vertices.max(axis=0) if len(vertices) else np.zeros(3)
+    return {
+        'bbox': {'min': _rounded(low), 'max': _rounded(high)},
+        'size': _rounded(high - low),
+        'centroid': _rounded(centroid),
+        'triangles': int(len(faces)),
+        'vertices': int(len(vertices)),
+        'volume': round(float(abs(volume)), 6),
+        'area': round(float(areas.sum()), 6),
+    }
+
+
+def _rounded(values):
+    return [round(float(value), 6) + 0.0 for value in values]
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def _write_compiled(vertices, faces, output_dir, stem):
+    """
+    Save a mesh as binary STL and as ``.mesh``, both named after their
+    content; returns the STL file name and the ``.mesh`` details.
+    """
+    temp_path = os.path.join(output_dir, f'.{stem}.tmp')
+    save_binary(to_stl(vertices, faces, name=stem), temp_path)
+    name = f'{stem}.{file_hash(temp_path)}.stl'
+    os.replace(temp_path, os.path.join(output_dir, name))
+
+    data = encode_mesh(vertices, faces)
+    mesh_name = f'{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}.mesh'
+    compact = {'file': mesh_name}
+    compact.update(write_mesh(os.path.join(output_dir, mesh_name), data))
+    return name, compact
+
+
+def compiled_files(entry):
+    """Names of every file compiled for a manifest entry"""
+    names = []
+    for version in [entry] + entry.get('lods', []):
+        names.append(version['file'])
+        if 'mesh' in version:
+            mesh_name = version['mesh']['file']
+            names.append(mesh_name)
+            names += [mesh_name + suffix for encoding, suffix in ENCODINGS.items()
+                      if f'{encoding}_bytes' in version['mesh']]
+    return names
+
+
+def compile_model(path, output_dir, size=1.0, tolerance=DEFAULT_WELD_TOLERANCE,
+                  lod_ratios=DEFAULT_LOD_RATIOS, lod_min_triangles=DEFAULT_LOD_MIN_TRIANGLES):
+    """Compile one source model into ``output_dir``; returns its manifest entry"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    vertices, faces = weld(load_triangles(path), tolerance)
+    entry = {'source': os.path.basename(path), 'source_hash': file_hash(path), 'source_bytes': os.path.getsize(path)}
+    entry.update(measure(vertices, faces))
+
+    low, high = (vertices.min(axis=0), vertices.max(axis=0)) if len(vertices) else (np.zeros(3), np.zeros(3))
+    offset = -(low + high) / 2
+    largest = (high - low).max()
+    scale = size / largest if largest > 0 else 1.0
+    placed = (vertices + offset) * scale
+    name, compact = _write_compiled(placed, faces, output_dir, stem)
+    lods = []
+    if len(faces) >= lod_min_triangles:
+        for ratio in sorted(lod_ratios):
+            lod_vertices, lod_faces, resolution = decimate(placed, faces, int(len(faces) * ratio))
+            lod_name, lod_compact = _write_compiled(lod_vertices, lod_faces, output_dir, f'{stem}.lod{len(lods)}')
+            lods.append({
+                'file': lod_name,
+                'mesh': lod_compact,
+                'ratio': ratio,
+                'triangles': int(len(lod_faces)),
+                'vertices': int(len(lod_vertices)),
+                'bytes': os.path.getsize(os.path.join(output_dir, lod_name)),
+                'resolution': resolution,
+            })
+    entry.update({
+        'file': name,
+        'bytes': os.path.getsize(os.path.join(output_dir, name)),
+        'mesh': compact,
+        # compiled = (source + offset) * scale
+        'offset': _rounded(offset),
+        'scale': round(float(scale), 9),
+        'lods': lods,
+    })
+    return entry
+
+
+def read_manifest(output_dir=None):
+    path = os.path.join(output_dir or compiled_dir(), MANIFEST_NAME)
+    try:
+        with open(path) as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return {'version': MANIFEST_VERSION, 'models': {}}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {'version': MANIFEST_VERSION, 'models': {}}
+    return manifest
+
+
+def write_manifest(manifest, output_dir=None):
+    output_dir = output_dir or compiled_dir()
+    temp_path = os.path.join(output_dir, f'.{MANIFEST_NAME}.tmp')
+    with open(temp_path, 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+        handle.write('\n')
+    os.replace(temp_path, os.path.join(output_dir, MANIFEST_NAME))
+
+
+def source_models(source_dir=None):
+    source_dir = source_dir or models_dir()
+    return sorted(
+        os.path.join(source_dir, name) for name in os.listdir(source_dir)
+        if name.lower().endswith(SOURCE_SUFFIXES) and os.path.isfile(os.path.join(source_dir, name))
+    )
+
+
+def ingest_models(source_dir=None, output_dir=None, size=1.0, tolerance=DEFAULT_WELD_TOLERANCE,
+                  lod_ratios=DEFAULT_LOD_RATIOS, lod_min_triangles=DEFAULT_LOD_MIN_TRIANGLES, force=False):
+    """
+    Compile every source model whose content or compile options changed,
+    drop compiled files whose source is gone, and rewrite the manifest.
+    Returns ``(manifest, compiled source names)``.
+    """
+    output_dir = output_dir or compiled_dir()
+    os.makedirs(output_dir, exist_ok=True)
+    previous = read_manifest(output_dir)['models']
+    options = {
+        'size': size, 'tolerance': tolerance,
+        'lod_ratios': sorted(lod_ratios), 'lod_min_triangles': lod_min_triangles,
+    }
+    models, compiled = {}, []
+    for path in source_models(source_dir):
+        source = os.path.basename(path)
+        entry = previous.get(source)
+        if (
+            force or entry is None or entry.get('options') != options
+            or entry['source_hash'] != file_hash(path)
+            or 'mesh' not in entry
+            or not all(os.path.exists(os.path.join(output_dir, name)) for name in compiled_files(entry))
+        ):
+            entry = compile_model(
+                path, output_dir, size=size, tolerance=tolerance,
+                lod_ratios=lod_ratios, lod_min_triangles=lod_min_triangles,
+            )
+            entry['options'] = options
+            compiled.append(source)
+        models[source] = entry
+
+    manifest = {'version': MANIFEST_VERSION, 'models': models}
+    write_manifest(manifest, output_dir)
+    current = {name for entry in models.values() for name in compiled_files(entry)}
+    for name in os.listdir(output_dir):
+        if name != MANIFEST_NAME and not name.startswith('.') and name not in current:
+            os.remove(os.path.join(output_dir, name))
+    return manifest, compiled
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+def populate_category_paths(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def build(category_id, seen=()):
+        if category_id not in paths:
+            parent_id = parents[category_id]
+            segment = f'{category_id:010d}/'
+            if parent_id is None or parent_id in seen or parent_id not in parents:
+                paths[category_id] = segment
+            else:
+                paths[category_id] = build(parent_id, seen + (category_id,)) + segment
+        return paths[category_id]
+
+    categories = list(Category.objects.only('id', 'path'))
+    for category in categories:
+        category.path = build(category.id)
+    Category.objects.bulk_update(categories, ['path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_orderitem_size_productsize_cartitem_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='Materialized path of zero-padded ancestor ids, maintained automatically', max_length=255),
+        ),
+        migrations.RunPython(populate_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'store_product_fts'
+
+
+def create_search_index(apps, schema_editor):
+    # Only SQLite gets a separate FTS5 index; other databases fall back to
+    # their own full-text search or the in-process index
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"name, short_description, description, tokenize='porter unicode61')"
+            )
+        except OperationalError:
+            # SQLite was built without FTS5
+            return
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, short_description, description) '
+            f'SELECT id, name, short_description, description FROM store_product'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_category_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
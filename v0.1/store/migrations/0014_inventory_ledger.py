@@ -0,0 +1,63 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ProductSize = apps.get_model('store', 'ProductSize')
+    InventoryMovement = apps.get_model('store', 'InventoryMovement')
+    movements = []
+    for product_id, stock, reserved in Product.objects.values_list('id', 'stock', 'reserved'):
+        movements.append((product_id, None, stock, reserved))
+    for size_id, product_id, stock, reserved in ProductSize.objects.values_list('id', 'product_id', 'stock', 'reserved'):
+        movements.append((product_id, size_id, stock, reserved))
+    InventoryMovement.objects.bulk_create([
+        InventoryMovement(product_id=product_id, size_id=size_id, kind=kind, quantity=quantity, note='Opening balance')
+        for product_id, size_id, stock, reserved in movements
+        for kind, quantity in (('adjustment', stock), ('reservation', reserved))
+        if quantity
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sale', 'Sale'), ('return', 'Return'), ('restock', 'Restock'), ('adjustment', 'Adjustment'), ('reservation', 'Reservation'), ('release', 'Reservation released')], max_length=20)),
+                ('quantity', models.IntegerField(help_text='Signed change; reservation kinds change the reserved units')),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventory_movements', to='store.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_movements', to='store.product')),
+                ('size', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inventory_movements', to='store.productsize')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'size', 'id'], name='store_inven_product_bf9b2c_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.IntegerField()),
+                ('reserved', models.IntegerField()),
+                ('last_movement_id', models.PositiveBigIntegerField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_snapshots', to='store.product')),
+                ('size', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inventory_snapshots', to='store.productsize')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'size', '-last_movement_id'], name='store_inven_product_93ed8e_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_inventory_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='variant_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+def fill_listing_columns(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ProductImage = apps.get_model('store', 'ProductImage')
+    ProductSize = apps.get_model('store', 'ProductSize')
+    columns = {product_id: {} for product_id in Product.objects.values_list('id', flat=True)}
+    for product_id, stock, reserved in ProductSize.objects.values_list('product_id', 'stock', 'reserved'):
+        values = columns[product_id]
+        values['has_sizes'] = True
+        values['size_stock'] = values.get('size_stock', 0) + max(stock - reserved, 0)
+    for product_id, image, variants in ProductImage.objects.order_by('product_id', 'order', 'id').values_list(
+        'product_id', 'image', 'variants'
+    ):
+        values = columns[product_id]
+        if 'primary_image_path' not in values:
+            values['primary_image_path'] = image
+            values['primary_image_variants'] = variants
+    for product_id, values in columns.items():
+        if values:
+            Product.objects.filter(pk=product_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_productimage_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='has_sizes',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_path',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='size_stock',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, help_text='Available units over all sizes'),
+        ),
+        migrations.RunPython(fill_listing_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_product_listing_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='print_model',
+            field=models.FileField(blank=True, help_text='STL file of the printed model, used to quote custom sizes', upload_to='print_models/'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='print_model_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Kept in step with store.search.PG_DOCUMENT_COLUMN and PG_CONFIG
+COLUMN = 'search_document'
+CONFIG = 'english'
+INDEX = 'store_product_search_document'
+
+
+def create_search_document(apps, schema_editor):
+    # PostgreSQL only: a stored, weighted tsvector the database keeps current
+    # (PostgreSQL 12+ generated column) with a GIN index for the @@ matches
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f"ALTER TABLE store_product ADD COLUMN {COLUMN} tsvector GENERATED ALWAYS AS ("
+        f"setweight(to_tsvector('{CONFIG}', coalesce(name, '')), 'A') || "
+        f"setweight(to_tsvector('{CONFIG}', coalesce(short_description, '')), 'B') || "
+        f"setweight(to_tsvector('{CONFIG}', coalesce(description, '')), 'C')"
+        f") STORED"
+    )
+    schema_editor.execute(f'CREATE INDEX {INDEX} ON store_product USING GIN ({COLUMN})')
+
+
+def drop_search_document(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX}')
+    schema_editor.execute(f'ALTER TABLE store_product DROP COLUMN IF EXISTS {COLUMN}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_product_print_model'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_document, drop_search_document),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_product_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='print_height',
+            field=models.DecimalField(blank=True, decimal_places=1, help_text='Height in mm of a custom-size print, priced from the print model', max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='print_height',
+            field=models.DecimalField(blank=True, decimal_places=1, help_text='Height in mm of a custom-size print', max_digits=5, null=True),
+        ),
+    ]
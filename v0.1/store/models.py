@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.core.exceptions import ValidationError
+from django.db.models.functions import Cast, Concat, RowNumber, Substr
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils.text import slugify
@@ -6,15 +8,114 @@ from decimal import Decimal
 
 User = get_user_model()
 
+PATH_STEP = 10  # Width of one zero-padded id in Category.path
+
+
+def path_segment(category_id):
+    return f'{category_id:0{PATH_STEP}d}/'
+
+
+def path_q(path, field='path'):
+    """
+    Match ``path`` and every path below it. A prefix match rather than a range,
+    which would depend on how the collation orders '/': PostgreSQL locale
+    collations ignore punctuation. There the db_index on the path column comes
+    with a ``varchar_pattern_ops`` index for these LIKE 'prefix%' queries.
+    """
+    return models.Q(**{f'{field}__startswith': path})
+
+
+class StockLedgerMixin:
+    """
+    ``stock`` and ``reserved`` are balances kept by the inventory ledger
+    (store.inventory) with F() updates, so save() never writes back the values
+    it loaded. A ``stock`` edited since loading (e.g. in the admin) is applied
+    as an adjustment movement of the difference, and the initial stock of a
+    new row is recorded as a restock. ``DERIVED_FIELDS`` are other columns
+    kept by queries (store.product_columns) that save() leaves alone too.
+    """
+
+    LEDGER_FIELDS = ('stock', 'reserved')
+    DERIVED_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_stock = instance.__dict__.get('stock')
+        return instance
+
+    def save(self, *args, **kwargs):
+        from . import inventory
+
+        if self._state.adding or kwargs.get('force_insert') or kwargs.get('update_fields') is not None:
+            adding = self._state.adding
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if adding and self.stock:
+                    inventory.record([inventory.movement(inventory.RESTOCK, *inventory.sku_key(self), self.stock,
+                                                         note='Initial stock')])
+            self._loaded_stock = self.stock
+            return
+
+        deferred = self.get_deferred_fields()
+        kwargs['update_fields'] = [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in deferred
+            and field.name not in self.LEDGER_FIELDS + self.DERIVED_FIELDS
+        ]
+        loaded = getattr(self, '_loaded_stock', None)
+        change = self.stock - loaded if loaded is not None and 'stock' not in deferred else 0
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if change:
+                inventory.change_stock(self, change, inventory.ADJUSTMENT, note='Edited stock')
+        self._loaded_stock = self.stock
+
+
+class CategoryQuerySet(models.QuerySet):
+    def descendants_of(self, category, include_self=True):
+        """All categories below ``category`` at any depth, as one indexed prefix query"""
+        descendants = self.filter(path_q(category.path))
+        if not include_self:
+            descendants = descendants.exclude(pk=category.pk)
+        return descendants
+
+    def rebuild_paths(self):
+        """Recompute every materialized path from the parent links; returns the number changed"""
+        parents = dict(self.model.objects.values_list('id', 'parent_id'))
+        paths = {}
+
+        def build(category_id, seen=()):
+            if category_id not in paths:
+                parent_id = parents[category_id]
+                if parent_id is None or parent_id in seen or parent_id not in parents:
+                    paths[category_id] = path_segment(category_id)
+                else:
+                    paths[category_id] = build(parent_id, seen + (category_id,)) + path_segment(category_id)
+            return paths[category_id]
+
+        changed = []
+        for category in self.model.objects.only('id', 'path'):
+            new_path = build(category.id)
+            if category.path != new_path:
+                category.path = new_path
+                changed.append(category)
+        self.model.objects.bulk_update(changed, ['path'], batch_size=500)
+        return len(changed)
+
 class Category(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='categories/', blank=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='',
+                            help_text="Materialized path of zero-padded ancestor ids, maintained automatically")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CategoryQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
         verbose_name = 'category'
@@ -23,10 +124,42 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        super().clean()
+        if self.parent_id and self.pk and self.parent_id in self.get_descendants().values_list('id', flat=True):
+            raise ValidationError({'parent': 'A category cannot be moved below itself or one of its subcategories.'})
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        parent_path = self._parent_path()
         super().save(*args, **kwargs)
+        self._update_path(parent_path)
+
+    def _parent_path(self):
+        """Return the parent's path, refusing to create a cycle in the hierarchy"""
+        if not self.parent_id:
+            return ''
+        parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+        if self.pk and f'{self.pk:0{PATH_STEP}d}' in parent_path.split('/'):
+            raise ValueError('A category cannot be moved below itself or one of its subcategories.')
+        return parent_path
+
+    def _update_path(self, parent_path):
+        """Keep the materialized path of this category and its descendants in sync with parent"""
+        new_path = parent_path + path_segment(self.pk)
+        old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).get()
+        if old_path == new_path:
+            self.path = new_path
+            return
+        if old_path:
+            # Re-parenting: rewrite the prefix of every descendant in one UPDATE
+            Category.objects.filter(path_q(old_path)).update(
+                path=Concat(models.Value(new_path), Substr('path', len(old_path) + 1))
+            )
+        else:
+            Category.objects.filter(pk=self.pk).update(path=new_path)
+        self.path = new_path
 
     def get_absolute_url(self):
         return reverse('store:category_detail', args=[self.slug])
@@ -35,13 +168,54 @@ class Category(models.Model):
     def is_subcategory(self):
         return self.parent is not None
 
+    @property
+    def depth(self):
+        return self.path.count('/') - 1
+
     def get_subcategories(self):
         return self.children.all()
 
+    def get_descendants(self, include_self=False):
+        return Category.objects.descendants_of(self, include_self=include_self)
+
     def get_root_categories(self):
         return Category.objects.filter(parent=None)
 
-class Product(models.Model):
+class ProductQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Load everything a product card needs in one query: the category and
+        its parent are joined; the primary image and size stock are columns
+        of the product (store.product_columns).
+        """
+        return self.select_related('category__parent')
+
+    def top_per_root_category(self, limit):
+        """
+        Return at most ``limit`` products for every root category in a single
+        query, ranked with ROW_NUMBER() partitioned by the root ancestor taken
+        from the category path. Each product is annotated with ``root_category_id``.
+        """
+        root_category = Substr('category__path', 1, PATH_STEP)
+        return self.annotate(
+            root_category_id=Cast(root_category, models.BigIntegerField()),
+            root_rank=models.Window(
+                RowNumber(),
+                partition_by=[root_category],
+                order_by=[models.F('created_at').desc(), models.F('id').desc()],
+            ),
+        ).filter(root_rank__lte=limit)
+
+    def search(self, query):
+        """Full-text matches for ``query``, ordered by relevance (see store.search)"""
+        from .search import get_search_backend
+        return get_search_backend().filter_queryset(self, query)
+
+    def in_category(self, category):
+        """Products in ``category`` or any of its subcategories, at any depth"""
+        return self.filter(path_q(category.path, 'category__path'))
+
+class Product(StockLedgerMixin, models.Model):
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE, 
                                 help_text="Select either a main category or a subcategory")
     name = models.CharField(max_length=200)
@@ -51,43 +225,93 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     old_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     stock = models.PositiveIntegerField(default=0)
+    reserved = models.PositiveIntegerField(default=0, editable=False, help_text="Units held by open checkouts")
     featured = models.BooleanField(default=False)
+    print_model = models.FileField(upload_to='print_models/', blank=True,
+                                   help_text="STL file of the printed model, used to quote custom sizes")
+    # Content hash of print_model, the key of its cached geometry (store.print_quotes)
+    print_model_hash = models.CharField(max_length=16, blank=True, editable=False)
+    # Copies of image and size data for listings, kept by store.product_columns
+    primary_image_path = models.CharField(max_length=100, blank=True, editable=False)
+    primary_image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    has_sizes = models.BooleanField(default=False, editable=False, db_index=True)
+    size_stock = models.PositiveIntegerField(default=0, editable=False, db_index=True,
+                                             help_text="Available units over all sizes")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    DERIVED_FIELDS = ('primary_image_path', 'primary_image_variants', 'has_sizes', 'size_stock')
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_label = instance.suggestion_label
+        return instance
+
+    @property
+    def suggestion_label(self):
+        """What the suggestion index shows of this product; None for a deferred field"""
+        return self.__dict__.get('name'), self.__dict__.get('slug')
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        if 'print_model' in self.get_deferred_fields():
+            pass
+        elif not self.print_model:
+            self.print_model_hash = ''
+        elif not self.print_model._committed or not self.print_model_hash:
+            # A new upload, hashed before it is stored
+            from .print_quotes import model_hash
+            self.print_model_hash = model_hash(self.print_model)
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse('store:product_detail', args=[self.slug])
     
+    def _primary_image(self):
+        """The first ProductImage, rebuilt from the denormalized columns without a query"""
+        if not self.primary_image_path:
+            return None
+        return ProductImage(product=self, image=self.primary_image_path, variants=self.primary_image_variants)
+
     @property
     def image(self):
         """Return the primary image (first in order) or a placeholder if no images exist"""
-        first_image = self.images.first()
+        first_image = self._primary_image()
         if first_image:
             return first_image.image
         return None  # Return None when no image is available
     
+    @property
+    def primary_image(self):
+        """The first ProductImage (with its variants), or None"""
+        return self._primary_image()
+
     @property
     def image_url(self):
         """Return URL of primary image or placeholder URL if no images exist"""
-        first_image = self.images.first()
+        first_image = self._primary_image()
         if first_image and first_image.image:
             return first_image.image.url
         return '/static/img/placeholder.png'  # Return a placeholder image path
 
+    @property
+    def available_stock(self):
+        """Stock not held by other customers' checkouts"""
+        return max(self.stock - self.reserved, 0)
+
     @property
     def is_in_stock(self):
-        return self.stock > 0 or self.sizes.filter(stock__gt=0).exists()
+        return self.available_stock > 0 or self.size_stock > 0
 
     @property
     def get_category_display(self):
@@ -95,16 +319,15 @@ class Product(models.Model):
         if self.category.is_subcategory:
             return f"{self.category.parent.name} › {self.category.name}"
         return self.category.name
-        
-    @property
-    def has_sizes(self):
-        """Check if the product has size options"""
-        return self.sizes.exists()
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='products/')
     order = models.PositiveIntegerField(default=0, blank=False, null=False)
+    # Resized copies (store.images): {format: {width: storage name}}, and the
+    # content hash of the original they were made from
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+    variant_hash = models.CharField(max_length=16, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -115,7 +338,25 @@ class ProductImage(models.Model):
     def __str__(self):
         return f'Image for {self.product.name}'
 
-class ProductSize(models.Model):
+    def variant_urls(self, fmt='jpeg'):
+        """``[(width, url)]`` of the variants in ``fmt``, narrowest first"""
+        storage = self.image.storage
+        by_width = self.variants.get(fmt, {})
+        return [(int(width), storage.url(by_width[width])) for width in sorted(by_width, key=int)]
+
+    def srcset(self, fmt='jpeg'):
+        """``srcset`` attribute value for the variants in ``fmt`` (empty without variants)"""
+        return ', '.join(f'{url} {width}w' for width, url in self.variant_urls(fmt))
+
+    def url_for_width(self, width, fmt='jpeg'):
+        """Narrowest variant at least ``width`` pixels wide, else the widest, else the original"""
+        urls = self.variant_urls(fmt)
+        for variant_width, url in urls:
+            if variant_width >= width:
+                return url
+        return urls[-1][1] if urls else self.image.url
+
+class ProductSize(StockLedgerMixin, models.Model):
     """Model for product size options"""
     SIZE_CHOICES = [
         ('xs', 'Extra Small'),
@@ -139,6 +380,7 @@ class ProductSize(models.Model):
     size = models.CharField(max_length=20, choices=SIZE_CHOICES)
     price_adjustment = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Price adjustment for this size (can be positive or negative)")
     stock = models.PositiveIntegerField(default=0)
+    reserved = models.PositiveIntegerField(default=0, editable=False, help_text="Units held by open checkouts")
     weight = models.DecimalField(max_digits=6, decimal_places=2, blank=True, null=True, help_text="Weight in kg")
     
     class Meta:
@@ -158,9 +400,27 @@ class ProductSize(models.Model):
         """Calculate the final price including the adjustment"""
         return self.product.price + self.price_adjustment
         
+    @property
+    def available_stock(self):
+        """Stock not held by other customers' checkouts"""
+        return max(self.stock - self.reserved, 0)
+
     @property
     def is_in_stock(self):
-        return self.stock > 0
+        return self.available_stock > 0
+
+class StockReservation(models.Model):
+    """Stock held for a customer between checkout and payment (see store.reservations)"""
+    user = models.ForeignKey(User, related_name='stock_reservations', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    size = models.ForeignKey(ProductSize, related_name='reservations', on_delete=models.CASCADE, null=True, blank=True)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        size_str = f" - {self.size.get_size_display()}" if self.size else ""
+        return f'{self.quantity} x {self.product.name}{size_str} held for {self.user.username}'
 
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -182,19 +442,24 @@ class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     size = models.ForeignKey(ProductSize, on_delete=models.SET_NULL, null=True, blank=True)
+    print_height = models.DecimalField(max_digits=5, decimal_places=1, null=True, blank=True,
+                                       help_text="Height in mm of a custom-size print, priced from the print model")
     quantity = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         size_str = f" - {self.size.get_size_display()}" if self.size else ""
-        return f'{self.quantity} x {self.product.name}{size_str}'
+        height_str = f" ({self.print_height} mm)" if self.print_height is not None else ""
+        return f'{self.quantity} x {self.product.name}{size_str}{height_str}'
+
+    @property
+    def unit_price(self):
+        from .pricing import unit_price
+        return unit_price(self)
 
     @property
     def total_price(self):
-        if self.size and self.size.price_adjustment:
-            # Use size-specific price if available
-            return (self.product.price + self.size.price_adjustment) * self.quantity
-        return self.product.price * self.quantity
+        return self.unit_price * self.quantity
 
 class ShippingAddress(models.Model):
     first_name = models.CharField(max_length=100)
@@ -260,22 +525,73 @@ class Order(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.order_number:
-            # Generate order number based on timestamp
-            from datetime import datetime
-            self.order_number = datetime.now().strftime('%Y%m%d%H%M%S')
+            # Collision-free, date-prefixed number from the configured generator
+            from .order_numbers import generate_order_number
+            self.order_number = generate_order_number()
         super().save(*args, **kwargs)
 
+class OrderNumberSequence(models.Model):
+    """Shared counter from which worker processes reserve blocks of order numbers"""
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.last_value}'
+
+class InventoryMovement(models.Model):
+    """Append-only record of one change to a SKU's stock or reserved units (see store.inventory)"""
+    KIND_CHOICES = [
+        ('sale', 'Sale'),
+        ('return', 'Return'),
+        ('restock', 'Restock'),
+        ('adjustment', 'Adjustment'),
+        ('reservation', 'Reservation'),
+        ('release', 'Reservation released'),
+    ]
+
+    product = models.ForeignKey(Product, related_name='inventory_movements', on_delete=models.CASCADE)
+    size = models.ForeignKey(ProductSize, related_name='inventory_movements', on_delete=models.CASCADE, null=True, blank=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField(help_text="Signed change; reservation kinds change the reserved units")
+    order = models.ForeignKey('Order', related_name='inventory_movements', on_delete=models.SET_NULL, null=True, blank=True)
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['product', 'size', 'id'])]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.quantity:+d} x {self.product_id}'
+
+class InventorySnapshot(models.Model):
+    """Balances of one SKU including every movement up to ``last_movement_id``"""
+    product = models.ForeignKey(Product, related_name='inventory_snapshots', on_delete=models.CASCADE)
+    size = models.ForeignKey(ProductSize, related_name='inventory_snapshots', on_delete=models.CASCADE, null=True, blank=True)
+    stock = models.IntegerField()
+    reserved = models.IntegerField()
+    last_movement_id = models.PositiveBigIntegerField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['product', 'size', '-last_movement_id'])]
+
+    def __str__(self):
+        return f'{self.product_id}/{self.size_id or "-"}: {self.stock} in stock at movement {self.last_movement_id}'
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
     size = models.CharField(max_length=50, blank=True, null=True)
+    print_height = models.DecimalField(max_digits=5, decimal_places=1, null=True, blank=True,
+                                       help_text="Height in mm of a custom-size print")
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True, null=True)
 
     def __str__(self):
         size_str = f" - {self.size}" if self.size else ""
-        return f'{self.quantity} x {self.product.name}{size_str}'
+        height_str = f" ({self.print_height} mm)" if self.print_height is not None else ""
+        return f'{self.quantity} x {self.product.name}{size_str}{height_str}'
 
     @property
     def total_price(self):
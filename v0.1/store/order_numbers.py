@@ -0,0 +1,134 @@
+"""
+Order number generation.
+
+Order numbers look like ``20261018-0000012345``: the order date followed by a
+counter that is unique across every process. ``STORE_ORDER_NUMBER_GENERATOR``
+picks the implementation: ``auto`` (default) uses a database sequence on
+PostgreSQL and blocks everywhere else; ``block``, ``sequence`` or a dotted path
+to a ``BaseOrderNumberGenerator`` subclass force one.
+
+``block``
+    Each process reserves a block of counter values from the
+    OrderNumberSequence table with one guarded UPDATE and hands them out from
+    memory, so the database is touched once per ``STORE_ORDER_NUMBER_BLOCK_SIZE``
+    orders.
+
+``sequence``
+    PostgreSQL only: ``nextval()`` on a database sequence, which is never
+    rolled back and needs no table lock.
+
+Numbers are unique but, with blocks, only roughly ordered within a day.
+"""
+import abc
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+COUNTER_WIDTH = 10
+SEQUENCE_NAME = 'order_number'
+DB_SEQUENCE = 'store_order_number_seq'
+DEFAULT_BLOCK_SIZE = 100
+
+
+def format_order_number(value, date=None):
+    date = date or timezone.localdate()
+    return f'{date:%Y%m%d}-{value:0{COUNTER_WIDTH}d}'
+
+
+class BaseOrderNumberGenerator(abc.ABC):
+    """Produces order numbers; subclasses implement ``next_value``"""
+
+    @abc.abstractmethod
+    def next_value(self):
+        """Next counter value, unique across every process"""
+
+    def __call__(self):
+        return format_order_number(self.next_value())
+
+
+class BlockOrderNumberGenerator(BaseOrderNumberGenerator):
+    """Hands out numbers from blocks reserved in the OrderNumberSequence table"""
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or getattr(settings, 'STORE_ORDER_NUMBER_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._next = 0
+        self._end = 0
+
+    def reserve_block(self, size):
+        """Reserve ``size`` counter values; returns the first one"""
+        from .models import OrderNumberSequence
+
+        sequence = OrderNumberSequence.objects.filter(name=SEQUENCE_NAME)
+        while True:
+            # UPDATE before SELECT: the row lock (or SQLite's write lock) is taken
+            # first, so concurrent reservations queue up instead of deadlocking
+            with transaction.atomic():
+                if sequence.update(last_value=F('last_value') + size):
+                    return sequence.values_list('last_value', flat=True).get() - size + 1
+            try:
+                with transaction.atomic():
+                    OrderNumberSequence.objects.create(name=SEQUENCE_NAME)
+            except IntegrityError:
+                pass  # another process created the row first
+
+    def next_value(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked worker must not hand out what is left of its parent's block
+                self._pid = os.getpid()
+                self._next = self._end = 0
+            if self._next >= self._end:
+                if connection.in_atomic_block:
+                    # The reservation would be undone if the surrounding transaction
+                    # rolls back, so only use it for this one number (which is rolled
+                    # back together with it) rather than keeping the block around.
+                    return self.reserve_block(1)
+                self._next = self.reserve_block(self.block_size)
+                self._end = self._next + self.block_size
+            value = self._next
+            self._next += 1
+            return value
+
+
+class SequenceOrderNumberGenerator(BaseOrderNumberGenerator):
+    """PostgreSQL sequence; values are never reused even when a transaction rolls back"""
+
+    def next_value(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [DB_SEQUENCE])
+            return cursor.fetchone()[0]
+
+
+GENERATORS = {
+    'block': 'store.order_numbers.BlockOrderNumberGenerator',
+    'sequence': 'store.order_numbers.SequenceOrderNumberGenerator',
+}
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_order_number_generator():
+    """Return the configured generator, created once per process"""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                name = getattr(settings, 'STORE_ORDER_NUMBER_GENERATOR', 'auto')
+                if name == 'auto':
+                    name = 'sequence' if connection.vendor == 'postgresql' else 'block'
+                path = GENERATORS.get(name, name)
+                _generator = import_string(path)()
+    return _generator
+
+
+def generate_order_number():
+    """Return a new order number; call it outside a transaction where possible so blocks can be reused"""
+    return get_order_number_generator()()
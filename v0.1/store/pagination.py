@@ -0,0 +1,194 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are fetched with ``WHERE (sort key, id) > (last row's values)`` instead
+of OFFSET, so page 100 costs the same as page 1 and rows inserted meanwhile
+do not shift the pages. Cursors are signed, opaque strings holding the
+ordering they were made for, the sort values of the boundary row and the
+direction of travel. A cursor made for another ordering (e.g. a shared link
+whose ?sort= was changed), or whose values no longer fit the fields, leads to
+the first page.
+
+The module also holds the helpers that the paginated views of the store and
+accounts apps share.
+"""
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+CURSOR_SALT = 'store.pagination.cursor'
+
+# Page size of the order histories (store and accounts)
+ORDERS_PER_PAGE = 20
+
+
+def is_ajax(request):
+    """Requests from the listing scripts, answered with a page's ``to_dict()``"""
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def order_to_dict(order):
+    """JSON form of an order in a page of order history"""
+    return {
+        'id': order.id,
+        'order_number': order.order_number,
+        'status': order.status,
+        'total_amount': str(order.total_amount),
+        'created_at': order.created_at.isoformat(),
+    }
+
+
+class KeysetPage:
+    """One page of results plus the cursors leading to its neighbours"""
+
+    def __init__(self, items, next_cursor, previous_cursor, queryset):
+        self.object_list = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._queryset = queryset
+        self._count = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def to_dict(self, serialize):
+        """JSON-ready representation for API consumers following the cursors"""
+        return {
+            'results': [serialize(item) for item in self.object_list],
+            'next_cursor': self.next_cursor,
+            'previous_cursor': self.previous_cursor,
+        }
+
+    @property
+    def count(self):
+        """Total number of rows across all pages (one COUNT query, on demand)"""
+        if self._count is None:
+            self._count = self._queryset.count()
+        return self._count
+
+    @count.setter
+    def count(self, value):
+        # Lets callers that already know the total (e.g. from facet counts) skip the COUNT
+        self._count = value
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by ``ordering`` (field names, ``-`` for descending)
+    with ``id`` appended as the tie breaker. Pass ``ordering=None`` to keep
+    the queryset's own ordering (e.g. search relevance); such pages fall back
+    to offsets carried in the same opaque cursor.
+    """
+
+    def __init__(self, queryset, ordering, per_page=24):
+        self.queryset = queryset
+        self.per_page = per_page
+        if ordering is None:
+            self.keys = None
+            self.ordering_key = ''
+        else:
+            keys = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+            if 'id' not in (field for field, _ in keys):
+                keys.append(('id', keys[-1][1] if keys else False))
+            self.keys = keys
+            self.ordering_key = ','.join(self._order_by(reverse=False))
+
+    @staticmethod
+    def encode_cursor(payload):
+        return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Return the cursor payload, or None for a missing or tampered cursor"""
+        if not cursor:
+            return None
+        try:
+            return signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            return None
+
+    def _order_by(self, reverse):
+        return [f'-{field}' if descending != reverse else field for field, descending in self.keys]
+
+    def _after(self, values, reverse):
+        """Q matching rows that come after ``values`` in the (possibly reversed) sort order"""
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(self.keys, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _values(self, item):
+        values = []
+        for field, _ in self.keys:
+            value = getattr(item, field)
+            # Decimals and datetimes travel as strings; the model field converts them back
+            values.append(value if isinstance(value, (int, str)) or value is None else str(value))
+        return values
+
+    def _cursor(self, payload):
+        return self.encode_cursor({'k': self.ordering_key, **payload})
+
+    def page(self, cursor=None):
+        payload = self.decode_cursor(cursor)
+        if not isinstance(payload, dict) or payload.get('k') != self.ordering_key:
+            payload = None
+        if self.keys is None:
+            return self._offset_page(payload)
+
+        backwards = False
+        from_cursor = bool(payload) and len(payload.get('v', [])) == len(self.keys)
+        if from_cursor:
+            backwards = payload.get('d') == 'p'
+            try:
+                items = self._fetch(self.queryset.filter(self._after(payload['v'], reverse=backwards)), backwards)
+            except (ValidationError, ValueError, TypeError):
+                # Values the fields cannot take (e.g. a cursor from before a schema change)
+                from_cursor = backwards = False
+        if not from_cursor:
+            items = self._fetch(self.queryset, backwards)
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            items.reverse()
+
+        next_cursor = previous_cursor = None
+        if items:
+            if has_more or backwards:
+                next_cursor = self._cursor({'v': self._values(items[-1]), 'd': 'n'})
+            if from_cursor and (has_more or not backwards):
+                previous_cursor = self._cursor({'v': self._values(items[0]), 'd': 'p'})
+        return KeysetPage(items, next_cursor, previous_cursor, self.queryset)
+
+    def _fetch(self, queryset, backwards):
+        return list(queryset.order_by(*self._order_by(reverse=backwards))[:self.per_page + 1])
+
+    def _offset_page(self, payload):
+        offset = payload.get('o', 0) if payload else 0
+        offset = offset if isinstance(offset, int) and offset > 0 else 0
+        items = list(self.queryset[offset:offset + self.per_page + 1])
+        next_cursor = previous_cursor = None
+        if len(items) > self.per_page:
+            next_cursor = self._cursor({'o': offset + self.per_page})
+        if offset:
+            previous_cursor = self._cursor({'o': max(offset - self.per_page, 0)})
+        return KeysetPage(items[:self.per_page], next_cursor, previous_cursor, self.queryset)
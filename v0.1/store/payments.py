@@ -0,0 +1,204 @@
+"""
+Card payments.
+
+``process_payment`` charges through the gateway named by
+``STORE_PAYMENT_GATEWAY``. The choices are ``stripe``, ``simulator`` (an
+in-process stand-in with configurable latency and error rate, used for load
+tests) or a dotted path to a BasePaymentGateway subclass. A gateway raises
+PaymentDeclined for a refused card and PaymentUnavailable when nothing was
+charged because the provider could not take the payment; only then is the
+order cancelled. Any other failure (a timeout, a lost connection, a provider
+error) leaves the outcome unknown: the charge may have gone through, so
+``process_payment`` keeps the order with ``payment_status='pending'`` to be
+reconciled against the provider (Stripe charges carry the order number in
+their metadata).
+
+The Stripe client is blocking, so ``acharge`` runs the charge in a
+bounded thread pool and awaits it: under ASGI the event loop keeps serving
+other requests during the provider round trip, and at most
+``STORE_PAYMENT_WORKERS`` charges are in flight per process. A checkout that
+cannot get a pool slot within ``STORE_PAYMENT_TIMEOUT`` seconds fails with
+PaymentUnavailable before anything is sent. Once sent, a charge is bounded by
+the HTTP client timeout (and its retries) only, because abandoning a request
+that may still succeed would charge the customer for a cancelled order.
+
+Every Stripe charge carries the idempotency key of its order, so the client's
+network retries can never charge twice. The gateway charges through its own
+``stripe.StripeClient`` rather than the stripe module's globals, so its
+timeout and retries apply to nothing else in the process. ``STRIPE_API_BASE``
+points it at another server, e.g. the ``fake_stripe`` command for offline
+benchmarks.
+"""
+import abc
+import asyncio
+import random
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import stripe
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_WORKERS = 8
+DEFAULT_RETRIES = 2
+DEFAULT_SIMULATOR_LATENCY = 0.05
+
+# Stripe's test token for a declined card; the simulator declines it too
+DECLINED_TOKEN = 'tok_chargeDeclined'
+
+
+class PaymentDeclined(Exception):
+    """The card was refused; the message can be shown to the customer"""
+
+
+class PaymentUnavailable(Exception):
+    """The provider is busy or failed before charging; nothing was charged"""
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = weakref.WeakKeyDictionary()
+
+
+def payment_timeout():
+    return getattr(settings, 'STORE_PAYMENT_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def _workers():
+    return getattr(settings, 'STORE_PAYMENT_WORKERS', DEFAULT_WORKERS)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='payment')
+    return _executor
+
+
+def _slot():
+    # One semaphore per event loop; it admits as many charges as the pool has threads
+    loop = asyncio.get_running_loop()
+    with _lock:
+        if loop not in _slots:
+            _slots[loop] = asyncio.Semaphore(_workers())
+        return _slots[loop]
+
+
+def idempotency_key(order):
+    return f'order-{order.order_number}-charge'
+
+
+class BasePaymentGateway(abc.ABC):
+    """Charges cards for orders; subclasses implement ``charge``"""
+
+    @abc.abstractmethod
+    def charge(self, order, token, amount, description):
+        """Charge ``amount`` (a Decimal in dollars) for ``order``, blocking; returns the charge id"""
+
+    async def acharge(self, order, token, amount, description):
+        """``charge`` on the payment pool, without blocking the event loop"""
+        slot = _slot()
+        try:
+            await asyncio.wait_for(slot.acquire(), payment_timeout())
+        except asyncio.TimeoutError:
+            raise PaymentUnavailable('The payment service is busy. Please try again.')
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_get_executor(), self.charge, order, token, amount, description)
+        finally:
+            slot.release()
+
+
+class StripeGateway(BasePaymentGateway):
+    # Errors raised before Stripe created a charge: nothing was charged
+    NOT_CHARGED = (
+        stripe.InvalidRequestError,
+        stripe.AuthenticationError,
+        stripe.PermissionError,
+        stripe.RateLimitError,
+    )
+
+    def __init__(self):
+        api_base = getattr(settings, 'STRIPE_API_BASE', '')
+        self.client = stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY,
+            http_client=stripe.RequestsClient(timeout=payment_timeout()),
+            max_network_retries=getattr(settings, 'STORE_PAYMENT_RETRIES', DEFAULT_RETRIES),
+            base_addresses={'api': api_base} if api_base else {},
+        )
+
+    def charge(self, order, token, amount, description):
+        try:
+            charge = self.client.charges.create(params={
+                'amount': int(amount * 100),  # Convert to cents
+                'currency': 'usd',
+                'source': token,
+                'description': description,
+                'metadata': {'order_number': order.order_number},
+            }, options={'idempotency_key': idempotency_key(order)})
+        except stripe.CardError as e:
+            raise PaymentDeclined(e.user_message or 'Your card was declined.')
+        except self.NOT_CHARGED:
+            raise PaymentUnavailable('The payment could not be processed. Please try again.')
+        return charge.id
+
+
+class SimulatedGateway(BasePaymentGateway):
+    """
+    Approves every card except DECLINED_TOKEN after ``latency`` seconds, and
+    fails a random ``error_rate`` share of charges with PaymentUnavailable.
+    ``acharge`` sleeps on the event loop instead of using the payment pool.
+    """
+
+    def __init__(self, latency=None, error_rate=None, seed=None):
+        self.latency = latency if latency is not None else getattr(
+            settings, 'STORE_PAYMENT_SIMULATOR_LATENCY', DEFAULT_SIMULATOR_LATENCY
+        )
+        self.error_rate = error_rate if error_rate is not None else getattr(
+            settings, 'STORE_PAYMENT_SIMULATOR_ERROR_RATE', 0.0
+        )
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _result(self, token):
+        if token == DECLINED_TOKEN:
+            raise PaymentDeclined('Your card was declined.')
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+        if failed:
+            raise PaymentUnavailable('Simulated payment provider error. Please try again.')
+        return f'ch_sim_{uuid.uuid4().hex[:24]}'
+
+    def charge(self, order, token, amount, description):
+        time.sleep(self.latency)
+        return self._result(token)
+
+    async def acharge(self, order, token, amount, description):
+        await asyncio.sleep(self.latency)
+        return self._result(token)
+
+
+GATEWAYS = {
+    'stripe': 'store.payments.StripeGateway',
+    'simulator': 'store.payments.SimulatedGateway',
+}
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_payment_gateway():
+    """Return the configured gateway, created once per process"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                name = getattr(settings, 'STORE_PAYMENT_GATEWAY', 'stripe')
+                _gateway = import_string(GATEWAYS.get(name, name))()
+    return _gateway
@@ -0,0 +1,154 @@
+"""
+Cart pricing.
+
+CartPricer loads a user's cart lines together with their products and sizes
+in one joined query, then prices every line and the order totals in a single
+pass. All amounts are Decimals; tax is rounded half-up to the cent once, on
+the subtotal, so the page, the JSON responses and the charged total always
+agree. ``get_cart_pricing`` memoizes the result on the request and refreshes
+the cached cart summary (store.cart_summary) used by the header badge.
+
+A custom-size print line is priced at the quote for its ``print_height``
+(store.print_quotes) instead of the size's fixed adjustment.
+"""
+import logging
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+
+from .cart_summary import current_version, store_cart_summary
+from .models import CartItem
+from .print_quotes import QuoteError, quote_product
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+FREE_SHIPPING_THRESHOLD = Decimal('50.00')
+SHIPPING_COST = Decimal('5.00')
+TAX_RATE = Decimal('0.10')
+
+
+def unit_price(item):
+    """Price of one unit of a cart line: the print quote at its height, else with its size adjustment"""
+    if item.print_height is not None:
+        try:
+            return quote_product(item.product, float(item.print_height)).price
+        except QuoteError as error:
+            # e.g. the print model was removed since the line was added
+            logger.warning('Pricing %s at its size price: %s', item, error)
+    if item.size_id:
+        return item.product.price + item.size.price_adjustment
+    return item.product.price
+
+
+@dataclass(frozen=True)
+class PricedLine:
+    item: CartItem
+    unit_price: Decimal
+    total: Decimal
+
+
+@dataclass(frozen=True)
+class CartPricing:
+    lines: tuple
+    count: int
+    subtotal: Decimal
+    shipping_cost: Decimal
+    tax_amount: Decimal
+    total: Decimal
+
+    @property
+    def items(self):
+        return [line.item for line in self.lines]
+
+    @property
+    def free_shipping_eligible(self):
+        return self.subtotal >= FREE_SHIPPING_THRESHOLD
+
+    @property
+    def amount_needed_for_free_shipping(self):
+        return max(FREE_SHIPPING_THRESHOLD - self.subtotal, Decimal('0.00'))
+
+    def line_for(self, item_id):
+        for line in self.lines:
+            if line.item.pk == item_id:
+                return line
+        return None
+
+    def order_totals(self):
+        """The ``totals`` argument of checkout.place_order"""
+        return {'total': self.total, 'shipping_cost': self.shipping_cost, 'tax_amount': self.tax_amount}
+
+    def to_dict(self):
+        return {
+            'subtotal': str(self.subtotal),
+            'shipping_cost': str(self.shipping_cost),
+            'tax_amount': str(self.tax_amount),
+            'total': str(self.total),
+            'free_shipping_eligible': self.free_shipping_eligible,
+            'amount_needed_for_free_shipping': str(self.amount_needed_for_free_shipping),
+            'cart_count': self.count,
+        }
+
+
+class CartPricer:
+    """Price the cart of ``user`` (anonymous users have an empty cart)"""
+
+    def __init__(self, user):
+        self.user = user
+
+    def queryset(self):
+        # The join is all the cart templates need; the primary image is a product column
+        return (
+            CartItem.objects.filter(cart__user=self.user)
+            .select_related('product__category', 'size')
+            .order_by('created_at', 'id')
+        )
+
+    def price(self):
+        items = list(self.queryset()) if self.user.is_authenticated else []
+        for item in items:
+            if item.size_id:
+                # Reuse the joined product for ProductSize.get_final_price
+                item.size.product = item.product
+        return self.price_items(items)
+
+    @staticmethod
+    def price_items(items):
+        """Price already loaded cart items (with product and size)"""
+        lines = []
+        count = 0
+        subtotal = Decimal('0.00')
+        for item in items:
+            price = unit_price(item)
+            line_total = price * item.quantity
+            lines.append(PricedLine(item, price, line_total))
+            count += item.quantity
+            subtotal += line_total
+        shipping_cost = Decimal('0.00') if subtotal >= FREE_SHIPPING_THRESHOLD else SHIPPING_COST
+        tax_amount = (subtotal * TAX_RATE).quantize(CENT, rounding=ROUND_HALF_UP)
+        return CartPricing(
+            lines=tuple(lines),
+            count=count,
+            subtotal=subtotal,
+            shipping_cost=shipping_cost,
+            tax_amount=tax_amount,
+            total=subtotal + shipping_cost + tax_amount,
+        )
+
+
+def get_cart_pricing(request):
+    """The request user's cart pricing, computed at most once per request"""
+    if getattr(request, '_cart_pricing', None) is None:
+        user = request.user
+        # Read the version first: a change committed while pricing makes this summary stale
+        version = current_version(user.pk) if user.is_authenticated else 0
+        request._cart_pricing = CartPricer(user).price()
+        request._cart_pricing_version = version
+        if user.is_authenticated:
+            store_cart_summary(user.pk, request._cart_pricing, version)
+    return request._cart_pricing
+
+
+def invalidate_cart_pricing(request):
+    """Forget the memoized pricing after the cart changed during the request"""
+    request._cart_pricing = None
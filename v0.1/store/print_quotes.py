@@ -0,0 +1,218 @@
+"""
+Quotes for 3D prints of a product's STL model at any height.
+
+The geometry of ``Product.print_model`` (volume, surface area, bounding box
+and triangle count, in the file's units, taken to be millimetres) is measured
+once with NumPy over all triangles at once (store.meshes.measure) and cached
+in ``STORE_PRINT_QUOTE_CACHE`` under the file's content hash. The hash is
+taken when the file is saved (``Product.save``), so a quote never reads the
+file again: it scales the cached numbers to the requested height and prices
+them, which takes microseconds however large the mesh is. Replacing the file
+changes the hash and so the key; entries never go stale.
+
+A print is priced as the outer walls (surface area times
+``STORE_PRINT_WALL``, at most the whole volume) plus ``STORE_PRINT_INFILL``
+of the interior. Its weight follows from ``STORE_PRINT_DENSITY``, its time
+from ``STORE_PRINT_FLOW_RATE``, and its price is ``STORE_PRINT_BASE_FEE``
+plus the material at ``STORE_PRINT_MATERIAL_PRICE`` per kg and the machine
+time at ``STORE_PRINT_HOURLY_RATE``.
+
+The custom size is sold at a chosen height: the cart line and the order
+item keep it (``print_height``), and store.pricing charges the line at the
+quote for that height, so the product page, the cart and the payment agree.
+"""
+import hashlib
+import logging
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from .meshes import load_triangles, measure
+
+logger = logging.getLogger(__name__)
+
+HASH_LENGTH = 16
+CENT = Decimal('0.01')
+# Precision of the heights kept on cart lines
+HEIGHT_STEP = Decimal('0.1')
+
+DEFAULT_DENSITY = 1.24  # g/cm³, PLA
+DEFAULT_INFILL = 0.2
+DEFAULT_WALL = 1.2  # mm
+DEFAULT_FLOW_RATE = 8.0  # mm³ of filament per second
+DEFAULT_MATERIAL_PRICE = '25.00'  # per kg
+DEFAULT_HOURLY_RATE = '1.50'
+DEFAULT_BASE_FEE = '5.00'
+DEFAULT_MIN_HEIGHT = 20.0  # mm
+DEFAULT_MAX_HEIGHT = 300.0
+
+# Heights (mm) of the fixed ProductSize choices
+SIZE_HEIGHTS = {'small': 100.0, 'medium': 150.0, 'large': 200.0}
+# The ProductSize printed at the height the customer picks
+CUSTOM_SIZE = 'custom'
+
+
+class QuoteError(ValueError):
+    """The model cannot be quoted (unreadable or flat) or the height is out of range"""
+
+
+@dataclass(frozen=True)
+class PrintQuote:
+    height: float  # mm
+    scale: float
+    size: tuple  # x, y, z in mm
+    volume: float  # cm³ of the solid model
+    area: float  # cm²
+    material: float  # cm³ actually printed
+    weight: float  # g
+    hours: float
+    price: Decimal
+
+    def as_dict(self):
+        return {
+            'height': round(self.height, 1),
+            'scale': round(self.scale, 6),
+            'size': [round(value, 1) for value in self.size],
+            'volume': round(self.volume, 2),
+            'area': round(self.area, 2),
+            'material': round(self.material, 2),
+            'weight': round(self.weight, 1),
+            'hours': round(self.hours, 2),
+            'price': str(self.price),
+        }
+
+
+def _cache():
+    return caches[getattr(settings, 'STORE_PRINT_QUOTE_CACHE', 'default')]
+
+
+def _setting(name, default, kind=float):
+    return kind(str(getattr(settings, name, default)))
+
+
+def height_range():
+    """``(lowest, highest)`` height in mm a model can be quoted at"""
+    return (_setting('STORE_PRINT_MIN_HEIGHT', DEFAULT_MIN_HEIGHT),
+            _setting('STORE_PRINT_MAX_HEIGHT', DEFAULT_MAX_HEIGHT))
+
+
+def model_hash(field_file):
+    """Content hash of a model file, new upload or stored"""
+    digest = hashlib.sha256()
+    for chunk in field_file.chunks():
+        digest.update(chunk)
+    if field_file._committed:
+        field_file.close()
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def geometry_key(digest):
+    return f'store:print:geometry:{digest}'
+
+
+def measure_model(field_file):
+    """Volume, surface area, size and triangle count of an STL file, in its own units"""
+    with field_file.open('rb') as handle:
+        corners = load_triangles(field_file.name, handle)
+    # The triangles need no welding for these: index every corner on its own
+    metrics = measure(corners.reshape(-1, 3), np.arange(corners.shape[0] * 3).reshape(-1, 3))
+    return {key: metrics[key] for key in ('volume', 'area', 'size', 'triangles')}
+
+
+def _key(product):
+    if not product.print_model:
+        raise QuoteError('This product has no print model')
+    return geometry_key(product.print_model_hash or model_hash(product.print_model))
+
+
+def refresh_geometry(product):
+    """Measure ``product``'s print model and cache the result"""
+    key = _key(product)
+    try:
+        geometry = measure_model(product.print_model)
+    except (OSError, ValueError, AssertionError) as error:
+        # numpy-stl asserts on malformed files
+        raise QuoteError(f'Cannot read the print model: {error}') from error
+    _cache().set(key, geometry, timeout=None)
+    return geometry
+
+
+def model_geometry(product):
+    """The cached geometry of ``product``'s print model, measured on a miss"""
+    geometry = _cache().get(_key(product))
+    if geometry is None:
+        geometry = refresh_geometry(product)
+    return geometry
+
+
+def warm_geometry(product):
+    """Measure ``product``'s print model ahead of its first quote"""
+    try:
+        model_geometry(product)
+    except QuoteError as error:
+        logger.warning('No print quotes for %s: %s', product.slug, error)
+
+
+def quote(geometry, height):
+    """:class:`PrintQuote` of a model with ``geometry`` printed ``height`` mm tall"""
+    lowest, highest = height_range()
+    if not lowest <= height <= highest:
+        raise QuoteError(f'Choose a height between {lowest:g} and {highest:g} mm')
+    model_height = geometry['size'][2]
+    if model_height <= 0 or geometry['volume'] <= 0:
+        raise QuoteError('The print model is flat or not a closed solid')
+
+    scale = height / model_height
+    volume = geometry['volume'] * scale ** 3  # mm³
+    area = geometry['area'] * scale ** 2  # mm²
+    walls = min(area * _setting('STORE_PRINT_WALL', DEFAULT_WALL), volume)
+    material = walls + (volume - walls) * _setting('STORE_PRINT_INFILL', DEFAULT_INFILL)
+    weight = material / 1000 * _setting('STORE_PRINT_DENSITY', DEFAULT_DENSITY)
+    hours = material / _setting('STORE_PRINT_FLOW_RATE', DEFAULT_FLOW_RATE) / 3600
+
+    price = (
+        _setting('STORE_PRINT_BASE_FEE', DEFAULT_BASE_FEE, Decimal)
+        + Decimal(weight / 1000) * _setting('STORE_PRINT_MATERIAL_PRICE', DEFAULT_MATERIAL_PRICE, Decimal)
+        + Decimal(hours) * _setting('STORE_PRINT_HOURLY_RATE', DEFAULT_HOURLY_RATE, Decimal)
+    )
+    return PrintQuote(
+        height=height,
+        scale=scale,
+        size=tuple(value * scale for value in geometry['size']),
+        volume=volume / 1000,
+        area=area / 100,
+        material=material / 1000,
+        weight=weight,
+        hours=hours,
+        price=price.quantize(CENT, rounding=ROUND_HALF_UP),
+    )
+
+
+def quote_product(product, height):
+    """:class:`PrintQuote` of ``product``'s print model at ``height`` mm"""
+    return quote(model_geometry(product), height)
+
+
+def is_custom_print(product, size):
+    """Whether ``size`` of ``product`` is printed, and priced, at a height the customer picks"""
+    return size is not None and size.size == CUSTOM_SIZE and bool(product.print_model)
+
+
+def custom_print_height(product, size, value):
+    """
+    The height (a Decimal, in mm) to keep on a cart line for ``value`` when
+    ``size`` is a custom print of ``product``, else None. Raises QuoteError
+    when the height is missing, out of range or the model cannot be quoted.
+    """
+    if not is_custom_print(product, size):
+        return None
+    try:
+        height = Decimal(str(value)).quantize(HEIGHT_STEP, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        lowest, highest = height_range()
+        raise QuoteError(f'Choose a height between {lowest:g} and {highest:g} mm')
+    quote_product(product, float(height))
+    return height
@@ -0,0 +1,112 @@
+"""
+Cached product card markup.
+
+``render_product_cards`` returns the rendered card of every product on a page,
+fetching all of them from ``STORE_CARD_CACHE`` with one ``get_many`` and
+rendering (and storing with one ``set_many``) only the misses.
+
+A card is keyed by the product id, ``updated_at`` and the row's other
+card-relevant state: whether it can be added to the cart, and a digest of the
+denormalized primary image columns. Saving a Product moves ``updated_at``;
+image and size changes rewrite those columns (store.product_columns), and
+sales change the stock. Every change that reaches the card therefore reaches
+its key, and the old entry is simply never read again (it expires after
+``STORE_CARD_CACHE_TIMEOUT``). ``invalidate_product_cards`` bumps a global
+version for changes outside the row, such as a template deploy.
+
+The CSRF token differs per session, so cards are rendered with a placeholder
+that is replaced on the way out. Hits and misses are counted in the cache;
+see the ``product_card_stats`` command.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .cache_versions import bump_version, get_version
+
+CARD_TEMPLATES = {
+    'grid': 'store/product_card.html',
+    'featured': 'store/featured_product_card.html',
+}
+DEFAULT_TIMEOUT = 24 * 60 * 60
+
+VERSION_KEY = 'store:cards:version'
+HITS_KEY = 'store:cards:hits'
+MISSES_KEY = 'store:cards:misses'
+CSRF_PLACEHOLDER = '__store_card_csrf_token__'
+
+
+def _cache():
+    return caches[getattr(settings, 'STORE_CARD_CACHE', 'default')]
+
+
+def _image_digest(product):
+    data = json.dumps([product.primary_image_path, product.primary_image_variants], sort_keys=True)
+    return hashlib.md5(data.encode()).hexdigest()[:10]
+
+
+def card_key(product, style, version):
+    """Cache key of ``product``'s card; changes whenever anything the card shows does"""
+    return (
+        f'store:card:{version}:{style}:{product.pk}:{product.updated_at.timestamp():.6f}:'
+        f'{int(product.available_stock > 0)}:{_image_digest(product)}'
+    )
+
+
+def _count(cache, key, amount):
+    if not amount:
+        return
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # First count, or the counter was evicted
+        if not cache.add(key, amount, timeout=None):
+            cache.incr(key, amount)
+
+
+def render_product_cards(request, products, style='grid'):
+    """The card HTML of each of ``products``, in order"""
+    products = list(products)
+    if not products:
+        return []
+    cache = _cache()
+    version = get_version(cache, VERSION_KEY)
+    keys = [card_key(product, style, version) for product in products]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    for product, key in zip(products, keys):
+        if key not in cached and key not in missing:
+            missing[key] = render_to_string(
+                CARD_TEMPLATES[style], {'product': product, 'csrf_token': CSRF_PLACEHOLDER}
+            )
+    if missing:
+        cache.set_many(missing, timeout=getattr(settings, 'STORE_CARD_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    _count(cache, HITS_KEY, len(products) - len(missing))
+    _count(cache, MISSES_KEY, len(missing))
+
+    token = get_token(request) if request is not None else ''
+    cards = []
+    for key in keys:
+        html = cached[key] if key in cached else missing[key]
+        cards.append(mark_safe(html.replace(CSRF_PLACEHOLDER, token)))
+    return cards
+
+
+def invalidate_product_cards():
+    """Drop every cached card (e.g. after the card templates changed)"""
+    bump_version(_cache(), VERSION_KEY)
+
+
+def card_cache_stats(reset=False):
+    """``(hits, misses)`` counted since the last reset"""
+    cache = _cache()
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    if reset:
+        cache.delete_many([HITS_KEY, MISSES_KEY])
+    return counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
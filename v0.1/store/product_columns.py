@@ -0,0 +1,103 @@
+"""
+Denormalized listing columns on Product.
+
+Product cards need the primary image, whether the product has sizes, and
+whether any size is in stock. Reading those from ProductImage and
+ProductSize costs a query (or a prefetch) per page, so Product keeps copies:
+``primary_image_path`` and ``primary_image_variants`` (the first image by
+``order``), ``has_sizes``, and ``size_stock`` (available units over all sizes).
+
+The columns are refreshed in the transaction that changes their source:
+image and size saves and deletes through signals, image reorders in the
+admin (saved without signals) through ProductImageAdmin, and new variants
+through store.images. Stock and reserved changes of a size (``inventory.record``)
+only rewrite the Product row when they move the product in or out of stock,
+so sales of a size do not also queue on its product's row: whether any size
+is available is always exact, the unit count in ``size_stock`` may lag.
+Writes that bypass those paths (raw SQL, QuerySet.update on images or sizes)
+leave drift too. The ``reconcile_product_columns`` command finds and repairs
+both; schedule it to keep the counts current.
+"""
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Greatest
+
+from .models import Product, ProductImage, ProductSize
+
+SIZE_FIELDS = ('has_sizes', 'size_stock')
+IMAGE_FIELDS = ('primary_image_path', 'primary_image_variants')
+
+
+def size_columns(product_ids):
+    """``{product_id: {'has_sizes': ..., 'size_stock': ...}}`` computed from the sizes"""
+    columns = {product_id: {'has_sizes': False, 'size_stock': 0} for product_id in product_ids}
+    rows = ProductSize.objects.filter(product_id__in=columns).values('product_id').annotate(
+        sizes=Count('id'), available=Sum(Greatest(F('stock') - F('reserved'), Value(0))),
+    ).order_by()
+    for row in rows:
+        columns[row['product_id']] = {'has_sizes': row['sizes'] > 0, 'size_stock': row['available'] or 0}
+    return columns
+
+
+def image_columns(product_ids):
+    """``{product_id: {'primary_image_path': ..., 'primary_image_variants': ...}}`` from the first images"""
+    columns = {product_id: {'primary_image_path': '', 'primary_image_variants': {}} for product_id in product_ids}
+    images = ProductImage.objects.filter(product_id__in=columns).order_by('product_id', 'order', 'id')
+    seen = set()
+    for product_id, image, variants in images.values_list('product_id', 'image', 'variants'):
+        if product_id not in seen:
+            seen.add(product_id)
+            columns[product_id] = {'primary_image_path': image or '', 'primary_image_variants': variants or {}}
+    return columns
+
+
+def _write(columns):
+    for product_id, values in columns.items():
+        Product.objects.filter(pk=product_id).update(**values)
+
+
+def refresh_size_columns(product_ids):
+    _write(size_columns(set(product_ids)))
+
+
+def refresh_size_availability(product_ids):
+    """Refresh the size columns of the products whose sizes went in or out of stock"""
+    expected = size_columns(set(product_ids))
+    stored = dict(Product.objects.filter(pk__in=expected).values_list('pk', 'size_stock'))
+    _write({
+        product_id: values for product_id, values in expected.items()
+        if (values['size_stock'] > 0) != (stored.get(product_id, 0) > 0)
+    })
+
+
+def refresh_image_columns(product_ids):
+    _write(image_columns(set(product_ids)))
+
+
+def find_column_drift(batch_size=1000):
+    """``{product_id: {field: (stored, expected)}}`` for every product whose columns disagree with their sources"""
+    drift = {}
+    fields = SIZE_FIELDS + IMAGE_FIELDS
+    last_id = 0
+    while True:
+        batch = list(Product.objects.filter(pk__gt=last_id).order_by('pk').values('pk', *fields)[:batch_size])
+        if not batch:
+            return drift
+        last_id = batch[-1]['pk']
+        ids = [row['pk'] for row in batch]
+        expected = size_columns(ids)
+        for product_id, values in image_columns(ids).items():
+            expected[product_id].update(values)
+        for row in batch:
+            wrong = {
+                field: (row[field], value) for field, value in expected[row['pk']].items() if row[field] != value
+            }
+            if wrong:
+                drift[row['pk']] = wrong
+
+
+def repair_column_drift(drift):
+    """Write the expected values reported by ``find_column_drift``"""
+    _write({
+        product_id: {field: expected for field, (_, expected) in fields.items()}
+        for product_id, fields in drift.items()
+    })
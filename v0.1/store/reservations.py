@@ -0,0 +1,156 @@
+"""
+Stock reservations (holds).
+
+``checkout`` holds the cart's units for ``STORE_RESERVATION_TTL`` seconds so
+that customers who reach the payment form cannot be outsold by others still
+browsing. Every hold is a StockReservation row, and the held units are also
+kept in the ``reserved`` counter of the Product or ProductSize row, so the
+available stock is ``stock - reserved`` without summing reservations.
+
+``place_order`` claims the customer's holds and turns them into sales in the
+same guarded update that takes the stock. Holds that expire are returned by
+``release_expired`` (the ``release_expired_reservations`` command) in batches.
+Holds and releases are recorded in the inventory ledger (store.inventory).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .inventory import RELEASE, RESERVATION, movement, record, sku_queryset
+from .models import Product, ProductSize, StockReservation
+
+DEFAULT_TTL = 15 * 60
+DEFAULT_BATCH_SIZE = 500
+
+
+def hold_ttl():
+    return timedelta(seconds=getattr(settings, 'STORE_RESERVATION_TTL', DEFAULT_TTL))
+
+
+def _lock_order(key):
+    # Same order as checkout._lock_order: sizes first, by id, then products
+    product_id, size_id = key
+    return (size_id or 0, product_id)
+
+
+def _quantities(reservations):
+    """Total held units per (product_id, size_id)"""
+    held = {}
+    for reservation in reservations:
+        key = (reservation.product_id, reservation.size_id)
+        held[key] = held.get(key, 0) + reservation.quantity
+    return held
+
+
+def _unreserve(held, note):
+    for key in sorted(held, key=_lock_order):
+        sku_queryset(*key).update(reserved=Greatest(F('reserved') - held[key], 0))
+    record([movement(RELEASE, *key, -units, note=note) for key, units in held.items()])
+
+
+def _take_rows(reservations):
+    """
+    Delete the reservations matched by a queryset and return them. The no-op
+    UPDATE write-locks the rows before they are read (row locks on PostgreSQL,
+    the database lock on SQLite, where reading first and then writing fails
+    with "database is locked" under concurrency instead of waiting), so a row
+    is only ever released by the transaction that deleted it.
+    """
+    if not reservations.update(expires_at=F('expires_at')):
+        return []
+    taken = list(reservations)
+    StockReservation.objects.filter(pk__in=[reservation.pk for reservation in taken]).delete()
+    return taken
+
+
+def reserve_cart(user, cart_items):
+    """
+    Replace the user's holds with holds for ``cart_items`` and return the
+    expiry time. Raises checkout.OutOfStock, holding nothing, when a line
+    exceeds the stock that is not already held by someone else.
+    """
+    from .checkout import OutOfStock
+
+    expires_at = timezone.now() + hold_ttl()
+    with transaction.atomic():
+        _unreserve(_quantities(_take_rows(StockReservation.objects.filter(user=user))), 'Checkout restarted')
+        reservations = []
+        for item in sorted(cart_items, key=lambda item: _lock_order((item.product_id, item.size_id))):
+            updated = sku_queryset(item.product_id, item.size_id).filter(
+                stock__gte=F('reserved') + item.quantity
+            ).update(reserved=F('reserved') + item.quantity)
+            if not updated:
+                raise OutOfStock(item)
+            reservations.append(StockReservation(
+                user=user, product_id=item.product_id, size_id=item.size_id,
+                quantity=item.quantity, expires_at=expires_at
+            ))
+        StockReservation.objects.bulk_create(reservations)
+        record([
+            movement(RESERVATION, reservation.product_id, reservation.size_id, reservation.quantity, note='Checkout')
+            for reservation in reservations
+        ])
+    return expires_at
+
+
+def claim_holds(user):
+    """
+    Remove the user's holds and return ``{(product_id, size_id): units}``.
+    Must run inside the transaction that then takes the stock; the caller is
+    responsible for lowering ``reserved`` (see checkout.take_stock) and for
+    recording the release.
+    """
+    return _quantities(_take_rows(StockReservation.objects.filter(user=user)))
+
+
+def release_holds(user):
+    """Give back every unit held for ``user``"""
+    with transaction.atomic():
+        _unreserve(_quantities(_take_rows(StockReservation.objects.filter(user=user))), 'Released')
+
+
+def release_unclaimed(held):
+    """Lower ``reserved`` for claimed holds that did not become a sale"""
+    _unreserve(held, 'Not in the order')
+
+
+def release_expired(batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """Release expired holds ``batch_size`` rows per transaction; returns the number released"""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        expired = StockReservation.objects.filter(expires_at__lte=now)
+        ids = list(expired.order_by('expires_at', 'id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return released
+        with transaction.atomic():
+            # Rows claimed by a payment in the meantime are no longer matched
+            batch = _take_rows(expired.filter(pk__in=ids))
+            _unreserve(_quantities(batch), 'Expired')
+        released += len(batch)
+
+
+def recount_reserved():
+    """Rebuild every ``reserved`` counter from the reservation rows; returns the number of counters fixed"""
+    with transaction.atomic():
+        held = _quantities(StockReservation.objects.only('product_id', 'size_id', 'quantity'))
+        counted = {(pk, None): reserved for pk, reserved in Product.objects.exclude(reserved=0).values_list('pk', 'reserved')}
+        counted.update({
+            (product_id, pk): reserved
+            for pk, product_id, reserved in ProductSize.objects.exclude(reserved=0).values_list('pk', 'product_id', 'reserved')
+        })
+        corrections = {}
+        for key in held.keys() | counted.keys():
+            difference = held.get(key, 0) - counted.get(key, 0)
+            if difference:
+                sku_queryset(*key).update(reserved=held.get(key, 0))
+                corrections[key] = difference
+        record([
+            movement(RESERVATION if difference > 0 else RELEASE, *key, difference, note='Recount')
+            for key, difference in corrections.items()
+        ])
+    return len(corrections)
@@ -0,0 +1,382 @@
+"""
+Ranked full-text product search with pluggable backends.
+
+``STORE_SEARCH_BACKEND`` selects the backend: ``auto`` (default) uses the
+SQLite FTS5 index when it exists, PostgreSQL full-text search on PostgreSQL
+and the in-process inverted index otherwise. ``sqlite``, ``postgres``,
+``python`` or a dotted path to a ``BaseSearchBackend`` subclass force a
+specific backend. The indexes are kept current by the Product signals in
+``store.signals``; on PostgreSQL the database maintains the stored document
+itself. The ``benchmark_search`` command times the backends.
+"""
+import abc
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Case, FloatField, IntegerField, When
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .cache_versions import bump_version, get_version
+
+FTS_TABLE = 'store_product_fts'
+
+# Stored, weighted tsvector column on PostgreSQL (migration 0018) and the
+# text search configuration used for both the documents and the queries
+PG_DOCUMENT_COLUMN = 'search_document'
+PG_CONFIG = 'english'
+
+DEFAULT_MAX_RESULTS = 1000
+VERSION_KEY = 'store:search:version'
+# Products saved this long before the last sync are indexed again, so a
+# transaction that committed late is never missed
+SYNC_OVERLAP = timedelta(minutes=1)
+
+# Relative weight of each indexed Product field
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'short_description': 2.0,
+    'description': 1.0,
+}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class BaseSearchBackend(abc.ABC):
+    """Interface shared by all search backends"""
+
+    @abc.abstractmethod
+    def filter_queryset(self, queryset, query):
+        """Restrict a Product queryset to matches for ``query``, ordered by relevance"""
+
+    def count_matches(self, query):
+        """Number of products matching ``query`` when ``filter_queryset`` may return fewer, else None"""
+        return None
+
+    def search(self, query, limit=20, offset=0):
+        """Return one page of ``(product_id, score)`` pairs, best match first"""
+        from .models import Product
+
+        products = self.filter_queryset(Product.objects.all(), query)
+        ids = products.values_list('id', flat=True)[offset:offset + limit]
+        return [(product_id, None) for product_id in ids]
+
+    def index_product(self, product):
+        pass
+
+    def remove_product(self, product_id):
+        pass
+
+    def rebuild(self):
+        """Rebuild the whole index from the Product table; returns the number of indexed products"""
+        return 0
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """SQLite FTS5 virtual table ranked with the built-in bm25() function"""
+
+    rank_sql = 'bm25({table}, {weights})'.format(
+        table=FTS_TABLE, weights=', '.join(str(w) for w in FIELD_WEIGHTS.values())
+    )
+
+    @staticmethod
+    def match_expression(query):
+        # Quote every token so user input can never be parsed as FTS5 syntax
+        return ' '.join('"%s"' % token for token in tokenize(query))
+
+    def filter_queryset(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        meta = queryset.model._meta
+        product_id = '{}.{}'.format(connection.ops.quote_name(meta.db_table), connection.ops.quote_name(meta.pk.column))
+        # bm25() only works in a MATCH query of its own table, so each rank is a correlated subquery
+        rank = RawSQL(
+            f'SELECT {self.rank_sql} FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {product_id}',
+            [match], output_field=FloatField(),
+        )
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('search_rank', 'pk')
+
+    def search(self, query, limit=20, offset=0):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, {self.rank_sql} AS rank FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s OFFSET %s',
+                [match, limit, offset],
+            )
+            # bm25() returns negative numbers where lower is better
+            return [(product_id, -rank) for product_id, rank in cursor.fetchall()]
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, short_description, description) '
+                f'VALUES (%s, %s, %s, %s)',
+                [product.pk, product.name, product.short_description, product.description],
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+    def rebuild(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, short_description, description) '
+                f'SELECT id, name, short_description, description FROM store_product'
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+            return cursor.fetchone()[0]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL full-text search over the stored ``search_document`` column: a
+    generated tsvector of the name, short description and description
+    weighted A, B and C, with a GIN index (migration 0018). Documents and
+    queries share the PG_CONFIG text search configuration, so both are
+    stemmed alike. Ranked with ts_rank.
+    """
+
+    def filter_queryset(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+
+        if not tokenize(query):
+            return queryset.none()
+        table = connection.ops.quote_name(queryset.model._meta.db_table)
+        document = RawSQL(f'{table}.{connection.ops.quote_name(PG_DOCUMENT_COLUMN)}', [],
+                          output_field=SearchVectorField())
+        search_query = SearchQuery(query, search_type='websearch', config=PG_CONFIG)
+        return queryset.alias(search_document=document).annotate(
+            search_rank=SearchRank(document, search_query),
+        ).filter(search_document=search_query).order_by('-search_rank', 'id')
+
+
+class PythonSearchBackend(BaseSearchBackend):
+    """
+    In-process inverted index scored with BM25F, for databases without a
+    full-text engine. The index is per process and built on first use.
+
+    Product saves and deletes update the index of the process that made them
+    and bump a version in ``STORE_SEARCH_CACHE``; the other processes see the
+    new version on their next search and re-index the products saved since
+    their last sync, and drop deleted ones. ``filter_queryset`` keeps the
+    ``STORE_SEARCH_MAX_RESULTS`` best matches; ``count_matches`` tells how
+    many there were in all.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None  # term -> {product_id: weighted term frequency}
+        self._lengths = {}     # product_id -> weighted document length
+        self._terms = {}       # product_id -> terms, to drop stale postings on update
+        self._total_length = 0.0
+        self._version = None
+        self._synced_at = None
+
+    @property
+    def max_results(self):
+        return getattr(settings, 'STORE_SEARCH_MAX_RESULTS', DEFAULT_MAX_RESULTS)
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, 'STORE_SEARCH_CACHE', 'default')]
+
+    def _ensure_index(self):
+        if self._postings is None:
+            self.rebuild()
+            return
+        if self._synced_at is None:
+            # Built from given rows (build()), not from the database
+            return
+        version = get_version(self._cache(), VERSION_KEY)
+        if version != self._version:
+            self._sync(version)
+
+    def _sync(self, version):
+        """Re-index the products saved since the last sync and drop deleted ones"""
+        from .models import Product
+
+        started = timezone.now()
+        rows = list(Product.objects.filter(updated_at__gte=self._synced_at - SYNC_OVERLAP).values('id', *FIELD_WEIGHTS))
+        existing = set(Product.objects.values_list('id', flat=True))
+        with self._lock:
+            for row in rows:
+                self._discard(row['id'])
+                self._add(row['id'], row)
+            for product_id in set(self._lengths) - existing:
+                self._discard(product_id)
+            self._version, self._synced_at = version, started
+
+    def _changed(self):
+        """Tell the other processes; this one is already current unless others changed too"""
+        version = bump_version(self._cache(), VERSION_KEY)
+        with self._lock:
+            if self._version == version - 1:
+                self._version = version
+
+    def _add(self, product_id, fields):
+        frequencies = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(field)):
+                frequencies[token] += weight
+        for term, frequency in frequencies.items():
+            self._postings.setdefault(term, {})[product_id] = frequency
+        self._lengths[product_id] = sum(frequencies.values())
+        self._total_length += self._lengths[product_id]
+        self._terms[product_id] = tuple(frequencies)
+
+    def _discard(self, product_id):
+        for term in self._terms.pop(product_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(product_id, 0.0)
+
+    def build(self, rows):
+        """
+        Replace the index with ``rows`` (dicts of ``id`` and the FIELD_WEIGHTS
+        fields); rebuild() indexes the products table this way
+        """
+        with self._lock:
+            self._synced_at = None
+            self._postings, self._lengths, self._terms = {}, {}, {}
+            self._total_length = 0.0
+            for row in rows:
+                self._add(row['id'], row)
+            return len(self._lengths)
+
+    def rebuild(self):
+        from .models import Product
+
+        version = get_version(self._cache(), VERSION_KEY)
+        started = timezone.now()
+        indexed = self.build(Product.objects.values('id', *FIELD_WEIGHTS).iterator())
+        self._version, self._synced_at = version, started
+        return indexed
+
+    def index_product(self, product):
+        fields = {field: getattr(product, field) for field in FIELD_WEIGHTS}
+
+        def apply():
+            if self._postings is not None:
+                with self._lock:
+                    self._discard(product.pk)
+                    self._add(product.pk, fields)
+            self._changed()
+
+        transaction.on_commit(apply)
+
+    def remove_product(self, product_id):
+        def apply():
+            if self._postings is not None:
+                with self._lock:
+                    self._discard(product_id)
+            self._changed()
+
+        transaction.on_commit(apply)
+
+    def count_matches(self, query):
+        self._ensure_index()
+        terms = set(tokenize(query))
+        if not terms:
+            return 0
+        with self._lock:
+            postings = sorted((self._postings.get(term, {}) for term in terms), key=len)
+            return len(set(postings[0]).intersection(*postings[1:]))
+
+    def ranked(self, query, limit=None):
+        """Matching product ids with their BM25F scores, best first (at most ``limit``)"""
+        self._ensure_index()
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            postings = [self._postings.get(term, {}) for term in terms]
+            if not all(postings):
+                return []
+            total = len(self._lengths)
+            average_length = self._total_length / total
+            # Every term must match: start from the rarest posting list
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            scores = {}
+            for posting in postings:
+                idf = math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+                for product_id in candidates:
+                    frequency = posting[product_id]
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[product_id] / average_length)
+                    scores[product_id] = scores.get(product_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        key = lambda item: (-item[1], item[0])
+        if limit is not None and limit < len(scores):
+            return heapq.nsmallest(limit, scores.items(), key=key)
+        return sorted(scores.items(), key=key)
+
+    def search(self, query, limit=20, offset=0):
+        return self.ranked(query, limit=offset + limit)[offset:]
+
+    def filter_queryset(self, queryset, query):
+        ids = [product_id for product_id, score in self.ranked(query, limit=self.max_results)]
+        if not ids:
+            return queryset.none()
+        return queryset.filter(id__in=ids).annotate(
+            search_rank=Case(
+                *[When(id=product_id, then=position) for position, product_id in enumerate(ids)],
+                output_field=IntegerField(),
+            )
+        ).order_by('search_rank')
+
+
+BACKENDS = {
+    'sqlite': 'store.search.SQLiteFTSBackend',
+    'postgres': 'store.search.PostgresSearchBackend',
+    'python': 'store.search.PythonSearchBackend',
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _auto_backend_path():
+    if connection.vendor == 'postgresql':
+        return BACKENDS['postgres']
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        return BACKENDS['sqlite']
+    return BACKENDS['python']
+
+
+def get_search_backend():
+    """Return the configured search backend, created once per process"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = getattr(settings, 'STORE_SEARCH_BACKEND', 'auto')
+                path = _auto_backend_path() if name == 'auto' else BACKENDS.get(name, name)
+                _backend = import_string(path)()
+    return _backend
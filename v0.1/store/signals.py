@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cart_summary import invalidate_cart_summary
+from .category_tree import invalidate_category_tree
+from .images import schedule_variants, variant_names
+from .models import Cart, CartItem, Category, Product, ProductImage, ProductSize
+from .print_quotes import warm_geometry
+from .product_columns import refresh_image_columns, refresh_size_columns
+from .search import get_search_backend
+from .suggest import invalidate_suggestion_index
+
+
+def invalidate_carts_with(cart_items):
+    """Refresh the cached summary of every cart containing one of ``cart_items``"""
+    for user_id in cart_items.values_list('cart__user_id', flat=True).distinct():
+        invalidate_cart_summary(user_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Wait for the commit so other workers never rebuild from uncommitted data
+    transaction.on_commit(invalidate_category_tree)
+    transaction.on_commit(invalidate_suggestion_index)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    get_search_backend().index_product(instance)
+    # Stock edits and column refreshes leave the suggestions as they are
+    label = instance.suggestion_label
+    if created or label != getattr(instance, '_loaded_label', None):
+        transaction.on_commit(invalidate_suggestion_index)
+    instance._loaded_label = label
+    # The price may have changed: refresh the subtotal of every cart holding the product
+    invalidate_carts_with(CartItem.objects.filter(product=instance))
+    # Measure a new print model now rather than in its first quote
+    if instance.print_model_hash:
+        transaction.on_commit(lambda: warm_geometry(instance))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    get_search_backend().remove_product(instance.pk)
+    transaction.on_commit(invalidate_suggestion_index)
+
+
+@receiver(post_save, sender=ProductSize)
+def product_size_saved(sender, instance, **kwargs):
+    refresh_size_columns([instance.product_id])
+    invalidate_carts_with(CartItem.objects.filter(size=instance))
+
+
+@receiver(post_delete, sender=ProductSize)
+def product_size_deleted(sender, instance, **kwargs):
+    refresh_size_columns([instance.product_id])
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed(sender, instance, **kwargs):
+    if CartItem.cart.is_cached(instance):
+        user_id = instance.cart.user_id
+    else:
+        user_id = Cart.objects.filter(pk=instance.cart_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        invalidate_cart_summary(user_id)
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    invalidate_cart_summary(instance.user_id)
+
+
+@receiver(post_save, sender=ProductImage)
+def product_image_saved(sender, instance, **kwargs):
+    refresh_image_columns([instance.product_id])
+    # Unchanged uploads are skipped by their content hash
+    if instance.image:
+        transaction.on_commit(lambda: schedule_variants(instance))
+
+
+@receiver(post_delete, sender=ProductImage)
+def product_image_deleted(sender, instance, **kwargs):
+    refresh_image_columns([instance.product_id])
+    storage = instance.image.storage
+    names = variant_names(instance.variants)
+
+    def delete_variants():
+        for name in names:
+            storage.delete(name)
+
+    transaction.on_commit(delete_variants)
@@ -0,0 +1,176 @@
+"""
+In-memory prefix index behind the search-as-you-type endpoint.
+
+Every word of every product and category name is stored in one sorted array,
+so the suggestions for a prefix are a bisect plus a short scan, with no
+database access. Entries are ranked by popularity (units sold for products,
+summed over their products for categories). The index holds at most
+``STORE_SUGGEST_MAX_ENTRIES`` of the most popular entries.
+
+The Product and Category signals bump the version in ``STORE_SUGGEST_CACHE``
+when a name or slug changes, or a product or category is added or removed.
+A worker that sees a new version keeps answering from its current index
+while a background thread rebuilds it; only a worker with no index at all
+builds one in the request. Popularity is refreshed by these rebuilds, not
+by every sale.
+"""
+import heapq
+import logging
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+
+from .cache_versions import bump_version, get_version
+from .search import tokenize
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'store:suggest:version'
+DEFAULT_MAX_ENTRIES = 50000
+# Prefixes this short match a large part of the index, so their results are precomputed
+PRECOMPUTED_PREFIX_LENGTH = 2
+MAX_LIMIT = 20
+
+PRODUCT = 'product'
+CATEGORY = 'category'
+
+_local = {'version': None, 'index': None, 'rebuilding': False}
+_lock = threading.Lock()
+
+
+class SuggestionIndex:
+    """Immutable sorted-array prefix index over (label, slug, kind, popularity, words) entries"""
+
+    def __init__(self, entries, top_k=MAX_LIMIT):
+        self.entries = tuple(entries)
+        postings = sorted(
+            (word, -entry[3], position)
+            for position, entry in enumerate(self.entries)
+            for word in set(entry[4])
+        )
+        self.words = [word for word, _, _ in postings]
+        self.positions = [position for _, _, position in postings]
+        self.top_k = top_k
+        self.precomputed = {}
+        for prefix in {word[:n] for word in self.words for n in range(1, PRECOMPUTED_PREFIX_LENGTH + 1)}:
+            self.precomputed[prefix] = self._scan(prefix, top_k)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _scan(self, prefix, limit, required=()):
+        start = bisect_left(self.words, prefix)
+        candidates = set()
+        for index in range(start, len(self.words)):
+            if not self.words[index].startswith(prefix):
+                break
+            position = self.positions[index]
+            if all(any(word.startswith(token) for word in self.entries[position][4]) for token in required):
+                candidates.add(position)
+        return heapq.nsmallest(limit, candidates, key=lambda position: (-self.entries[position][3], position))
+
+    def lookup(self, query, limit=8):
+        """Return up to ``limit`` entries matching every word prefix of ``query``, most popular first"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        limit = min(limit, self.top_k)
+        *required, prefix = tokens
+        if not required and prefix in self.precomputed:
+            positions = self.precomputed[prefix][:limit]
+        else:
+            positions = self._scan(prefix, limit, required)
+        return [self.entries[position] for position in positions]
+
+
+def build_suggestion_index():
+    """Load product names, sales and the category tree into a new index"""
+    from .category_tree import get_category_tree
+    from .models import Product
+
+    max_entries = getattr(settings, 'STORE_SUGGEST_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+    products = (
+        Product.objects.annotate(popularity=Coalesce(Sum('orderitem__quantity'), 0))
+        .order_by('-popularity', '-featured', 'name')
+        .values_list('name', 'slug', 'category_id', 'popularity')[:max_entries]
+    )
+    entries = []
+    category_popularity = {}
+    for name, slug, category_id, popularity in products:
+        entries.append((name, slug, PRODUCT, popularity, tuple(tokenize(name))))
+        category_popularity[category_id] = category_popularity.get(category_id, 0) + popularity
+
+    for node in get_category_tree().nodes.values():
+        # Categories rank just above their best sellers
+        popularity = category_popularity.get(node.id, 0) + 1
+        entries.append((node.name, node.slug, CATEGORY, popularity, tuple(tokenize(node.name))))
+
+    entries.sort(key=lambda entry: -entry[3])
+    return SuggestionIndex(entries[:max_entries])
+
+
+def _cache():
+    return caches[getattr(settings, 'STORE_SUGGEST_CACHE', 'default')]
+
+
+def _rebuild(version):
+    try:
+        index = build_suggestion_index()
+    except DatabaseError:
+        logger.warning('Could not rebuild the search suggestion index', exc_info=True)
+        index = None
+    finally:
+        # The thread's own connection
+        connection.close()
+    with _lock:
+        if index is not None:
+            _local['index'] = index
+            _local['version'] = version
+        _local['rebuilding'] = False
+
+
+def get_suggestion_index():
+    """
+    Return this process's index. When another process or a signal bumped the
+    version, the current index is returned while a thread rebuilds it.
+    """
+    version = get_version(_cache(), VERSION_KEY)
+    index = _local['index']
+    if index is not None and _local['version'] == version:
+        return index
+    with _lock:
+        if _local['index'] is None:
+            _local['index'] = build_suggestion_index()
+            _local['version'] = version
+        elif _local['version'] != version and not _local['rebuilding']:
+            _local['rebuilding'] = True
+            threading.Thread(target=_rebuild, args=(version,), name='suggest-rebuild', daemon=True).start()
+        return _local['index']
+
+
+def invalidate_suggestion_index():
+    bump_version(_cache(), VERSION_KEY)
+
+
+def warm_suggestion_index():
+    """Build the index when a worker starts so the first keystroke is fast"""
+    try:
+        get_suggestion_index()
+    except DatabaseError:
+        # e.g. migrations have not been applied yet; the index is built on first use instead
+        logger.warning('Could not build the search suggestion index at startup', exc_info=True)
+
+
+def suggest(query, limit=8):
+    """Return JSON-ready suggestions for ``query``"""
+    suggestions = []
+    for label, slug, kind, popularity, words in get_suggestion_index().lookup(query, limit):
+        view = 'store:product_detail' if kind == PRODUCT else 'store:category_detail'
+        suggestions.append({'label': label, 'type': kind, 'url': reverse(view, args=[slug])})
+    return suggestions
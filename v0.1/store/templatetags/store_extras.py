@@ -1,4 +1,6 @@
 from django import template
+from django.utils.html import format_html, format_html_join
+from store.product_cards import render_product_cards
 from decimal import Decimal
 
 register = template.Library()
@@ -14,4 +16,72 @@ def sub(value, arg):
 @register.filter
 def get_item(dictionary, key):
     """Gets an item from a dictionary using key."""
-    return dictionary.get(key, []) 
\ No newline at end of file
+    return dictionary.get(key, []) 
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor):
+    """Current URL's query string with the pagination cursor replaced."""
+    params = context['request'].GET.copy()
+    params['cursor'] = cursor
+    return '?' + params.urlencode()
+
+
+@register.simple_tag(takes_context=True)
+def facet_url(context, param, value, multiple=True):
+    """Current URL's query string with a facet value toggled and the cursor reset."""
+    params = context['request'].GET.copy()
+    params.pop('cursor', None)
+    values = params.getlist(param)
+    if value in values:
+        values.remove(value)
+    elif multiple:
+        values.append(value)
+    else:
+        values = [value]
+    params.setlist(param, values)
+    return '?' + params.urlencode()
+
+
+@register.simple_tag(takes_context=True)
+def facet_clear_url(context, *params_to_clear):
+    """Current URL's query string without the given facet parameters."""
+    params = context['request'].GET.copy()
+    for param in params_to_clear + ('cursor',):
+        params.pop(param, None)
+    return '?' + params.urlencode()
+
+
+@register.simple_tag
+def image_srcset(image, fmt='jpeg'):
+    """``srcset`` value listing a ProductImage's variants in ``fmt``."""
+    return image.srcset(fmt) if image else ''
+
+
+@register.simple_tag
+def variant_url(image, width, fmt='jpeg'):
+    """URL of a ProductImage's narrowest variant at least ``width`` pixels wide."""
+    return image.url_for_width(width, fmt) if image else ''
+
+
+@register.simple_tag
+def responsive_image(image, alt='', css_class='', sizes='100vw', **attrs):
+    """
+    ``<picture>`` for a ProductImage: WebP and JPEG ``srcset``s of its
+    variants, falling back to the original upload when it has none yet.
+    Extra keyword arguments become attributes of the ``<img>``.
+    """
+    attrs.setdefault('loading', 'lazy')
+    extra = format_html_join('', ' {}="{}"', attrs.items())
+    if not image.variants:
+        return format_html('<img src="{}" class="{}" alt="{}"{}>', image.image.url, css_class, alt, extra)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}"{}></picture>',
+        image.srcset('webp'), sizes, image.url_for_width(640), image.srcset('jpeg'), sizes, css_class, alt, extra,
+    )
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products, style='grid'):
+    """Rendered cards of ``products``, served from the card cache where possible."""
+    return render_product_cards(context.get('request'), products, style)
@@ -1,3 +1,310 @@
-from django.test import TestCase
+import threading
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from .checkout import OutOfStock, place_order
+from .inventory import find_drift
+from .mesh_builder import sphere, torus
+from .mesh_format import HEADER, decode_mesh, encode_mesh
+from .models import Cart, CartItem, Category, Order, OrderItem, OrderNumberSequence, Product, ProductSize
+from .order_numbers import BaseOrderNumberGenerator, BlockOrderNumberGenerator
+from .pagination import KeysetPaginator
+from .pricing import CartPricer
+from .reservations import reserve_cart
+from .search import BaseSearchBackend, PythonSearchBackend, SQLiteFTSBackend, get_search_backend
+
+User = get_user_model()
+
+SHIPPING = {
+    'first_name': 'Test', 'last_name': 'Buyer', 'email': 'buyer@example.com',
+    'address': '1 Test St', 'city': 'Test', 'state': 'TS', 'zip_code': '00000', 'phone': '0000000000',
+}
+
+
+def run_threads(target, count):
+    """Run ``target`` in ``count`` threads at once, each closing its own connection"""
+    barrier = threading.Barrier(count)
+
+    def run():
+        try:
+            barrier.wait()
+            target()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Many customers checking out the last units of one SKU at the same time"""
+
+    STOCK = 5
+    BUYERS = 12
+
+    def setUp(self):
+        category = Category.objects.create(name='Prints', slug='prints')
+        self.product = Product.objects.create(category=category, name='Vase', slug='vase', price=Decimal('10.00'),
+                                              stock=self.STOCK)
+        self.size = ProductSize.objects.create(product=self.product, size='large', stock=self.STOCK)
+        self.users = [User.objects.create_user(f'buyer{n}', f'buyer{n}@example.com') for n in range(self.BUYERS)]
+
+    def checkout_concurrently(self, size=None, reserve=False):
+        for user in self.users:
+            CartItem.objects.create(cart=Cart.objects.create(user=user), product=self.product, size=size, quantity=1)
+        outcomes = []
+        lock = threading.Lock()
+        pending = list(self.users)
+
+        def buy():
+            with lock:
+                user = pending.pop()
+            pricing = CartPricer(user).price()
+            try:
+                if reserve:
+                    reserve_cart(user, pricing.items)
+                place_order(user, pricing.items, SHIPPING, 'card', pricing.order_totals())
+                outcome = 'sold'
+            except OutOfStock:
+                outcome = 'out of stock'
+            except Exception as error:
+                outcome = repr(error)
+            with lock:
+                outcomes.append(outcome)
+
+        run_threads(buy, self.BUYERS)
+        return outcomes
+
+    def assert_consistent(self, sku, outcomes):
+        sku.refresh_from_db()
+        sold = outcomes.count('sold')
+        units = sum(OrderItem.objects.values_list('quantity', flat=True))
+        self.assertEqual(sorted(set(outcomes)), ['out of stock', 'sold'])
+        self.assertEqual(sold, self.STOCK)
+        self.assertEqual(Order.objects.count(), sold)
+        self.assertEqual(units, sold)
+        self.assertEqual(sku.stock, self.STOCK - sold)
+        self.assertEqual(sku.reserved, 0)
+        self.assertEqual(find_drift(), {})
+
+    def test_product_is_never_oversold(self):
+        self.assert_consistent(self.product, self.checkout_concurrently())
+
+    def test_size_is_never_oversold(self):
+        self.assert_consistent(self.size, self.checkout_concurrently(size=self.size))
+
+    def test_reserved_checkouts_are_never_oversold(self):
+        self.assert_consistent(self.product, self.checkout_concurrently(reserve=True))
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Prints', slug='prints')
+        # Repeated prices, so the id tie breaker decides within them
+        Product.objects.bulk_create([
+            Product(category=category, name=f'Print {n:02d}', slug=f'print-{n}', price=Decimal(10 + n % 4))
+            for n in range(30)
+        ])
+
+    def walk(self, paginator, cursor=None, direction='next'):
+        """Every page from ``cursor`` on in one direction, as lists of ids"""
+        pages = []
+        while True:
+            page = paginator.page(cursor)
+            pages.append([product.id for product in page])
+            cursor = page.next_cursor if direction == 'next' else page.previous_cursor
+            if cursor is None:
+                return pages, page
+
+    def test_pages_cover_the_ordering_once(self):
+        for ordering in (('name',), ('price',), ('-price',), None):
+            with self.subTest(ordering=ordering):
+                queryset = Product.objects.order_by('-price', 'id') if ordering is None else Product.objects.all()
+                paginator = KeysetPaginator(queryset, ordering, per_page=7)
+                pages, _ = self.walk(paginator)
+                if ordering is not None:
+                    queryset = queryset.order_by(*paginator._order_by(reverse=False))
+                expected = list(queryset.values_list('id', flat=True))
+                self.assertEqual([len(page) for page in pages], [7, 7, 7, 7, 2])
+                self.assertEqual(sum(pages, []), expected)
+
+    def test_previous_cursors_walk_back_over_the_same_pages(self):
+        paginator = KeysetPaginator(Product.objects.all(), ('price',), per_page=5)
+        forward, last = self.walk(paginator)
+        backward, first = self.walk(paginator, last.previous_cursor, direction='previous')
+        self.assertEqual(backward, forward[-2::-1])
+        self.assertFalse(first.has_previous)
+
+    def test_cursor_for_another_ordering_starts_over(self):
+        by_name = KeysetPaginator(Product.objects.all(), ('name',), per_page=5)
+        by_price = KeysetPaginator(Product.objects.all(), ('price',), per_page=5)
+        cursor = by_name.page().next_cursor
+        self.assertEqual([p.id for p in by_price.page(cursor)], [p.id for p in by_price.page()])
+
+    def test_tampered_or_malformed_cursor_starts_over(self):
+        paginator = KeysetPaginator(Product.objects.all(), ('price',), per_page=5)
+        first = [p.id for p in paginator.page()]
+        cursor = paginator.page().next_cursor
+        for bad in (cursor[:-2] + 'xx', 'garbage', KeysetPaginator.encode_cursor(['not', 'a', 'dict']),
+                    paginator._cursor({'v': ['not a price', 'x'], 'd': 'n'})):
+            with self.subTest(cursor=bad):
+                self.assertEqual([p.id for p in paginator.page(bad)], first)
+
+    def test_listing_view_ignores_a_cursor_from_another_sort(self):
+        response = self.client.get('/products/', {'sort': 'name'})
+        cursor = response.context['products'].next_cursor
+        response = self.client.get('/products/', {'sort': 'price_low', 'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['products'].has_previous)
+
+
+class SearchBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Prints', slug='prints')
+        product = lambda name, slug, description: Product.objects.create(
+            category=category, name=name, slug=slug, price=Decimal('10'), description=description,
+        )
+        cls.dragon = product('Red Dragon', 'red-dragon', 'A dragon miniature with wings.')
+        cls.egg = product('Egg Stand', 'egg-stand', 'Holds a dragon egg.')
+        cls.vase = product('Blue Vase', 'blue-vase', 'A twisted vase.')
+
+    def ids(self, queryset):
+        return [product.id for product in queryset]
+
+    def test_python_backend_ranks_name_matches_first(self):
+        backend = PythonSearchBackend()
+        self.assertEqual(backend.build(Product.objects.values('id', 'name', 'short_description', 'description')), 3)
+        self.assertEqual([pk for pk, _ in backend.ranked('Dragon')], [self.dragon.id, self.egg.id])
+        self.assertEqual([pk for pk, _ in backend.ranked('dragon egg')], [self.egg.id])
+        self.assertEqual(backend.ranked('dragon unicorn'), [])
+        self.assertEqual(backend.ranked('  '), [])
+        self.assertEqual(backend.count_matches('dragon'), 2)
+        self.assertEqual(self.ids(backend.filter_queryset(Product.objects.all(), 'dragon')), [self.dragon.id, self.egg.id])
+
+    def test_python_backend_counts_matches_beyond_the_result_cap(self):
+        backend = PythonSearchBackend()
+        backend.build(Product.objects.values('id', 'name', 'short_description', 'description'))
+        with override_settings(STORE_SEARCH_MAX_RESULTS=1):
+            self.assertEqual(self.ids(backend.filter_queryset(Product.objects.all(), 'dragon')), [self.dragon.id])
+            self.assertEqual(backend.count_matches('dragon'), 2)
+
+    def test_sqlite_backend_ranks_with_bm25(self):
+        backend = SQLiteFTSBackend()
+        products = Product.objects.exclude(id=self.egg.id)
+        self.assertEqual(self.ids(backend.filter_queryset(Product.objects.all(), 'dragon')), [self.dragon.id, self.egg.id])
+        self.assertEqual(self.ids(backend.filter_queryset(products, 'dragon')), [self.dragon.id])
+        self.assertEqual([pk for pk, _ in backend.search('dragon')], [self.dragon.id, self.egg.id])
+
+    def test_sqlite_backend_treats_fts_syntax_as_words(self):
+        backend = SQLiteFTSBackend()
+        for query in ('dragon"', 'dragon OR vase', 'NEAR(dragon', '*', ''):
+            with self.subTest(query=query):
+                list(backend.filter_queryset(Product.objects.all(), query))
+        self.assertEqual(self.ids(backend.filter_queryset(Product.objects.all(), 'vase"')), [self.vase.id])
+
+    def test_manager_search_follows_saves_and_deletes(self):
+        self.assertIsInstance(get_search_backend(), SQLiteFTSBackend)
+        self.vase.name = 'Dragon Vase'
+        self.vase.save()
+        self.assertIn(self.vase.id, self.ids(Product.objects.search('dragon')))
+        self.egg.delete()
+        self.assertEqual(self.ids(Product.objects.search('egg')), [])
+
+    def test_backends_must_filter_querysets(self):
+        class Incomplete(BaseSearchBackend):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+class OrderNumberTests(TransactionTestCase):
+    def test_blocks_are_unique_across_generators_and_threads(self):
+        # Each generator stands in for a worker process sharing the sequence row
+        generators = [BlockOrderNumberGenerator(block_size=3) for _ in range(3)]
+        numbers = []
+        lock = threading.Lock()
+
+        def generate():
+            for index in range(10):
+                number = generators[index % len(generators)]()
+                with lock:
+                    numbers.append(number)
+
+        run_threads(generate, 4)
+        self.assertEqual(len(numbers), 40)
+        self.assertEqual(len(set(numbers)), 40)
+        for number in numbers:
+            self.assertRegex(number, r'^\d{8}-\d{10}$')
+        # Whole blocks are reserved, so nothing past the last one is handed out
+        self.assertLessEqual(max(int(number.split('-')[1]) for number in numbers), OrderNumberSequence.objects.get().last_value)
+
+    def test_numbers_taken_in_a_transaction_do_not_keep_the_block(self):
+        generator = BlockOrderNumberGenerator(block_size=50)
+        with transaction.atomic():
+            first, second = generator.next_value(), generator.next_value()
+        self.assertEqual(second, first + 1)
+        self.assertEqual(OrderNumberSequence.objects.get().last_value, second)
+        self.assertEqual(generator.next_value(), second + 1)
+        self.assertEqual(OrderNumberSequence.objects.get().last_value, second + 50)
+
+    def test_orders_get_distinct_numbers(self):
+        user = User.objects.create_user('buyer')
+        orders = [Order.objects.create(user=user, email='buyer@example.com', total_amount=Decimal('1')) for _ in range(5)]
+        self.assertEqual(len({order.order_number for order in orders}), 5)
+
+    def test_generators_must_provide_values(self):
+        class Incomplete(BaseOrderNumberGenerator):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+class MeshFormatTests(SimpleTestCase):
+    def assert_same_mesh(self, vertices, faces, data):
+        """The decoded triangles match the originals within half a quantization step"""
+        decoded_vertices, decoded_faces = decode_mesh(data)
+        vertices, faces = np.asarray(vertices, dtype=np.float64), np.asarray(faces)
+        self.assertEqual(decoded_faces.shape, faces.shape)
+        self.assertEqual(len(decoded_vertices), len(np.unique(faces)))
+        step = (vertices.max(axis=0) - vertices.min(axis=0)) / 65535
+        error = np.abs(decoded_vertices[decoded_faces] - vertices[faces])
+        self.assertTrue((error <= step / 2 + 1e-5).all(), error.max())
+
+    def test_roundtrip(self):
+        for name, (vertices, faces) in {
+            'sphere': sphere(40.0), 'torus': torus(30.0, 8.0), 'fine torus': torus(30.0, 8.0, 400, 200),
+        }.items():
+            with self.subTest(name):
+                self.assert_same_mesh(vertices, faces, encode_mesh(vertices, faces))
+
+    def test_roundtrip_of_shuffled_and_unused_vertices(self):
+        vertices, faces = sphere(10.0)
+        rng = np.random.default_rng(0)
+        order = rng.permutation(len(faces))
+        faces = faces[order][:len(faces) // 2]
+        # Far-apart indices need multi-byte varints and negative deltas
+        self.assert_same_mesh(vertices, faces, encode_mesh(vertices, faces))
+
+    def test_flat_and_empty_meshes(self):
+        flat = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=float)
+        self.assert_same_mesh(flat, [[0, 1, 2]], encode_mesh(flat, [[0, 1, 2]]))
+        vertices, faces = decode_mesh(encode_mesh(np.empty((0, 3)), np.empty((0, 3), dtype=int)))
+        self.assertEqual((len(vertices), len(faces)), (0, 0))
+
+    def test_rejects_other_data(self):
+        data = encode_mesh(*torus(30.0, 8.0))
+        with self.assertRaisesMessage(ValueError, 'Not a compact mesh'):
+            decode_mesh(b'solid' + data[5:])
+        with self.assertRaisesMessage(ValueError, 'Truncated mesh indices'):
+            decode_mesh(data[:-HEADER.size])
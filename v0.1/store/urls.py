@@ -7,15 +7,19 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('products/', views.product_list, name='product_list'),
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
+    path('product/<slug:slug>/quote/', views.print_quote, name='print_quote'),
     path('category/<slug:slug>/', views.category_detail, name='category_detail'),
     path('search/', views.product_search, name='search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('3d-prints/', views.threed_prints, name='3d_prints'),
+    path('models/<str:name>', views.model_mesh, name='model_mesh'),
     
     # Cart URLs
     path('cart/', views.cart, name='cart'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/update/<int:item_id>/', views.update_cart, name='update_cart'),
     path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/batch/', views.cart_batch, name='cart_batch'),
     
     # Checkout URLs
     path('checkout/', views.checkout, name='checkout'),
@@ -1,39 +1,81 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib import messages
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.http import FileResponse, Http404, JsonResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_POST, require_safe
 from django.conf import settings
-from django.db.models import Q
 from django.urls import reverse
-from decimal import Decimal
 import json
-import stripe
+import logging
+import os
+import re
+from asgiref.sync import sync_to_async
 
-from .models import Category, Product, Cart, CartItem, Order, OrderItem, ShippingAddress, ProductSize
+from .models import Category, Product, Cart, CartItem, Order, ProductSize
 from .forms import ShippingAddressForm
+from .category_tree import get_category_tree
+from .pagination import ORDERS_PER_PAGE, KeysetPaginator, is_ajax, order_to_dict
+from .facets import ProductFacets
+from .checkout import OutOfStock, cancel_order, place_order
+from .reservations import reserve_cart
+from .payments import PaymentDeclined, PaymentUnavailable, get_payment_gateway
+from .pricing import get_cart_pricing, invalidate_cart_pricing
+from .cart_batch import CartBatchError, apply_cart_operations
+from .search import get_search_backend
+from .suggest import MAX_LIMIT as MAX_SUGGESTIONS, suggest
+from .meshes import compiled_dir
+from .mesh_format import ENCODINGS as MESH_ENCODINGS
+from .print_quotes import QuoteError, custom_print_height, height_range, quote_product
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_PER_PAGE = 24
+# Search behind the 3D Prints page; the SQLite and PostgreSQL indexes stem "prints" to "print"
+THREED_PRINTS_QUERY = '3D print'
+
+# Compiled model files carry a content hash in their name, so they never change
+MODEL_MESH_NAME = re.compile(r'^[\w-]+(\.[\w-]+)*\.mesh$')
+MODEL_MESH_MAX_AGE = 365 * 24 * 60 * 60
+
+# Keyset orderings behind the ?sort= options of the product listings
+SORT_ORDERINGS = {
+    'name': ('name',),
+    'price_low': ('price',),
+    'price_high': ('-price',),
+    'newest': ('-created_at',),
+}
+
+def paginate_products(request, products, sort_by, default=('name',)):
+    """Return the page of ``products`` selected by ?cursor= for the requested sort"""
+    ordering = SORT_ORDERINGS.get(sort_by, default)
+    return KeysetPaginator(products, ordering, per_page=PRODUCTS_PER_PAGE).page(request.GET.get('cursor'))
+
+def product_to_dict(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'url': product.get_absolute_url(),
+        'price': str(product.price),
+        'image_url': product.image_url,
+        'in_stock': product.is_in_stock,
+    }
 
 def home(request):
-    featured_products = Product.objects.filter(featured=True)[:8]
-    categories = Category.objects.filter(parent=None)
-    
-    # Get products with images for each category to display in rotating format
-    categories_with_products = []
-    for category in categories:
-        # Get all subcategories
-        subcategories = list(category.get_subcategories())
-        categories_to_include = [category] + subcategories
-        
-        # Get all products for this category and its subcategories, not just those with images
-        products = Product.objects.filter(
-            category__in=categories_to_include
-        ).distinct()[:5]  # Limit to 5 products per category
-        
-        # Always include the category even if it has no products with images
-        categories_with_products.append({
-            'category': category,
-            'products': products
-        })
+    featured_products = Product.objects.filter(featured=True).for_listing()[:8]
+    categories = Category.objects.filter(parent=None).prefetch_related('children')
+    
+    # Pick the newest products of every root category (subcategories included) in one windowed query
+    products_by_root = {}
+    for product in Product.objects.top_per_root_category(5).for_listing():
+        products_by_root.setdefault(product.root_category_id, []).append(product)
+    
+    # Always include the category even if it has no products with images
+    categories_with_products = [
+        {'category': category, 'products': products_by_root.get(category.id, [])}
+        for category in categories
+    ]
     
     return render(request, 'store/home.html', {
         'featured_products': featured_products,
@@ -42,9 +84,8 @@ def home(request):
     })
 
 def product_list(request):
-    products = Product.objects.all().order_by('name')  # Default sorting by name A-Z
-    root_categories = Category.objects.filter(parent=None)
-    all_categories = Category.objects.all()
+    products = Product.objects.for_listing().order_by('name')  # Default sorting by name A-Z
+    category_tree = get_category_tree()
     
     # If this is a POST request for adding to cart, process it
     if request.method == 'POST' and 'product_id' in request.POST:
@@ -56,59 +97,52 @@ def product_list(request):
     current_category = None
     if category_slug:
         current_category = get_object_or_404(Category, slug=category_slug)
-        # Get products from both the category and all its subcategories
-        categories_to_include = [current_category]
-        subcategories = current_category.get_subcategories()
-        categories_to_include.extend(subcategories)
-        products = products.filter(category__in=categories_to_include)
+        # Get products from the category and all of its subcategories, at any depth
+        products = products.in_category(current_category)
     
     # Search functionality
     search_query = request.GET.get('q')
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        products = products.search(search_query)  # Ranked by relevance unless a sort is chosen
     
-    # Sorting
+    # Facet filters (price, size, availability) with counts for the whole selection in one query
+    if current_category:
+        current_node = category_tree.get(current_category.id)
+        child_categories = current_node.children if current_node else ()
+    else:
+        child_categories = category_tree.roots
+    facets = ProductFacets(products, request.GET, child_categories=child_categories)
+    products = facets.filter(products)
+    
+    # Sorting and keyset pagination
     sort_by = request.GET.get('sort')
-    if sort_by == 'price_low':
-        products = products.order_by('price')
-    elif sort_by == 'price_high':
-        products = products.order_by('-price')
-    elif sort_by == 'name':
-        products = products.order_by('name')
+    products = paginate_products(request, products, sort_by, default=None if search_query else ('name',))
+    products.count = facets.total
+    if is_ajax(request):
+        return JsonResponse(products.to_dict(product_to_dict))
     
     return render(request, 'store/product_list.html', {
         'products': products,
-        'root_categories': root_categories,
-        'all_categories': all_categories,
+        'root_categories': category_tree.roots,
+        'all_categories': category_tree.all,
         'current_category': current_category,
         'search_query': search_query,
+        'facets': facets,
         'sort_by': sort_by
     })
 
 def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug)
-    
-    # Find related products - consider both category and parent category relationships
-    if product.category.is_subcategory:
-        # If product is in a subcategory, get products from same subcategory and sibling subcategories
-        related_products = Product.objects.filter(
-            Q(category=product.category) |  # Same subcategory
-            Q(category__parent=product.category.parent)  # Sibling subcategories
-        ).exclude(id=product.id).distinct()[:4]
-    else:
-        # If product is in a main category, get products from same category and its subcategories
-        subcategories = product.category.get_subcategories()
-        categories_to_include = [product.category] + list(subcategories)
-        related_products = Product.objects.filter(
-            category__in=categories_to_include
-        ).exclude(id=product.id)[:4]
+    product = get_object_or_404(Product.objects.select_related('category__parent'), slug=slug)
+    
+    # Find related products under the same branch of the category tree:
+    # the parent category for subcategories (siblings included), otherwise the category itself
+    related_scope = product.category.parent if product.category.is_subcategory else product.category
+    related_products = Product.objects.in_category(related_scope).exclude(id=product.id).for_listing()[:4]
     
     return render(request, 'store/product_detail.html', {
         'product': product,
-        'related_products': related_products
+        'related_products': related_products,
+        'print_height_range': height_range(),
     })
 
 def category_detail(request, slug):
@@ -120,19 +154,14 @@ def category_detail(request, slug):
         product_id = request.POST.get('product_id')
         return add_to_cart(request, product_id)
     
-    # Get products from both the category and all its subcategories
-    categories_to_include = [category]
-    categories_to_include.extend(subcategories)
-    products = Product.objects.filter(category__in=categories_to_include).order_by('name')  # Default sorting by name A-Z
+    # Get products from the category and all of its subcategories, at any depth
+    products = Product.objects.in_category(category).for_listing()
     
-    # Sorting
+    # Sorting and keyset pagination (default sorting by name A-Z)
     sort_by = request.GET.get('sort')
-    if sort_by == 'price_low':
-        products = products.order_by('price')
-    elif sort_by == 'price_high':
-        products = products.order_by('-price')
-    elif sort_by == 'name':
-        products = products.order_by('name')
+    products = paginate_products(request, products, sort_by)
+    if is_ajax(request):
+        return JsonResponse(products.to_dict(product_to_dict))
     
     return render(request, 'store/category_detail.html', {
         'category': category,
@@ -142,23 +171,16 @@ def category_detail(request, slug):
     })
 
 def cart(request):
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = CartItem.objects.filter(cart=cart)
-    
-    # Calculate totals
-    subtotal = sum(item.total_price for item in cart_items)
-    shipping_cost = Decimal('0.00') if subtotal >= 50 else Decimal('5.00')
-    tax_rate = Decimal('0.10')  # 10% tax rate
-    tax_amount = subtotal * tax_rate
-    total = subtotal + shipping_cost + tax_amount
+    # Lines and totals in one joined query, shared with the context processor
+    pricing = get_cart_pricing(request)
     
     return render(request, 'store/cart.html', {
-        'cart_items': cart_items,
-        'cart_total': subtotal,
-        'shipping_cost': shipping_cost,
-        'tax_amount': tax_amount,
-        'total_amount': total,
-        'cart_total_with_shipping': total
+        'cart_items': pricing.items,
+        'cart_total': pricing.subtotal,
+        'shipping_cost': pricing.shipping_cost,
+        'tax_amount': pricing.tax_amount,
+        'total_amount': pricing.total,
+        'cart_total_with_shipping': pricing.total
     })
 
 @login_required
@@ -180,10 +202,10 @@ def add_to_cart(request, product_id):
                 messages.error(request, f"Sorry, {product.name} in size {selected_size.get_size_display()} is out of stock.")
                 return redirect('store:product_detail', slug=product.slug)
                 
-            # Make sure requested quantity doesn't exceed stock for the size
-            if quantity > selected_size.stock:
-                messages.warning(request, f"Only {selected_size.stock} units available for {selected_size.get_size_display()}. Quantity adjusted.")
-                quantity = selected_size.stock
+            # Make sure requested quantity doesn't exceed the available stock for the size
+            if quantity > selected_size.available_stock:
+                messages.warning(request, f"Only {selected_size.available_stock} units available for {selected_size.get_size_display()}. Quantity adjusted.")
+                quantity = selected_size.available_stock
                 
         except (ProductSize.DoesNotExist, ValueError):
             messages.error(request, "Invalid size selection.")
@@ -195,15 +217,22 @@ def add_to_cart(request, product_id):
             return redirect('store:product_detail', slug=product.slug)
         
         # Check product stock if not using sizes
-        if quantity > product.stock:
-            messages.warning(request, f"Only {product.stock} units available. Quantity adjusted.")
-            quantity = product.stock
+        if quantity > product.available_stock:
+            messages.warning(request, f"Only {product.available_stock} units available. Quantity adjusted.")
+            quantity = product.available_stock
     
-    # Check if product with same size is already in cart
+    # A custom-size print is sold at the height the customer picked, priced from its model
+    try:
+        print_height = custom_print_height(product, selected_size, request.POST.get('print_height'))
+    except QuoteError as error:
+        messages.error(request, str(error))
+        return redirect('store:product_detail', slug=product.slug)
+    
+    # Check if product with same size (and height) is already in cart
     cart_item = None
     try:
         if selected_size:
-            cart_item = CartItem.objects.get(cart=cart, product=product, size=selected_size)
+            cart_item = CartItem.objects.get(cart=cart, product=product, size=selected_size, print_height=print_height)
         else:
             cart_item = CartItem.objects.get(cart=cart, product=product, size=None)
     except CartItem.DoesNotExist:
@@ -212,6 +241,7 @@ def add_to_cart(request, product_id):
             cart=cart,
             product=product,
             size=selected_size,
+            print_height=print_height,
             quantity=quantity
         )
     else:
@@ -220,13 +250,14 @@ def add_to_cart(request, product_id):
         cart_item.save()
     
     messages.success(request, f"{product.name} has been added to your cart.")
+    invalidate_cart_pricing(request)
     
     # If it's an AJAX request, return JSON response
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
             'success': True,
             'message': 'Product added to cart',
-            'cart_count': cart.total_items
+            'cart_count': get_cart_pricing(request).count
         })
     
     # For normal form submissions, redirect to cart
@@ -243,49 +274,73 @@ def update_cart(request, item_id):
         # Check if we're using a size
         if cart_item.size:
             # Check against size stock
-            if quantity <= cart_item.size.stock:
+            if quantity <= cart_item.size.available_stock:
                 cart_item.quantity = quantity
                 cart_item.save()
             else:
                 return JsonResponse({
                     'success': False, 
-                    'error': f'Only {cart_item.size.stock} units available in this size.'
+                    'error': f'Only {cart_item.size.available_stock} units available in this size.'
                 })
         else:
             # Check against product stock
-            if quantity <= cart_item.product.stock:
+            if quantity <= cart_item.product.available_stock:
                 cart_item.quantity = quantity
                 cart_item.save()
             else:
                 return JsonResponse({
                     'success': False, 
-                    'error': f'Only {cart_item.product.stock} units available.'
+                    'error': f'Only {cart_item.product.available_stock} units available.'
                 })
         
         # Recalculate cart totals
-        cart = cart_item.cart
-        cart_items = CartItem.objects.filter(cart=cart)
-        subtotal = sum(item.total_price for item in cart_items)
-        shipping_cost = Decimal('0.00') if subtotal >= 50 else Decimal('5.00')
-        tax_rate = Decimal('0.10')  # 10% tax rate
-        tax_amount = subtotal * tax_rate
-        total = subtotal + shipping_cost + tax_amount
+        invalidate_cart_pricing(request)
+        pricing = get_cart_pricing(request)
         
         # Return updated values
         return JsonResponse({
             'success': True,
-            'item_total': str(cart_item.total_price),
-            'subtotal': str(subtotal),
-            'shipping_cost': str(shipping_cost),
-            'tax_amount': str(tax_amount),
-            'total': str(total),
-            'free_shipping_eligible': subtotal >= 50,
-            'amount_needed_for_free_shipping': str(max(0, 50 - subtotal)),
-            'cart_count': cart.total_items
+            'item_total': str(pricing.line_for(cart_item.id).total),
+            **pricing.to_dict()
         })
     
     return JsonResponse({'success': False, 'error': 'Invalid quantity'})
 
+@login_required
+@require_POST
+def cart_batch(request):
+    """
+    Apply many add/update/remove operations in one transaction and return the
+    cart once. Also used to merge the localStorage guest cart after login,
+    with ``partial`` so lines that no longer apply are skipped with a warning.
+    """
+    try:
+        data = json.loads(request.body)
+        warnings = apply_cart_operations(request.user, data.get('operations'), partial=bool(data.get('partial')))
+    except (ValueError, AttributeError) as e:
+        # CartBatchError is a ValueError, like malformed JSON
+        message = str(e) if isinstance(e, CartBatchError) else 'Invalid request'
+        return JsonResponse({'success': False, 'error': message}, status=400)
+    
+    invalidate_cart_pricing(request)
+    pricing = get_cart_pricing(request)
+    return JsonResponse({
+        'success': True,
+        'warnings': warnings,
+        'items': [
+            {
+                'id': line.item.id,
+                'product_id': line.item.product_id,
+                'size_id': line.item.size_id,
+                'print_height': str(line.item.print_height) if line.item.print_height is not None else None,
+                'quantity': line.item.quantity,
+                'item_total': str(line.total),
+            }
+            for line in pricing.lines
+        ],
+        **pricing.to_dict()
+    })
+
 @login_required
 @require_POST
 def remove_from_cart(request, item_id):
@@ -295,142 +350,94 @@ def remove_from_cart(request, item_id):
 
 @login_required
 def checkout(request):
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = CartItem.objects.filter(cart=cart)
+    pricing = get_cart_pricing(request)
     
-    if not cart_items.exists():
+    if not pricing.lines:
         return redirect('store:cart')
     
-    # Calculate totals
-    subtotal = sum(item.total_price for item in cart_items)
-    shipping_cost = Decimal('0.00') if subtotal >= 50 else Decimal('5.00')
-    tax_rate = Decimal('0.10')  # 10% tax rate
-    tax_amount = subtotal * tax_rate
-    total = subtotal + shipping_cost + tax_amount
-    
-    # Initialize Stripe
-    stripe.api_key = settings.STRIPE_SECRET_KEY
+    # Hold the units while the customer pays; process_payment turns the holds into the sale
+    try:
+        reserved_until = reserve_cart(request.user, pricing.items)
+    except OutOfStock as e:
+        messages.error(request, str(e))
+        return redirect('store:cart')
     
     return render(request, 'store/checkout.html', {
-        'cart_items': cart_items,
-        'cart_total': subtotal,
-        'shipping_cost': shipping_cost,
-        'tax_amount': tax_amount,
-        'total_amount': total,
+        'cart_items': pricing.items,
+        'cart_total': pricing.subtotal,
+        'shipping_cost': pricing.shipping_cost,
+        'tax_amount': pricing.tax_amount,
+        'total_amount': pricing.total,
+        'reserved_until': reserved_until,
         'stripe_public_key': settings.STRIPE_PUBLISHABLE_KEY
     })
 
-@login_required
+def _place_payment_order(request, data):
+    """The synchronous half of process_payment: price the cart and place the order"""
+    pricing = get_cart_pricing(request)
+    if not pricing.items:
+        return pricing, None
+    # Take the stock and create the order in one transaction; nothing is
+    # written if any line is out of stock
+    order = place_order(
+        request.user, pricing.items, data.get('shipping'), data.get('payment_method', 'card'),
+        pricing.order_totals()
+    )
+    return pricing, order
+
+def _complete_payment_order(request, order, cart_items, paid):
+    if paid:
+        order.payment_status = 'paid'
+        order.save(update_fields=['payment_status', 'updated_at'])
+    # Empty cart after order is placed (only the lines that were ordered)
+    CartItem.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+    invalidate_cart_pricing(request)
+
 @require_POST
-def process_payment(request):
-    cart = get_object_or_404(Cart, user=request.user)
-    cart_items = CartItem.objects.filter(cart=cart)
-    
-    if not cart_items:
-        messages.error(request, "Your cart is empty.")
-        return redirect('store:cart')
-    
-    # Check stock availability before proceeding
-    for item in cart_items:
-        if item.size:
-            if item.quantity > item.size.stock:
-                messages.error(request, f"Sorry, only {item.size.stock} units of {item.product.name} in size {item.size.get_size_display()} are available.")
-                return redirect('store:cart')
-        else:
-            if item.quantity > item.product.stock:
-                messages.error(request, f"Sorry, only {item.product.stock} units of {item.product.name} are available.")
-                return redirect('store:cart')
+async def process_payment(request):
+    # Async view: under ASGI the worker serves other requests while the card is charged
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
     
     try:
         data = json.loads(request.body)
-        token = data.get('token')
-        shipping_data = data.get('shipping')
-        payment_method = data.get('payment_method', 'card')
+        try:
+            pricing, order = await sync_to_async(_place_payment_order)(request, data)
+        except OutOfStock as e:
+            return JsonResponse({'success': False, 'error': str(e)})
         
-        # Calculate totals
-        subtotal = sum(item.total_price for item in cart_items)
-        shipping_cost = Decimal('0.00') if subtotal >= 50 else Decimal('5.00')
-        tax_rate = Decimal('0.10')
-        tax_amount = subtotal * tax_rate
-        total = subtotal + shipping_cost + tax_amount
+        if order is None:
+            await sync_to_async(messages.error)(request, "Your cart is empty.")
+            return redirect('store:cart')
         
         # Process payment based on selected method
-        if payment_method == 'card':
-            # Create Stripe charge
-            charge = stripe.Charge.create(
-                amount=int(total * 100),  # Convert to cents
-                currency='usd',
-                source=token,
-                description=f'Order for {request.user.email}'
-            )
-            payment_status = 'paid'
-        else:
-            # Cash on delivery - no payment processing needed
-            payment_status = 'pending'
-        
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            email=shipping_data['email'],
-            total_amount=total,
-            shipping_cost=shipping_cost,
-            tax_amount=tax_amount,
-            status='pending',
-            payment_method=payment_method,
-            payment_status=payment_status
-        )
-        
-        # Create shipping address
-        shipping_address = ShippingAddress.objects.create(
-            first_name=shipping_data['first_name'],
-            last_name=shipping_data['last_name'],
-            email=shipping_data['email'],
-            address=shipping_data['address'],
-            city=shipping_data['city'],
-            state=shipping_data['state'],
-            zip_code=shipping_data['zip_code'],
-            phone=shipping_data['phone']
-        )
-        
-        # Associate shipping address with order
-        order.shipping_address = shipping_address
-        order.save()
-        
-        # Create order items
-        for item in cart_items:
-            # Determine the price based on size
-            if item.size:
-                price = item.product.price + item.size.price_adjustment
-                size_name = item.size.get_size_display()
-                
-                # Reduce the size-specific stock
-                item.size.stock -= item.quantity
-                item.size.save()
-            else:
-                price = item.product.price
-                size_name = None
-                
-                # Reduce the product stock
-                item.product.stock -= item.quantity
-                item.product.save()
-            
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                price=price,
-                quantity=item.quantity,
-                size=size_name
-            )
+        paid = False
+        if order.payment_method == 'card':
+            # Charge outside the stock transaction so no locks are held during the API call
+            try:
+                await get_payment_gateway().acharge(order, data.get('token'), pricing.total, f'Order for {user.email}')
+                paid = True
+            except (PaymentDeclined, PaymentUnavailable):
+                # Nothing was charged: give the stock back
+                await sync_to_async(cancel_order)(order, pricing.items)
+                raise
+            except Exception:
+                # The charge may have gone through: keep the order, payment pending, for reconciliation
+                logger.exception('Payment outcome unknown for order %s', order.order_number)
+                await sync_to_async(messages.warning)(
+                    request, "We could not confirm your payment yet. Your order is on hold until it is confirmed."
+                )
+        # Cash on delivery - no payment processing needed, payment stays pending
         
-        # Empty cart after order is placed
-        cart_items.delete()
+        await sync_to_async(_complete_payment_order)(request, order, pricing.items, paid)
         
         return JsonResponse({
             'success': True,
             'redirect_url': reverse('store:order_confirmation', args=[order.id])
         })
         
-    except stripe.error.CardError as e:
+    except (PaymentDeclined, PaymentUnavailable) as e:
         return JsonResponse({'success': False, 'error': str(e)})
     except Exception as e:
         return JsonResponse({'success': False, 'error': 'An error occurred'})
@@ -442,63 +449,127 @@ def order_confirmation(request, order_id):
 
 @login_required
 def orders(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    orders = KeysetPaginator(
+        Order.objects.filter(user=request.user), ('-created_at',), per_page=ORDERS_PER_PAGE
+    ).page(request.GET.get('cursor'))
+    if is_ajax(request):
+        return JsonResponse(orders.to_dict(order_to_dict))
     return render(request, 'store/orders.html', {'orders': orders})
 
 def product_search(request):
     query = request.GET.get('q')
+    sort_by = request.GET.get('sort')
     products = []
     
+    match_count = None
     if query:
-        products = Product.objects.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query)
-        ).order_by('name')  # Default sorting by name A-Z
-        
-        # Sorting
-        sort_by = request.GET.get('sort')
-        if sort_by == 'price_low':
-            products = products.order_by('price')
-        elif sort_by == 'price_high':
-            products = products.order_by('-price')
-        elif sort_by == 'name':
-            products = products.order_by('name')
+        # Ranked by relevance unless a sort is chosen, one page at a time
+        products = paginate_products(request, Product.objects.search(query).for_listing(), sort_by, default=None)
+        if is_ajax(request):
+            return JsonResponse(products.to_dict(product_to_dict))
+        # Backends that keep only the best matches say how many there were
+        match_count = get_search_backend().count_matches(query)
     
     context = {
         'query': query,
         'products': products,
-        'sort_by': sort_by if 'sort_by' in locals() else None
+        'match_count': match_count,
+        'sort_by': sort_by
     }
     return render(request, 'store/search_results.html', context)
 
+def search_suggest(request):
+    """Search-as-you-type suggestions served from the in-memory prefix index"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 8)), MAX_SUGGESTIONS))
+    except ValueError:
+        limit = 8
+    
+    return JsonResponse({
+        'query': query,
+        'suggestions': suggest(query, limit) if query else []
+    })
+
+@require_safe
+def print_quote(request, slug):
+    """Estimated price, weight and print time of the product's model printed ``?height=`` mm tall"""
+    product = get_object_or_404(Product.objects.only('slug', 'print_model', 'print_model_hash'), slug=slug)
+    if not product.print_model:
+        raise Http404('No print model')
+    try:
+        height = float(request.GET.get('height', ''))
+    except ValueError:
+        lowest, highest = height_range()
+        return JsonResponse({'error': f'Choose a height between {lowest:g} and {highest:g} mm'}, status=400)
+    try:
+        quote = quote_product(product, height)
+    except QuoteError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(quote.as_dict())
+
 def threed_prints(request):
     """
     View for the 3D Prints page
     """
-    # Query products with 3D print tag or specific 3D print category
-    # For this example, we're filtering products with "3D Print" in the name or description
-    # In a real app, you might want to create a specific tag or category for 3D prints
-    products = Product.objects.filter(
-        Q(name__icontains="3D Print") | 
-        Q(description__icontains="3D Print")
-    ).order_by('name')  # Default sorting by name A-Z
+    # Products that mention 3D prints, found through the search index rather than a table scan
+    products = Product.objects.search(THREED_PRINTS_QUERY).for_listing()
     
     # If this is a POST request for adding to cart, process it
     if request.method == 'POST' and 'product_id' in request.POST:
         product_id = request.POST.get('product_id')
         return add_to_cart(request, product_id)
     
-    # Sorting
+    # Sorting and keyset pagination (default sorting by name A-Z)
     sort_by = request.GET.get('sort')
-    if sort_by == 'price_low':
-        products = products.order_by('price')
-    elif sort_by == 'price_high':
-        products = products.order_by('-price')
-    elif sort_by == 'name':
-        products = products.order_by('name')
+    products = paginate_products(request, products, sort_by)
+    if is_ajax(request):
+        return JsonResponse(products.to_dict(product_to_dict))
     
     return render(request, 'store/3d_prints.html', {
         'products': products,
         'title': '3D Prints',
         'sort_by': sort_by
     })
+
+def accepted_encodings(request):
+    """Content codings the client accepts (``Accept-Encoding`` entries without ``q=0``)"""
+    accepted = set()
+    for entry in request.headers.get('Accept-Encoding', '').split(','):
+        coding, *params = [part.strip() for part in entry.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+@require_safe
+def model_mesh(request, name):
+    """
+    A compiled ``.mesh`` model for the 3D hero, as its precompressed brotli or
+    gzip copy when the client accepts one, cached for a year
+    """
+    if not MODEL_MESH_NAME.match(name):
+        raise Http404('Unknown model')
+    path = os.path.join(compiled_dir(), name)
+    accepted = accepted_encodings(request)
+    encoding = next(
+        (coding for coding, suffix in MESH_ENCODINGS.items() if coding in accepted and os.path.exists(path + suffix)),
+        None,
+    )
+    try:
+        handle = open(path + MESH_ENCODINGS[encoding] if encoding else path, 'rb')
+    except FileNotFoundError:
+        raise Http404('Unknown model')
+    response = FileResponse(handle, content_type='application/octet-stream')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ['Accept-Encoding'])
+    patch_cache_control(response, public=True, max_age=MODEL_MESH_MAX_AGE, immutable=True)
+    return response